@@ -3,6 +3,9 @@ ASGI config for aboraaya_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server, e.g.:
+    uvicorn aboraaya_project.asgi:application --workers 4
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,5 +15,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'aboraaya_project.settings')
+# Route the AJAX endpoints to their async implementations (core.async_views)
+os.environ.setdefault('ASYNC_AJAX_VIEWS', 'True')
 
 application = get_asgi_application()
@@ -3,7 +3,7 @@ Django settings for aboraaya_project project.
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -71,12 +71,15 @@ SITE_ID = 1
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Static files in production
+    'core.middleware.StaticFilesMiddleware',  # WhiteNoise static files (async-capable)
+    'core.middleware.RequestMetricsMiddleware',  # Per-view timing/SQL metrics
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',  # For i18n
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.CachedAuthenticationMiddleware',  # request.user from the cache
+    'core.middleware.ThrottleMiddleware',  # Rate limits and load shedding before the view
+    'core.middleware.SamplingProfilerMiddleware',  # On-demand request profiles
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',  # Required for allauth
@@ -103,6 +106,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'aboraaya_project.wsgi.application'
 
+# Serve the AJAX endpoints with the async views in core.async_views.
+# asgi.py turns this on; under WSGI the sync views avoid per-request event loops.
+ASYNC_AJAX_VIEWS = config('ASYNC_AJAX_VIEWS', default=False, cast=bool)
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -115,12 +122,57 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD', default=''),
         'HOST': config('DB_HOST', default=''),
         'PORT': config('DB_PORT', default=''),
+        # Keep connections open between requests (seconds; 0 = reconnect every request)
+        # and check they are still alive before reusing them
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
     }
 }
 
+# Connection pooling (PostgreSQL with psycopg 3 only: pip install "psycopg[binary,pool]").
+# Each worker process gets its own pool, sized to the threads that can use it at once.
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+DB_POOL_MAX_SIZE = config('DB_POOL_MAX_SIZE', default=config('GUNICORN_THREADS', default=1, cast=int), cast=int)
+if DB_POOL and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['default']['CONN_MAX_AGE'] = 0  # the pool keeps connections instead
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': config('DB_POOL_MIN_SIZE', default=1, cast=int),
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+            'max_idle': 300,
+        },
+    }
+
+# Read replicas for public read paths (core/replicas.py): comma-separated hosts
+# for PostgreSQL, or database files for SQLite; other settings match the primary.
+READ_REPLICAS = []
+for _index, _replica in enumerate(config('DB_REPLICAS', default='', cast=Csv()), start=1):
+    _location = 'NAME' if 'sqlite' in DATABASES['default']['ENGINE'] else 'HOST'
+    DATABASES[f'replica_{_index}'] = {**DATABASES['default'], _location: _replica, 'TEST': {'MIRROR': 'default'}}
+    READ_REPLICAS.append(f'replica_{_index}')
+
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Seconds a visitor's reads stay on the primary after they write
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+
 # Custom User Model
 AUTH_USER_MODEL = 'core.User'
 
+# Sessions are read from the cache and written through to the database. Only
+# logins create one; anonymous pages never touch the session (see PageCacheTests).
+SESSION_ENGINE = config('SESSION_ENGINE', default='django.contrib.sessions.backends.cached_db')
+
+# PBKDF2 iterations for new password hashes; 0 keeps Django's default (see benchmark_logins)
+PASSWORD_HASH_ITERATIONS = config('PASSWORD_HASH_ITERATIONS', default=0, cast=int)
+PASSWORD_HASHERS = [
+    'core.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -172,6 +224,12 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Sitemaps (pre-generated by `manage.py generate_sitemaps`)
+# Served by core.views.sitemap_file at /sitemap.xml and /sitemaps/..., reading
+# the files on each request so regenerated shards need no worker reload.
+SITEMAP_ROOT = Path(config('SITEMAP_ROOT', default=str(BASE_DIR / 'public')))
+SITEMAP_PROTOCOL = config('SITEMAP_PROTOCOL', default='https')
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -217,8 +275,70 @@ else:
     # WhiteNoise compression and caching
     STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Anonymous full-page cache for home/listing pages (core.pagecache)
+# Entries are purged when the listings they show change; the timeout only
+# bounds staleness of counters (views, favorites) rendered on the page.
+PAGE_CACHE_ENABLED = config('PAGE_CACHE_ENABLED', default=True, cast=bool)
+PAGE_CACHE_TIMEOUT = config('PAGE_CACHE_TIMEOUT', default=300, cast=int)
+
+# Search box typeahead (core.autocomplete) and catalog word matching (core.fuzzy):
+# each worker checks for catalog and ACTIVE-set changes at most every
+# CHECK_INTERVAL seconds; the typeahead also rebuilds after MAX_AGE
+AUTOCOMPLETE_CHECK_INTERVAL = config('AUTOCOMPLETE_CHECK_INTERVAL', default=2, cast=float)
+AUTOCOMPLETE_MAX_AGE = config('AUTOCOMPLETE_MAX_AGE', default=600, cast=int)
+
+# Market price statistics (core.pricing), rebuilt by rollup_price_stats: each
+# worker checks for a new rollup at most every CHECK_INTERVAL seconds
+PRICE_STATS_CHECK_INTERVAL = config('PRICE_STATS_CHECK_INTERVAL', default=60, cast=float)
+
+# Stampede protection for cached computations (core.cachefill): entries are
+# served up to CACHE_FILL_STALE_TTL seconds past expiry while one worker
+# refreshes them; cold misses wait up to CACHE_FILL_WAIT_TIMEOUT for it.
+CACHE_FILL_STALE_TTL = config('CACHE_FILL_STALE_TTL', default=60, cast=int)
+CACHE_FILL_LOCK_TIMEOUT = config('CACHE_FILL_LOCK_TIMEOUT', default=30, cast=int)
+CACHE_FILL_WAIT_TIMEOUT = config('CACHE_FILL_WAIT_TIMEOUT', default=5, cast=float)
+
+# Buffered view counters (core.counters): written back by a timer thread within
+# N seconds of the first increment, or once this many listings have pending ones
+COUNTER_FLUSH_INTERVAL = config('COUNTER_FLUSH_INTERVAL', default=10, cast=int)
+COUNTER_FLUSH_MAX_PENDING = config('COUNTER_FLUSH_MAX_PENDING', default=500, cast=int)
+
+# Request metrics (core.middleware.RequestMetricsMiddleware)
+# Aggregated per URL name in the cache; report at /<lang>/admin-dashboard/metrics/
+REQUEST_METRICS_ENABLED = config('REQUEST_METRICS_ENABLED', default=True, cast=bool)
+REQUEST_METRICS_TTL = config('REQUEST_METRICS_TTL', default=7 * 24 * 3600, cast=int)
+
+# Throttling (core.middleware.ThrottleMiddleware, core.throttle)
+# Token bucket per URL name and client: '<tokens>/<s|m|h>' is both the burst and the refill
+# rate; 'key' is 'ip', 'user' or 'session' (without one the IP is used). Needs a shared
+# cache (Redis) to hold across workers; DummyCache never throttles.
+THROTTLE_ENABLED = config('THROTTLE_ENABLED', default=True, cast=bool)
+THROTTLE_RULES = {
+    'core:reveal_phone': {'rate': config('THROTTLE_REVEAL_PHONE', default='20/m'), 'key': 'user'},
+    'core:ajax_load_trims': {'rate': config('THROTTLE_LOAD_TRIMS', default='120/m'), 'key': 'ip'},
+    'core:search': {'rate': config('THROTTLE_SEARCH', default='60/m'), 'key': 'ip'},
+}
+# Reverse proxies in front of the app that append to X-Forwarded-For (0: use REMOTE_ADDR)
+THROTTLE_TRUSTED_PROXIES = config('THROTTLE_TRUSTED_PROXIES', default=0, cast=int)
+# In-flight requests per worker process beyond which new ones get a 503 (0 disables).
+# Counted in process memory, not the cache: the site-wide cap is this times
+# GUNICORN_WORKERS, and a gthread worker never runs more than GUNICORN_THREADS.
+THROTTLE_MAX_IN_FLIGHT = config('THROTTLE_MAX_IN_FLIGHT', default=0, cast=int)
+
+# Request profiler (core.middleware.SamplingProfilerMiddleware)
+# Staff can always profile a request with ?_profile=1 or an `X-Profile: 1` header.
+# PROFILER_SAMPLE_RATE=N also profiles 1 in N requests; PROFILER_SLOW_MS=X keeps
+# every request slower than X ms (0 disables either). Browse at /<lang>/admin-dashboard/profiles/
+PROFILER_DIR = Path(config('PROFILER_DIR', default=str(BASE_DIR / 'profiles')))
+PROFILER_SAMPLE_RATE = config('PROFILER_SAMPLE_RATE', default=0, cast=int)
+PROFILER_SLOW_MS = config('PROFILER_SLOW_MS', default=0, cast=int)
+PROFILER_INTERVAL_MS = config('PROFILER_INTERVAL_MS', default=5, cast=int)
+PROFILER_MAX_FILES = config('PROFILER_MAX_FILES', default=200, cast=int)
+PROFILER_MAX_AGE_DAYS = config('PROFILER_MAX_AGE_DAYS', default=7, cast=int)
+
 # Authentication Backends
 AUTHENTICATION_BACKENDS = [
+    'core.backends.EmailBackend',  # login_view: one indexed query per attempt
     'django.contrib.auth.backends.ModelBackend',  # Default
     'allauth.account.auth_backends.AuthenticationBackend',  # Allauth
 ]
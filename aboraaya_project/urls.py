@@ -2,16 +2,23 @@
 URL configuration for aboraaya_project project.
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.conf.urls.i18n import i18n_patterns
 
 from django.contrib.auth import views as auth_views
 
+from core import views as core_views
+from core.sitemaps import INDEX_FILENAME, SHARD_DIR
+
 # Non-i18n URLs (admin, media, social auth)
 urlpatterns = [
     path('admin/', admin.site.urls),
+
+    # Pre-generated sitemaps (manage.py generate_sitemaps)
+    path(INDEX_FILENAME, core_views.sitemap_file, {'path': INDEX_FILENAME}, name='sitemap'),
+    re_path(rf'^(?P<path>{SHARD_DIR}/listings-\d+\.xml)$', core_views.sitemap_file, name='sitemap_shard'),
     
     # Allauth social login URLs
     path('accounts/', include('allauth.urls')),
@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db import transaction
 from django.utils.translation import gettext_lazy as _
-from .models import User, Make, Model, CarTrim, Listing
+from .models import User, Make, Model, CarTrim, Listing, SavedSearch
+from . import alerts, phones
 
 # --- User Admin ---
 @admin.register(User)
@@ -39,11 +41,14 @@ from modeltranslation.admin import TranslationAdmin
 
 @admin.register(Listing)
 class ListingAdmin(TranslationAdmin):
-    list_display = ['trim', 'seller', 'price', 'location', 'status', 'views', 'created_at']
+    list_display = ['trim', 'seller', 'price', 'location', 'status', 'risk_score', 'views', 'created_at']
+    # Listing/CarTrim __str__ reads trim.model; join exactly what the rows need
+    list_select_related = ['trim__model', 'seller']
     list_filter = ['status', 'location', 'created_at', 'trim__model__make']
     search_fields = ['trim__model__name_en', 'seller__username', 'description']
-    readonly_fields = ['views', 'phone_clicks', 'created_at', 'updated_at']
+    readonly_fields = ['views', 'phone_clicks', 'risk_score', 'risk_reasons', 'created_at', 'updated_at']
     date_hierarchy = 'created_at'
+    actions = ['approve_selected']
     
     fieldsets = (
         (_('Car Information'), {
@@ -58,6 +63,9 @@ class ListingAdmin(TranslationAdmin):
         (_('Seller & Status'), {
             'fields': ('seller', 'status', 'active_date')
         }),
+        (_('Moderation Screening'), {
+            'fields': ('risk_score', 'risk_reasons')
+        }),
         (_('Statistics'), {
             'fields': ('views', 'phone_clicks', 'created_at', 'updated_at')
         }),
@@ -67,4 +75,28 @@ class ListingAdmin(TranslationAdmin):
         """Auto-set seller to current user if creating new listing"""
         if not change and not obj.seller_id:
             obj.seller = request.user
+        approved = change and obj._loaded_status == 'PENDING' and obj.status == 'ACTIVE'
         super().save_model(request, obj, form, change)
+        if approved:
+            alerts.alert_on_commit([obj.pk])
+            phones.prime_on_commit([obj.pk])
+
+    @admin.action(description=_('Approve selected pending listings'))
+    def approve_selected(self, request, queryset):
+        with transaction.atomic():
+            listings = list(queryset.filter(status='PENDING'))
+            for listing in listings:
+                listing.status = 'ACTIVE'
+                listing.save(update_fields=['status'])
+            alerts.alert_on_commit(listing.pk for listing in listings)
+            phones.prime_on_commit(listing.pk for listing in listings)
+        self.message_user(request, _('%(count)d listings approved.') % {'count': len(listings)})
+
+
+@admin.register(SavedSearch)
+class SavedSearchAdmin(admin.ModelAdmin):
+    list_display = ['user', 'query', 'make', 'model', 'governorate', 'min_price', 'max_price', 'created_at']
+    list_select_related = ['user', 'make', 'model']
+    list_filter = ['governorate', 'fuel_type', 'transmission', 'make']
+    search_fields = ['user__username', 'user__email', 'query']
+    raw_id_fields = ['user']
@@ -2,12 +2,18 @@
 Admin views for listing approval dashboard.
 Superuser-only views for managing pending listings.
 """
+import json
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
+from django.http import FileResponse, Http404, HttpResponse
 from django.utils.translation import gettext as _
-from django.db.models import Count
+from django.db import transaction
+from django.db.models import Count, F
+from django.views.decorators.http import require_POST
 from .models import Listing
+from . import alerts, metrics, phones, profiling, screening
 
 
 def superuser_required(view_func):
@@ -18,13 +24,15 @@ def superuser_required(view_func):
 
 @superuser_required
 def admin_dashboard(request):
-    """Admin dashboard showing pending listings and stats"""
-    pending_listings = Listing.objects.filter(status='PENDING').select_related(
+    """Admin dashboard showing pending listings, riskiest first, and stats"""
+    pending_listings = list(Listing.objects.filter(status='PENDING').select_related(
         'trim__model__make', 'seller'
-    ).order_by('-created_at')
+    ).order_by(F('risk_score').desc(nulls_last=True), '-created_at'))
+    for listing in pending_listings:
+        listing.risk_labels = screening.describe(listing.risk_reasons)
     
     stats = {
-        'pending': pending_listings.count(),
+        'pending': len(pending_listings),
         'active': Listing.objects.filter(status='ACTIVE').count(),
         'sold': Listing.objects.filter(status='SOLD').count(),
         'total': Listing.objects.count(),
@@ -43,10 +51,37 @@ def approve_listing(request, pk):
     listing = get_object_or_404(Listing, pk=pk, status='PENDING')
     listing.status = 'ACTIVE'
     listing.save(update_fields=['status'])
+    alerts.alert_on_commit([listing.pk])
+    phones.prime_on_commit([listing.pk])
     messages.success(request, _('Listing approved successfully.'))
     return redirect('core:admin_dashboard')
 
 
+@superuser_required
+@require_POST
+def approve_listings(request):
+    """Approve the selected pending listings as one batch (one alert digest per user)"""
+    ids = [int(pk) for pk in request.POST.getlist('listing_ids') if pk.isdigit()]
+    with transaction.atomic():
+        listings = list(Listing.objects.select_for_update().filter(pk__in=ids, status='PENDING'))
+        for listing in listings:
+            listing.status = 'ACTIVE'
+            listing.save(update_fields=['status'])  # per row, so core.signals purges cached pages
+        alerts.alert_on_commit(listing.pk for listing in listings)
+        phones.prime_on_commit(listing.pk for listing in listings)
+    messages.success(request, _('%(count)d listings approved.') % {'count': len(listings)})
+    return redirect('core:admin_dashboard')
+
+
+@superuser_required
+@require_POST
+def screen_listings(request):
+    """Risk-score pending listings now instead of waiting for the next cron run"""
+    screened = screening.screen_pending()
+    messages.success(request, _('%(count)d pending listings screened.') % {'count': screened})
+    return redirect('core:admin_dashboard')
+
+
 @superuser_required
 def reject_listing(request, pk):
     """Reject a pending listing"""
@@ -55,3 +90,54 @@ def reject_listing(request, pk):
     listing.save(update_fields=['status'])
     messages.warning(request, _('Listing rejected.'))
     return redirect('core:admin_dashboard')
+
+
+@superuser_required
+def request_metrics(request):
+    """Per-view latency and query-count report collected by RequestMetricsMiddleware"""
+    if request.method == 'POST' and request.POST.get('action') == 'reset':
+        metrics.reset()
+        messages.success(request, _('Request metrics have been reset.'))
+        return redirect('core:request_metrics')
+
+    context = {
+        'rows': metrics.get_report(),
+        'cache_rows': metrics.get_cache_report(),
+        'throttle_rows': metrics.get_throttle_report(),
+        'profile_count': len(profiling.list_profiles()),
+        'latency_buckets': metrics.LATENCY_BUCKETS_MS,
+    }
+    return render(request, 'admin_metrics.html', context)
+
+
+@superuser_required
+def request_profiles(request):
+    """List recent request profiles, optionally filtered by URL name"""
+    profiles = profiling.list_profiles()
+    url_names = sorted({profile['url_name'] for profile in profiles})
+    selected = request.GET.get('url_name', '')
+    if selected:
+        profiles = [profile for profile in profiles if profile['url_name'] == selected]
+
+    context = {
+        'profiles': profiles,
+        'url_names': url_names,
+        'selected': selected,
+    }
+    return render(request, 'admin_profiles.html', context)
+
+
+@superuser_required
+def download_profile(request, filename):
+    """Download a stored profile as speedscope JSON or collapsed stacks"""
+    path = profiling.profile_path(filename)
+    if path is None:
+        raise Http404
+
+    if request.GET.get('format') == 'collapsed':
+        with open(path, encoding='utf-8') as fh:
+            collapsed = profiling.to_collapsed(json.load(fh))
+        response = HttpResponse(collapsed, content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{filename[:-len(profiling.FILE_SUFFIX)]}.collapsed.txt"'
+        return response
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type='application/json')
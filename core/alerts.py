@@ -0,0 +1,118 @@
+"""
+Saved search alerts for newly approved listings.
+
+Saved searches are indexed by their equality constraints (make, model,
+governorate, fuel type, transmission). A listing only probes the index
+"shapes" in use - its own values with the fields a group of searches leaves
+open blanked out - so the cost grows with the number of distinct shapes, not
+of saved searches. Ranges, color, seller type and keywords are then checked
+on the few candidates found.
+
+Approval views call ``alert_on_commit`` with the listings they activated;
+the whole batch is matched in one pass after the transaction commits and
+each user gets a single digest email, however many searches matched.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import translation
+from django.utils.translation import ngettext
+
+from .fuzzy import keyword_matches
+from .models import Listing, SavedSearch
+from .sitemaps import get_base_url
+
+EQUALITY_FIELDS = ('make_id', 'model_id', 'governorate', 'fuel_type', 'transmission')
+
+
+def _listing_values(listing):
+    """The listing's values for EQUALITY_FIELDS"""
+    trim = listing.trim
+    return (trim.model.make_id, trim.model_id, listing.location, trim.fuel_type, trim.transmission)
+
+
+class SearchIndex:
+    """Saved searches bucketed by their equality constraints (None where unconstrained)"""
+
+    def __init__(self, searches):
+        self.buckets = defaultdict(list)
+        for search in searches:
+            key = tuple(getattr(search, field) or None for field in EQUALITY_FIELDS)
+            self.buckets[key].append(search)
+        self.shapes = {tuple(value is not None for value in key) for key in self.buckets}
+
+    def candidates(self, listing):
+        """Searches whose equality constraints all hold for `listing`"""
+        values = _listing_values(listing)
+        for shape in self.shapes:
+            key = tuple(value if constrained else None for value, constrained in zip(values, shape))
+            yield from self.buckets.get(key, ())
+
+
+def _accepts(search, listing):
+    """The checks left after the index lookup"""
+    year = listing.trim.year
+    return (
+        search.user_id != listing.seller_id
+        and (search.min_price is None or listing.price >= search.min_price)
+        and (search.max_price is None or listing.price <= search.max_price)
+        and (search.min_year is None or year >= search.min_year)
+        and (search.max_year is None or year <= search.max_year)
+        and (search.max_mileage is None or listing.odometer <= search.max_mileage)
+        and (not search.color or listing.color.casefold() == search.color.casefold())
+        and (not search.seller_type or listing.seller.is_dealer == (search.seller_type == 'dealer'))
+        and (not search.query or keyword_matches(search.query, listing))
+    )
+
+
+def match_listings(listings):
+    """{user: [listings]} for saved searches matching any of `listings`, with trims and sellers loaded"""
+    listings = list(listings)
+    if not listings:
+        return {}
+    make_ids = {listing.trim.model.make_id for listing in listings}
+    searches = SavedSearch.objects.filter(Q(make__isnull=True) | Q(make_id__in=make_ids)).select_related('user')
+    index = SearchIndex(searches)
+    matches = defaultdict(dict)
+    for listing in listings:
+        for search in index.candidates(listing):
+            if _accepts(search, listing):
+                matches[search.user][listing.pk] = listing
+    return {user: list(found.values()) for user, found in matches.items()}
+
+
+def send_digests(matches):
+    """Email each user one digest of their matched listings; returns the number sent"""
+    base_url = get_base_url()
+    messages = []
+    with translation.override(settings.LANGUAGE_CODE):
+        for user, listings in matches.items():
+            if not user.email:
+                continue
+            subject = ngettext(
+                '%(count)d new car matches your saved searches',
+                '%(count)d new cars match your saved searches',
+                len(listings),
+            ) % {'count': len(listings)}
+            body = render_to_string('emails/saved_search_digest.txt', {
+                'user': user, 'listings': listings, 'base_url': base_url,
+            })
+            messages.append(EmailMessage(subject, body, to=[user.email]))
+    if messages:
+        get_connection().send_messages(messages)
+    return len(messages)
+
+
+def send_alerts(listing_ids):
+    listings = Listing.objects.filter(pk__in=listing_ids, status='ACTIVE').select_related('trim__model__make', 'seller')
+    return send_digests(match_listings(listings))
+
+
+def alert_on_commit(listing_ids):
+    """Send saved search alerts for newly approved listings once the current transaction commits"""
+    listing_ids = list(listing_ids)
+    transaction.on_commit(lambda: send_alerts(listing_ids))
@@ -0,0 +1,73 @@
+"""
+Async implementations of the JSON endpoints, used when the project is served
+over ASGI (see aboraaya_project/asgi.py and the ASYNC_AJAX_VIEWS setting).
+
+They await the async ORM instead of holding a worker thread for the length
+of each database round trip. Behaviour and responses match the sync views
+in core.views.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse
+from django.shortcuts import aget_object_or_404
+from django.views.decorators.http import require_POST
+
+from . import favorites
+from .counters import phone_clicks
+from .models import CarTrim, Listing, Model
+from .phones import aget_phone
+from .replicas import pins_primary, replica_reads
+
+
+@replica_reads
+async def load_models(request):
+    """AJAX endpoint to load models based on selected make"""
+    make_id = request.GET.get('make_id')
+    lang = request.LANGUAGE_CODE
+    data = [
+        {'id': model.id, 'name': model.name_ar if lang == 'ar' else model.name_en}
+        async for model in Model.objects.filter(make_id=make_id).order_by('name_en')
+    ]
+    return JsonResponse(data, safe=False)
+
+
+@replica_reads
+async def load_trims(request):
+    """AJAX endpoint to load trims based on selected model"""
+    model_id = request.GET.get('model_id')
+    data = [
+        {
+            'id': trim.id,
+            'name': trim.name,
+            'year': trim.year,
+            'display': f"{trim.year} - {trim.name} ({trim.get_transmission_display()})",
+            'horsepower': trim.horsepower,
+            'fuel_consumption': trim.fuel_consumption,
+        }
+        async for trim in CarTrim.objects.filter(model_id=model_id).order_by('-year', 'name')
+    ]
+    return JsonResponse(data, safe=False)
+
+
+async def reveal_phone(request, pk):
+    """AJAX endpoint to reveal phone number and track clicks (no queries on a cache hit)"""
+    found, phone_number = await aget_phone(pk)
+    if not found:
+        raise Http404
+    # incr() may flush the buffer, which is a synchronous database write
+    await sync_to_async(phone_clicks.incr)(pk)
+    return JsonResponse({
+        'phone_number': phone_number
+    })
+
+
+@pins_primary
+@login_required
+@require_POST
+async def toggle_favorite(request, pk):
+    """AJAX endpoint to add/remove a listing from favorites"""
+    listing = await aget_object_or_404(Listing.objects.only('pk'), pk=pk, status='ACTIVE')
+    user = await request.auser()
+    # The toggle runs in one transaction, which the async ORM cannot open
+    is_favorited, favorites_count = await sync_to_async(favorites.toggle_favorite)(user.pk, listing.pk)
+    return JsonResponse(favorites.favorite_response_data(is_favorited, favorites_count))
@@ -0,0 +1,47 @@
+"""
+Cached ``request.user`` for logged-in requests.
+
+Django loads the user with a query on every authenticated request. Here the
+user object is cached by primary key (see CachedAuthenticationMiddleware) and
+checked against the session exactly like django.contrib.auth.get_user does:
+the session's auth hash must match the user's, so a password change still
+logs other sessions out. Saving a user drops the entry (core.signals).
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+
+USER_CACHE_TIMEOUT = 15 * 60
+
+
+def _cache_key(user_id):
+    return f'auth_user:{user_id}'
+
+
+def get_cached_user(request):
+    """Same result as django.contrib.auth.get_user(request), served from the cache when possible"""
+    try:
+        user_id = auth._get_user_session_key(request)
+        backend_path = request.session[auth.BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return auth.get_user(request)
+
+    user = cache.get(_cache_key(user_id))
+    session_hash = request.session.get(auth.HASH_SESSION_KEY)
+    if (user is None or not user.is_active or not session_hash
+            or not constant_time_compare(session_hash, user.get_session_auth_hash())):
+        # Miss, or a hash mismatch: let Django decide (it handles key rotation and flushing)
+        user = auth.get_user(request)
+        if user.is_authenticated:
+            cache.set(_cache_key(user.pk), user, USER_CACHE_TIMEOUT)
+        return user
+    user.backend = backend_path
+    return user
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(_cache_key(user_id))
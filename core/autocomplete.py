@@ -0,0 +1,148 @@
+"""
+In-process prefix index for the search box typeahead.
+
+Make and model names (English and Arabic, normalized with core.text) are
+kept in one sorted list of keys; a lookup is a bisect to the first key with
+the typed prefix followed by a short scan, so no query runs per keystroke.
+Every word of a name is indexed, and models are also indexed under
+"<make> <model>", so "cruiser", "toyota la" and "لاند" all find Land Cruiser.
+
+Each worker builds its own index. Names are rebuilt when the catalog
+version changes and ACTIVE listing counts are reloaded when the
+``active:all`` page-cache tag changes (both bumped by core.signals);
+versions are checked at most every ``AUTOCOMPLETE_CHECK_INTERVAL`` seconds
+and the whole index is refreshed after ``AUTOCOMPLETE_MAX_AGE`` regardless.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db.models import Count
+
+from .models import Listing, Make, Model
+from .pagecache import tag_versions
+from .text import normalize
+
+MAX_SUGGESTIONS = 8
+# Scan cap for very short prefixes; results are ranked within these matches
+MAX_SCAN = 2000
+
+
+class PrefixIndex:
+    """Sorted (key, entry) pairs searched with bisect"""
+
+    def __init__(self, entries):
+        pairs = []
+        for position, entry in enumerate(entries):
+            for name in entry['names']:
+                words = normalize(name).split()
+                # Index the name from the start of every word
+                for start in range(len(words)):
+                    pairs.append((' '.join(words[start:]), position))
+        pairs.sort()
+        self.entries = entries
+        self.keys = [key for key, _position in pairs]
+        self.positions = [position for _key, position in pairs]
+
+    def search(self, prefix):
+        """Entries with any key starting with `prefix` (already normalized)"""
+        found = {}
+        start = bisect_left(self.keys, prefix)
+        for i in range(start, min(start + MAX_SCAN, len(self.keys))):
+            if not self.keys[i].startswith(prefix):
+                break
+            found.setdefault(self.positions[i], self.entries[self.positions[i]])
+        return list(found.values())
+
+
+def _build_index():
+    makes = {make.pk: make for make in Make.objects.all()}
+    entries = [
+        {'type': 'make', 'id': make.pk, 'make_id': make.pk,
+         'name_en': make.name_en, 'name_ar': make.name_ar,
+         'names': [make.name_en, make.name_ar]}
+        for make in makes.values()
+    ]
+    for model in Model.objects.all():
+        make = makes[model.make_id]
+        entries.append({
+            'type': 'model', 'id': model.pk, 'make_id': make.pk,
+            'name_en': f'{make.name_en} {model.name_en}', 'name_ar': f'{make.name_ar} {model.name_ar}',
+            'names': [model.name_en, model.name_ar,
+                      f'{make.name_en} {model.name_en}', f'{make.name_ar} {model.name_ar}'],
+        })
+    return PrefixIndex(entries)
+
+
+def _load_counts():
+    """{('make' | 'model', id): ACTIVE listings}, from one grouped query"""
+    counts = {}
+    rows = (Listing.objects.filter(status='ACTIVE').order_by()
+            .values('trim__model_id', 'trim__model__make_id').annotate(n=Count('id')))
+    for row in rows:
+        counts[('model', row['trim__model_id'])] = row['n']
+        make_key = ('make', row['trim__model__make_id'])
+        counts[make_key] = counts.get(make_key, 0) + row['n']
+    return counts
+
+
+class Autocomplete:
+    """The per-process index plus counts, refreshed when their sources change"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = None
+        self.counts = {}
+        self.versions = None
+        self.checked_at = 0.0
+        self.built_at = 0.0
+
+    def refresh(self):
+        now = time.monotonic()
+        if self.index is not None and now - self.checked_at < settings.AUTOCOMPLETE_CHECK_INTERVAL:
+            return
+        with self.lock:
+            if self.index is not None and now - self.checked_at < settings.AUTOCOMPLETE_CHECK_INTERVAL:
+                return  # another thread refreshed while we waited
+            versions = tag_versions('catalog', 'active:all')
+            if self.index is None or now - self.built_at >= settings.AUTOCOMPLETE_MAX_AGE:
+                self.index, self.counts, self.built_at = _build_index(), _load_counts(), now
+            else:
+                if versions['catalog'] != self.versions['catalog']:
+                    self.index = _build_index()
+                if versions['active:all'] != self.versions['active:all']:
+                    self.counts = _load_counts()
+            self.versions = versions
+            self.checked_at = now
+
+    def suggest(self, query, lang, limit=MAX_SUGGESTIONS):
+        """Ranked suggestions for `query`: most ACTIVE listings first, makes before models"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        self.refresh()
+        index, counts = self.index, self.counts
+        results = []
+        for entry in index.search(prefix):
+            count = counts.get((entry['type'], entry['id']), 0)
+            if count:
+                results.append((entry, count))
+        results.sort(key=lambda item: (-item[1], item[0]['type'] != 'make', item[0]['name_en']))
+        return [
+            {
+                'type': entry['type'],
+                'id': entry['id'],
+                'make_id': entry['make_id'],
+                'label': entry['name_ar'] if lang == 'ar' else entry['name_en'],
+                'count': count,
+            }
+            for entry, count in results[:limit]
+        ]
+
+    def clear(self):
+        with self.lock:
+            self.index = None
+
+
+autocomplete = Autocomplete()
@@ -0,0 +1,41 @@
+"""
+Email + password authentication for login_view.
+
+The user is resolved with one query on LOWER(email), which the
+core_user_email_lower_idx expression index serves on PostgreSQL and SQLite
+alike. Unknown addresses still run the password hasher once, as Django's
+ModelBackend does for unknown usernames, so response times do not reveal
+which emails have accounts. An address no account uses returns None, so
+allauth's backend can still match it against secondary EmailAddress rows; a
+wrong password for a matched account raises PermissionDenied, which stops
+``authenticate()`` from retrying the same credentials on later backends.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+from django.db.models import Value
+from django.db.models.functions import Lower
+
+UserModel = get_user_model()
+
+
+class EmailBackend(ModelBackend):
+    """Authenticates ``email=`` credentials; anything else is left to the other backends"""
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if not email or password is None:
+            return None
+        # Emails are not unique; try each account using the address, oldest first
+        users = list(UserModel._default_manager.alias(email_lower=Lower('email')).filter(
+            email_lower=Lower(Value(email.strip())),
+        ).order_by('pk'))
+        if not users:
+            UserModel().set_password(password)
+            return None
+        for user in users:
+            if user.check_password(password):
+                if self.user_can_authenticate(user):
+                    return user
+                # Inactive: let allauth's backend handle it (it shows the "account inactive" page)
+                return None
+        raise PermissionDenied
@@ -0,0 +1,187 @@
+"""
+View benchmark harness.
+
+Runs every core view through the Django test client against a database seeded
+by ``generate_dataset`` and records, per scenario:
+
+- wall time percentiles (p50/p95/p99) in milliseconds
+- SQL query count and total SQL time
+- rendered response size in bytes
+
+Results are plain dicts so they can be dumped to JSON and compared against a
+stored baseline with ``compare_to_baseline``. See the ``benchmark_views``
+management command for the CLI.
+"""
+import statistics
+import time
+from dataclasses import dataclass, field
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import translation
+
+from .models import Listing, Model
+
+User = get_user_model()
+
+
+@dataclass
+class Scenario:
+    """One benchmarked request: a URL name plus a parameter mix"""
+    name: str
+    url_name: str
+    params: dict = field(default_factory=dict)
+    # None = anonymous, 'seller' = busiest seller, 'superuser' = admin account
+    login_as: str = None
+    # Called with the fixtures dict to resolve URL kwargs / dynamic params
+    kwargs: callable = None
+    dynamic_params: callable = None
+
+
+SCENARIOS = [
+    Scenario('home', 'core:home'),
+    Scenario('search:default', 'core:search'),
+    Scenario('search:keyword', 'core:search', {'q': 'Corolla'}),
+    Scenario('search:make+price', 'core:search',
+             dynamic_params=lambda f: {'make': f['make_id'], 'min_price': 200000, 'max_price': 900000}),
+    Scenario('search:filters+sort', 'core:search',
+             {'governorate': 'CAIRO', 'transmission': 'AUTO', 'fuel_type': 'PETROL',
+              'min_year': 2015, 'sort': 'price_low'}),
+    Scenario('search:dealers+views', 'core:search', {'seller_type': 'dealer', 'sort': 'views'}),
+    Scenario('listing_detail', 'core:listing_detail', kwargs=lambda f: {'pk': f['listing_id']}),
+    Scenario('seller_dashboard', 'core:dashboard', login_as='seller'),
+    Scenario('admin_dashboard', 'core:admin_dashboard', login_as='superuser'),
+    Scenario('load_trims', 'core:ajax_load_trims', dynamic_params=lambda f: {'model_id': f['model_id']}),
+    Scenario('compare:3', 'core:compare',
+             dynamic_params=lambda f: {'ids': ','.join(str(pk) for pk in f['compare_ids'])}),
+    Scenario('compare:3:json', 'core:compare',
+             dynamic_params=lambda f: {'ids': ','.join(str(pk) for pk in f['compare_ids']), 'format': 'json'}),
+]
+
+
+def load_fixtures():
+    """Pick representative rows from the seeded database"""
+    active = Listing.objects.filter(status='ACTIVE').order_by('pk')
+    listing = active.select_related('trim__model').first()
+    if listing is None:
+        raise ValueError('The benchmark database has no ACTIVE listings')
+
+    busiest_model = (
+        Model.objects.annotate(trim_count=Count('trims')).order_by('-trim_count').first()
+    )
+    busiest_seller_id = (
+        Listing.objects.values('seller_id').annotate(n=Count('pk')).order_by('-n')
+        .values_list('seller_id', flat=True).first()
+    )
+    superuser = User.objects.filter(is_superuser=True).first()
+    if superuser is None:
+        superuser = User.objects.create_superuser('bench_admin', 'bench_admin@example.com', 'bench_admin')
+
+    return {
+        'listing_id': listing.pk,
+        'make_id': listing.trim.model.make_id,
+        'model_id': busiest_model.pk,
+        'compare_ids': list(active.values_list('pk', flat=True)[:3]),
+        'seller': User.objects.get(pk=busiest_seller_id),
+        'superuser': superuser,
+    }
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(scenario, fixtures, iterations=20, warmup=2, language='en'):
+    """Benchmark one scenario and return its metrics dict"""
+    client = Client()
+    if scenario.login_as:
+        client.force_login(fixtures[scenario.login_as])
+
+    with translation.override(language):
+        url = reverse(scenario.url_name, kwargs=scenario.kwargs(fixtures) if scenario.kwargs else None)
+    params = dict(scenario.params)
+    if scenario.dynamic_params:
+        params.update(scenario.dynamic_params(fixtures))
+
+    for _ in range(warmup):
+        client.get(url, params)
+
+    timings, query_counts, sql_times = [], [], []
+    size = 0
+    status = None
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = client.get(url, params)
+            timings.append((time.perf_counter() - started) * 1000)
+        query_counts.append(len(ctx.captured_queries))
+        sql_times.append(sum(float(q['time']) for q in ctx.captured_queries) * 1000)
+        size = len(response.content)
+        status = response.status_code
+
+    timings.sort()
+    return {
+        'url': url,
+        'params': {key: str(value) for key, value in params.items()},
+        'status': status,
+        'iterations': iterations,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'queries': max(query_counts),
+        'sql_ms': round(statistics.fmean(sql_times), 3),
+        'bytes': size,
+    }
+
+
+def run_all(iterations=20, warmup=2, only=None, stdout=None):
+    """Benchmark every scenario (optionally filtered by name prefix)"""
+    fixtures = load_fixtures()
+    results = {}
+    for scenario in SCENARIOS:
+        if only and not any(scenario.name.startswith(prefix) for prefix in only):
+            continue
+        results[scenario.name] = run_scenario(scenario, fixtures, iterations, warmup)
+        if stdout:
+            r = results[scenario.name]
+            stdout.write(
+                f"  {scenario.name:<24} p50={r['p50_ms']:>9.2f}ms p95={r['p95_ms']:>9.2f}ms "
+                f"queries={r['queries']:>3} sql={r['sql_ms']:>8.2f}ms bytes={r['bytes']}"
+            )
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold=0.2, min_delta_ms=1.0):
+    """
+    Compare results against a baseline of the same shape ({scale: {scenario: metrics}}).
+
+    Returns a list of human-readable regression messages. Wall time regresses
+    when p50 grows by more than ``threshold`` (and by at least ``min_delta_ms``,
+    to ignore noise on very fast views); any growth in query count regresses.
+    """
+    regressions = []
+    for scale, scenarios in results.items():
+        for name, current in scenarios.items():
+            previous = baseline.get(scale, {}).get(name)
+            if not previous:
+                continue
+            limit = previous['p50_ms'] * (1 + threshold)
+            if current['p50_ms'] > limit and current['p50_ms'] - previous['p50_ms'] >= min_delta_ms:
+                regressions.append(
+                    f"[{scale}] {name}: p50 {previous['p50_ms']:.2f}ms -> {current['p50_ms']:.2f}ms "
+                    f"(+{(current['p50_ms'] / max(previous['p50_ms'], 1e-9) - 1) * 100:.0f}%)"
+                )
+            if current['queries'] > previous['queries']:
+                regressions.append(
+                    f"[{scale}] {name}: queries {previous['queries']} -> {current['queries']}"
+                )
+    return regressions
@@ -0,0 +1,132 @@
+"""
+Stampede-safe cache fills.
+
+When a hot entry expires, every worker that misses would otherwise run the
+same expensive computation at once. ``get_or_fill`` prevents that with:
+
+* request coalescing - a lock taken with ``cache.add`` (atomic on Redis and
+  locmem) lets one caller compute while the others wait for its result;
+* stale-while-revalidate - entries are kept ``stale_ttl`` seconds past their
+  expiry and served to everyone but the caller refreshing them;
+* probabilistic early expiry ("XFetch") - shortly before expiry a caller may
+  refresh the entry early, with a probability that grows as expiry nears
+  and with how long the value took to compute, so refreshes rarely line up.
+
+Outcomes are counted per computation name in core.metrics and shown on the
+admin performance page.
+"""
+import math
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+
+POLL_INTERVAL = 0.05
+
+
+class SkipCache(Exception):
+    """Raised by a compute function to return `value` without caching it"""
+
+    def __init__(self, value):
+        super().__init__()
+        self.value = value
+
+
+def new_version():
+    """
+    Starting value for a version counter whose key is missing. An evicted key
+    must not restart at a number it held before, or entries stored under that
+    number would look current again.
+    """
+    return time.time_ns()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _acquire(key):
+    token = uuid.uuid4().hex
+    if cache.add(f'{key}:lock', token, _setting('CACHE_FILL_LOCK_TIMEOUT', 30)):
+        return token
+    return None
+
+
+def _release(key, token):
+    # Only drop the lock if it is still ours (it may have timed out and been retaken)
+    if cache.get(f'{key}:lock') == token:
+        cache.delete(f'{key}:lock')
+
+
+def _fill(key, compute, ttl, stale_ttl):
+    started = time.monotonic()
+    try:
+        value = compute()
+    except SkipCache as skip:
+        return skip.value
+    cost = time.monotonic() - started
+    cache.set(key, (value, time.time() + ttl, cost), ttl + stale_ttl)
+    return value
+
+
+def get_or_fill(key, compute, ttl, *, name, stale_ttl=None, is_stale=None, beta=1.0):
+    """
+    Return the cached value for `key`, computing it with `compute()` at most
+    once across workers.
+
+    `is_stale(value)` lets callers retire an entry before its ttl (e.g. when
+    a version it was built from has changed); such entries are served stale
+    while one caller rebuilds them, like expired ones. `compute` may raise
+    SkipCache to return a value that must not be shared. `beta` scales early
+    expiry (0 disables it).
+    """
+    if stale_ttl is None:
+        stale_ttl = _setting('CACHE_FILL_STALE_TTL', 60)
+
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires_at, cost = entry
+        now = time.time()
+        expired = now >= expires_at or (is_stale is not None and is_stale(value))
+        # 1 - random() is in (0, 1], so the log is defined and <= 0
+        early = not expired and beta and now - cost * beta * math.log(1 - random.random()) >= expires_at
+        if not (expired or early):
+            return value
+        token = _acquire(key)
+        if token is None:
+            # Someone else is refreshing; the current value is good enough meanwhile
+            if expired:
+                metrics.record_cache_event(name, 'stale')
+            return value
+        try:
+            metrics.record_cache_event(name, 'refresh' if expired else 'early')
+            return _fill(key, compute, ttl, stale_ttl)
+        finally:
+            _release(key, token)
+
+    token = _acquire(key)
+    if token is not None:
+        try:
+            metrics.record_cache_event(name, 'fill')
+            return _fill(key, compute, ttl, stale_ttl)
+        finally:
+            _release(key, token)
+
+    # Another worker is filling a cold entry: wait for its result
+    deadline = time.monotonic() + _setting('CACHE_FILL_WAIT_TIMEOUT', 5)
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        found = cache.get_many([key, f'{key}:lock'])
+        if key in found:
+            metrics.record_cache_event(name, 'wait')
+            return found[key][0]
+        if f'{key}:lock' not in found:
+            # The filler finished without caching (SkipCache); compute our own
+            return _fill(key, compute, ttl, stale_ttl)
+    # The filler is stuck or died holding the lock; compute without it
+    metrics.record_cache_event(name, 'timeout')
+    return _fill(key, compute, ttl, stale_ttl)
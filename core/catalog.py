@@ -0,0 +1,114 @@
+"""
+Cached catalog data (makes, models and trim specifications).
+
+Trims are shared by many listings and change rarely, so their spec rows are
+cached per ``CarTrim`` id. Every key carries the current catalog version; any
+save or delete of a Make, Model or CarTrim bumps the version (see
+core.signals), which retires all cached entries at once instead of tracking
+which trims a renamed make touches.
+"""
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+
+from .cachefill import get_or_fill, new_version
+from .models import CarTrim, Make
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_TIMEOUT = 24 * 60 * 60
+
+# Rows of the comparison table, in display order: (key, label, unit)
+SPEC_ROWS = (
+    ('horsepower', _('Horsepower'), _('HP')),
+    ('engine_cc', _('Engine CC'), 'cc'),
+    ('fuel_consumption', _('Fuel Consumption'), 'L/100km'),
+    ('transmission', _('Transmission'), ''),
+    ('fuel_type', _('Fuel'), ''),
+)
+
+
+def catalog_version():
+    return cache.get_or_set(CATALOG_VERSION_KEY, new_version, None) or 1
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog entry"""
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, new_version(), None)
+
+
+def get_makes():
+    """All makes (for filter dropdowns), filled once per catalog version"""
+    return get_or_fill(
+        f'catalog:{catalog_version()}:makes', lambda: list(Make.objects.all()), CATALOG_TIMEOUT,
+        name='catalog:makes',
+    )
+
+
+def _trim_spec(trim):
+    return {
+        'id': trim.pk,
+        'make_en': trim.model.make.name_en,
+        'make_ar': trim.model.make.name_ar,
+        'model_en': trim.model.name_en,
+        'model_ar': trim.model.name_ar,
+        'model_id': trim.model_id,
+        'name': trim.name,
+        'year': trim.year,
+        'horsepower': trim.horsepower,
+        'engine_cc': trim.engine_cc,
+        'fuel_consumption': trim.fuel_consumption,
+        'transmission': trim.transmission,
+        'fuel_type': trim.fuel_type,
+    }
+
+
+def get_trim_specs(trim_ids):
+    """
+    Return {trim_id: spec dict} for the given ids (missing trims are omitted).
+
+    Cache hits cost nothing; all misses are loaded with a single query.
+    """
+    trim_ids = list(dict.fromkeys(trim_ids))
+    if not trim_ids:
+        return {}
+    version = catalog_version()
+    keys = {trim_id: f'trimspec:{version}:{trim_id}' for trim_id in trim_ids}
+    cached = cache.get_many(keys.values())
+    specs = {trim_id: cached[key] for trim_id, key in keys.items() if key in cached}
+
+    missing = [trim_id for trim_id in trim_ids if trim_id not in specs]
+    if missing:
+        loaded = {
+            trim.pk: _trim_spec(trim)
+            for trim in CarTrim.objects.filter(pk__in=missing).select_related('model__make')
+        }
+        cache.set_many({keys[trim_id]: spec for trim_id, spec in loaded.items()}, CATALOG_TIMEOUT)
+        specs.update(loaded)
+    return specs
+
+
+def localize_spec(spec, lang):
+    """Copy of a cached spec with names and choice labels for the active language"""
+    localized = dict(spec)
+    arabic = lang == 'ar'
+    localized['make'] = spec['make_ar'] if arabic else spec['make_en']
+    localized['model'] = spec['model_ar'] if arabic else spec['model_en']
+    localized['transmission_display'] = str(dict(CarTrim.TRANSMISSION_CHOICES).get(spec['transmission'], ''))
+    localized['fuel_type_display'] = str(dict(CarTrim.FUEL_CHOICES).get(spec['fuel_type'], ''))
+    return localized
+
+
+def spec_table(specs):
+    """Comparison rows [{'key', 'label', 'unit', 'values'}] for localized specs, in column order"""
+    rows = []
+    for key, label, unit in SPEC_ROWS:
+        display_key = f'{key}_display'
+        rows.append({
+            'key': key,
+            'label': str(label),
+            'unit': str(unit),
+            'values': [spec.get(display_key, spec[key]) for spec in specs],
+        })
+    return rows
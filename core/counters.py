@@ -0,0 +1,117 @@
+"""
+Buffered hit counters (listing views and phone reveals).
+
+Incrementing a counter column with an UPDATE on every page view turns a
+read-only page into a write, and serialises concurrent viewers of the same
+listing on its row lock. Counters here are summed in process memory instead
+and written back by a timer thread, off the request path, in one short
+transaction - one UPDATE per ``FLUSH_BATCH_SIZE`` rows - within
+``COUNTER_FLUSH_INTERVAL`` seconds of the first pending increment (sooner
+once ``COUNTER_FLUSH_MAX_PENDING`` distinct rows are pending) and at
+interpreter exit. A failed write puts the counts back for the next attempt;
+a crash loses at most one interval of counts, which is acceptable for
+popularity statistics.
+"""
+import atexit
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Case, F, Value, When
+
+FLUSH_BATCH_SIZE = 500
+
+
+class BufferedCounter:
+    """Accumulates increments of one integer column, keyed by primary key"""
+
+    def __init__(self, model_label, field):
+        self.model_label = model_label
+        self.field = field
+        self.pending = Counter()
+        self.lock = threading.Lock()
+        self.timer = None
+        self.timer_due = None
+
+    @property
+    def model(self):
+        from django.apps import apps
+        return apps.get_model(self.model_label)
+
+    def incr(self, pk, delta=1):
+        with self.lock:
+            self.pending[pk] += delta
+            full = len(self.pending) >= getattr(settings, 'COUNTER_FLUSH_MAX_PENDING', 500)
+            self._schedule(0 if full else getattr(settings, 'COUNTER_FLUSH_INTERVAL', 10))
+
+    def _schedule(self, delay):
+        # Called with the lock held; keeps the earlier of the running timer and `delay`
+        due = time.monotonic() + delay
+        if self.timer is not None:
+            if self.timer_due <= due:
+                return
+            self.timer.cancel()
+        self.timer = threading.Timer(delay, self._flush_from_timer)
+        self.timer.daemon = True
+        self.timer_due = due
+        self.timer.start()
+
+    def _flush_from_timer(self):
+        with self.lock:
+            self.timer = None
+        try:
+            self.flush()
+        except Exception:
+            # flush() put the counts back; retry after another interval
+            with self.lock:
+                self._schedule(getattr(settings, 'COUNTER_FLUSH_INTERVAL', 10))
+            raise
+        finally:
+            # This thread's connection would otherwise stay open until exit
+            connections.close_all()
+
+    def pending_for(self, pk):
+        """Increments for `pk` not yet written to the database"""
+        return self.pending.get(pk, 0)
+
+    def flush(self):
+        """Write buffered increments; returns the number of rows touched"""
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+        if not pending:
+            return 0
+        model = self.model
+        # Sorted so concurrent flushes take row locks in the same order
+        pks = sorted(pending)
+        try:
+            with transaction.atomic():
+                for start in range(0, len(pks), FLUSH_BATCH_SIZE):
+                    batch = pks[start:start + FLUSH_BATCH_SIZE]
+                    increment = Case(*(When(pk=pk, then=Value(pending[pk])) for pk in batch))
+                    model.objects.filter(pk__in=batch).update(**{self.field: F(self.field) + increment})
+        except Exception:
+            with self.lock:
+                self.pending.update(pending)
+            raise
+        return len(pending)
+
+
+listing_views = BufferedCounter('core.Listing', 'views')
+phone_clicks = BufferedCounter('core.Listing', 'phone_clicks')
+
+COUNTERS = [listing_views, phone_clicks]
+
+
+def flush_all():
+    return sum(counter.flush() for counter in COUNTERS)
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush_all()
+    except Exception:
+        # The database may already be gone during interpreter shutdown
+        pass
@@ -0,0 +1,95 @@
+"""
+Per-user favorite state for listing grids.
+
+Listing cards need to know whether the current user has favorited them.
+Instead of asking per card, the user's favorited listing IDs are loaded with
+one query, cached as a compact sorted integer array, and memoised on the
+request. ``toggle_favorite`` invalidates the cached entry once its
+transaction commits.
+"""
+from array import array
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.translation import gettext as _
+
+from .models import Favorite, Listing
+
+FAVORITE_IDS_TIMEOUT = 60 * 60
+
+
+def _cache_key(user_id):
+    return f'favorite_ids:{user_id}'
+
+
+def get_favorite_ids(user):
+    """Return a frozenset of listing IDs the user has favorited"""
+    if not user.is_authenticated:
+        return frozenset()
+    key = _cache_key(user.pk)
+    packed = cache.get(key)
+    if packed is None:
+        ids = sorted(Favorite.objects.filter(user_id=user.pk).values_list('listing_id', flat=True))
+        packed = array('q', ids).tobytes()
+        cache.set(key, packed, FAVORITE_IDS_TIMEOUT)
+    ids = array('q')
+    ids.frombytes(packed)
+    return frozenset(ids)
+
+
+def favorite_ids_for(request):
+    """get_favorite_ids() memoised on the request"""
+    if not hasattr(request, '_favorite_ids'):
+        request._favorite_ids = get_favorite_ids(request.user)
+    return request._favorite_ids
+
+
+def invalidate_favorite_ids(user_id):
+    cache.delete(_cache_key(user_id))
+
+
+def toggle_favorite(user_id, listing_id):
+    """
+    Add or remove a favorite, keeping Listing.favorites_count in step.
+
+    Returns (is_favorited, favorites_count).
+    """
+    with transaction.atomic():
+        favorite, created = Favorite.objects.get_or_create(user_id=user_id, listing_id=listing_id)
+        if created:
+            Listing.objects.filter(pk=listing_id).update(favorites_count=F('favorites_count') + 1)
+        else:
+            # Already favorited, so remove it; the post_delete receiver recounts (core.signals)
+            Favorite.objects.filter(pk=favorite.pk).delete()
+        # A reader refilling the cache before the commit would store the old IDs again
+        transaction.on_commit(partial(invalidate_favorite_ids, user_id))
+    favorites_count = Listing.objects.filter(pk=listing_id).values_list('favorites_count', flat=True).first()
+    return created, favorites_count
+
+
+def recount_favorites(listing_id):
+    """Set Listing.favorites_count from the Favorite rows, after deletes that may not have been counted"""
+    counts = Favorite.objects.filter(listing_id=OuterRef('pk')).order_by().values('listing_id').annotate(
+        count=Count('pk'),
+    ).values('count')
+    Listing.objects.filter(pk=listing_id).update(favorites_count=Coalesce(Subquery(counts), 0))
+
+
+def favorite_response_data(is_favorited, favorites_count):
+    """JSON body shared by the sync and async toggle_favorite views"""
+    if is_favorited:
+        return {
+            'status': 'added',
+            'message': _('Added to favorites'),
+            'is_favorited': True,
+            'favorites_count': favorites_count,
+        }
+    return {
+        'status': 'removed',
+        'message': _('Removed from favorites'),
+        'is_favorited': False,
+        'favorites_count': favorites_count,
+    }
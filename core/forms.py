@@ -1,7 +1,7 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.utils.translation import gettext_lazy as _
-from .models import Listing, Make, Model, CarTrim, User
+from .models import Listing, Make, Model, CarTrim, SavedSearch, User
 
 class ListingForm(forms.ModelForm):
     """Form for creating/editing car listings with cascading dropdowns"""
@@ -170,3 +170,27 @@ class UserUpdateForm(forms.ModelForm):
             self.fields.pop('commercial_registry')
             self.fields.pop('tax_card')
 
+
+
+class SavedSearchForm(forms.ModelForm):
+    """Validates search_listings parameters before saving them as a SavedSearch"""
+
+    class Meta:
+        model = SavedSearch
+        fields = list(SavedSearch.PARAMS.values())
+
+    @classmethod
+    def from_params(cls, params, **kwargs):
+        """Bound form for search_listings query parameters (``q`` -> ``query`` and so on)"""
+        data = {field: params.get(param, '') for param, field in SavedSearch.PARAMS.items()}
+        return cls(data, **kwargs)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        make = cleaned_data.get('make')
+        model = cleaned_data.get('model')
+        if model and make and model.make_id != make.pk:
+            raise forms.ValidationError(_("Selected model does not match the selected make."))
+        if not any(cleaned_data.get(field) not in (None, '') for field in SavedSearch.PARAMS.values()):
+            raise forms.ValidationError(_("Choose at least one filter to save this search."))
+        return cleaned_data
@@ -0,0 +1,288 @@
+"""
+Typo- and script-tolerant matching of search box words to the catalog.
+
+"مرسيدس", "mercedes", "mersedes" and "benz" should all find Mercedes-Benz.
+Each word of every make and model name is indexed three ways:
+
+* its normalized spelling (core.text.normalize), for exact hits;
+* a phonetic key: the word transliterated to a reduced Latin alphabet
+  (Arabic letters via a table, Latin spelling rules such as c->s before e/i,
+  p->b, v->f, j->g for the Egyptian jeem), every vowel folded to "a" and
+  doubled letters collapsed - "mersedes" and "mercedes" both become "marsadas";
+* a skeleton: the phonetic key without vowels, which Arabic script mostly
+  omits anyway - مرسيدس and Mercedes both become "mrsds".
+
+A query word that misses the first two is compared with skeletons starting
+with the same letter and sharing enough character bigrams with it (the
+q-gram bound), accepting a Levenshtein distance of 1, or 2 for long words;
+skeletons of four letters or fewer must match exactly. ``keyword_filter``
+turns exact matches into indexed make/model id filters. A typo match may be
+an ordinary word ("accident" is close to Accent), so it matches the catalog
+or the description; words that match nothing stay text filters.
+"""
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Q
+
+from .catalog import catalog_version
+from .models import Make, Model
+from .text import normalize
+
+ARABIC_TO_LATIN = {
+    'ا': 'a', 'ب': 'b', 'ت': 't', 'ث': 's', 'ج': 'g', 'ح': 'h', 'خ': 'kh', 'د': 'd',
+    'ذ': 'z', 'ر': 'r', 'ز': 'z', 'س': 's', 'ش': 'sh', 'ص': 's', 'ض': 'd', 'ط': 't',
+    'ظ': 'z', 'ع': 'a', 'غ': 'g', 'ف': 'f', 'ق': 'k', 'ك': 'k', 'ل': 'l', 'م': 'm',
+    'ن': 'n', 'ه': 'h', 'و': 'o', 'ي': 'i', 'ء': '',
+}
+
+# Applied in order to normalized Latin words
+LATIN_RULES = [(re.compile(pattern), replacement) for pattern, replacement in (
+    ('ph', 'f'), ('ch', 'sh'), ('ck', 'k'), ('gh', 'g'), ('th', 't'), ('qu', 'k'),
+    ('c(?=[eiy])', 's'), ('c', 'k'), ('q', 'k'), ('x', 'ks'), ('v', 'f'), ('p', 'b'),
+    ('j', 'g'), ('w', 'o'), ('y', 'i'),
+)]
+
+_VOWELS = re.compile('[aeiou]')
+_REPEATS = re.compile(r'(.)\1+')
+_ARABIC = re.compile('[؀-ۿ]')
+_EDGE_PUNCTUATION = re.compile(r'^\W+|\W+$')
+
+# Shortest skeleton matched against skeletons at all; shorter words must match a key exactly
+MIN_FUZZY_LENGTH = 3
+# Skeletons up to this long must match exactly, longer ones within an edit distance
+EXACT_SKELETON_LENGTH = 4
+YEAR_RANGE = range(1950, 2100)
+
+
+def phonetic_key(word):
+    """Reduced-Latin spelling of a normalized word, the same for both scripts"""
+    if _ARABIC.search(word):
+        # A final heh is almost always a vowel (e.g. شيفروليه)
+        if word.endswith('ه'):
+            word = word[:-1] + 'ا'
+        word = ''.join(ARABIC_TO_LATIN.get(ch, ch) for ch in word)
+    else:
+        for pattern, replacement in LATIN_RULES:
+            word = pattern.sub(replacement, word)
+    return _REPEATS.sub(r'\1', _VOWELS.sub('a', word))
+
+
+def skeleton(key):
+    return key.replace('a', '') or key
+
+
+def _bigrams(text):
+    padded = f'^{text}$'
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance, or limit + 1 once it is known to exceed `limit`"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class CatalogMatcher:
+    """Per-process word index over make/model names, rebuilt when the catalog version changes"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.checked_at = 0.0
+
+    def _build(self):
+        exact = defaultdict(set)       # normalized word -> {(kind, id)}
+        phonetic = defaultdict(set)    # phonetic key -> {(kind, id)}
+        skeletons = defaultdict(set)   # skeleton -> {(kind, id)}
+        initials = defaultdict(set)    # skeleton -> {first letter of its phonetic keys}
+        bigrams = defaultdict(set)     # bigram -> {skeleton}
+        model_make = {}
+        names = [('make', make.pk, make.name_en, make.name_ar) for make in Make.objects.all()]
+        for model in Model.objects.all():
+            model_make[model.pk] = model.make_id
+            names.append(('model', model.pk, model.name_en, model.name_ar))
+        for kind, pk, *spellings in names:
+            for word in normalize(' '.join(spellings)).split():
+                ref = (kind, pk)
+                exact[word].add(ref)
+                key = phonetic_key(word)
+                phonetic[key].add(ref)
+                bones = skeleton(key)
+                if len(bones) >= MIN_FUZZY_LENGTH:
+                    skeletons[bones].add(ref)
+                    initials[bones].add(key[0])
+                    for gram in _bigrams(bones):
+                        bigrams[gram].add(bones)
+        # Swapped in only once complete, for requests reading concurrently
+        self.exact, self.phonetic, self.skeletons, self.bigrams = exact, phonetic, skeletons, bigrams
+        self.initials = initials
+        self.model_make = model_make
+
+    def refresh(self):
+        now = time.monotonic()
+        if self.version is not None and now - self.checked_at < settings.AUTOCOMPLETE_CHECK_INTERVAL:
+            return
+        with self.lock:
+            if self.version is not None and now - self.checked_at < settings.AUTOCOMPLETE_CHECK_INTERVAL:
+                return  # another thread refreshed while we waited
+            version = catalog_version()
+            if version != self.version:
+                self._build()
+                self.version = version
+            self.checked_at = now
+
+    def match_word(self, word):
+        """
+        ({(kind, id)}, exact) for a normalized word, using the closest matches
+        only. `exact` is False for typo matches, which may just as well be an
+        ordinary word ("accident" is one edit from Accent's skeleton).
+        """
+        exact, phonetic = self.exact, self.phonetic
+        if word in exact:
+            return exact[word], True
+        key = phonetic_key(word)
+        if key in phonetic:
+            return phonetic[key], True
+        bones = skeleton(key)
+        if len(bones) < MIN_FUZZY_LENGTH:
+            return set(), False
+        if len(bones) <= EXACT_SKELETON_LENGTH:
+            # Short skeletons are shared by too many unrelated words to allow edits
+            return (set(self.skeletons.get(bones, ())) if key[0] in self.initials.get(bones, ()) else set()), False
+        limit = 1 if len(bones) <= 5 else 2
+        shared = defaultdict(int)
+        for gram in _bigrams(bones):
+            for candidate in self.bigrams.get(gram, ()):
+                shared[candidate] += 1
+        best, found = limit + 1, set()
+        for candidate, count in shared.items():
+            # Each edit destroys at most two bigrams; typos rarely hit the first letter
+            if (
+                len(candidate) <= EXACT_SKELETON_LENGTH
+                or key[0] not in self.initials[candidate]
+                or count < max(len(bones), len(candidate)) + 1 - 2 * limit
+            ):
+                continue
+            distance = edit_distance(bones, candidate, limit)
+            if distance < best:
+                best, found = distance, set(self.skeletons[candidate])
+            elif distance == best:
+                found |= self.skeletons[candidate]
+        return found, False
+
+    def rewrite(self, query):
+        """
+        Split a search box query into {'make_ids', 'model_ids', 'years', 'text', 'fuzzy'}:
+        exact catalog matches, model years, the words that matched neither (as
+        typed, for searching descriptions), and [(word as typed, make ids,
+        model ids)] for words that only matched with typos - those match either
+        the catalog or the description.
+        """
+        self.refresh()
+        makes, models, years, text, fuzzy = set(), set(), [], [], []
+        for typed in query.split():
+            unmatched, guessed = False, set()
+            for word in normalize(typed).split():
+                refs, exact = self.match_word(word)
+                if refs and exact:
+                    for found, kind in ((makes, 'make'), (models, 'model')):
+                        ids = {pk for ref_kind, pk in refs if ref_kind == kind}
+                        # Words of one name narrow each other ("c class"); separate names add up
+                        if found & ids:
+                            found.intersection_update(ids)
+                        else:
+                            found.update(ids)
+                elif refs:
+                    guessed |= refs
+                elif word.isdigit() and int(word) in YEAR_RANGE:
+                    years.append(int(word))
+                else:
+                    unmatched = True
+            # Descriptions are stored as typed, so they are searched for the word as typed, not its folded form
+            typed = _EDGE_PUNCTUATION.sub('', typed)
+            if not typed:
+                continue
+            if unmatched:
+                text.append(typed)
+            elif guessed:
+                fuzzy.append((
+                    typed,
+                    {pk for kind, pk in guessed if kind == 'make'},
+                    {pk for kind, pk in guessed if kind == 'model'},
+                ))
+        return {'make_ids': makes, 'model_ids': models, 'years': years, 'text': text, 'fuzzy': fuzzy}
+
+
+matcher = CatalogMatcher()
+
+
+def _catalog_ids(parts):
+    """(make ids, model ids) a listing may match; "toyota corolla" keeps only the makes' models"""
+    makes, models = parts['make_ids'], parts['model_ids']
+    if makes and models:
+        narrowed = {pk for pk in models if matcher.model_make.get(pk) in makes}
+        if narrowed:
+            return set(), narrowed
+    return makes, models
+
+
+def _catalog_q(makes, models):
+    condition = Q()
+    if makes:
+        condition |= Q(trim__model__make_id__in=makes)
+    if models:
+        condition |= Q(trim__model_id__in=models)
+    return condition
+
+
+def keyword_filter(query):
+    """
+    Q for listings matching the search box text, or None when no word
+    matched the catalog (callers then fall back to a plain text search).
+    """
+    parts = matcher.rewrite(query)
+    makes, models = _catalog_ids(parts)
+    if not (makes or models or parts['fuzzy']):
+        return None
+    condition = _catalog_q(makes, models)
+    for word, fuzzy_makes, fuzzy_models in parts['fuzzy']:
+        condition &= _catalog_q(fuzzy_makes, fuzzy_models) | Q(description__icontains=word)
+    if parts['years']:
+        condition &= Q(trim__year__in=parts['years'])
+    for word in parts['text']:
+        condition &= Q(description__icontains=word)
+    return condition
+
+
+def keyword_matches(query, listing):
+    """In-memory equivalent of search_listings' keyword filter, for a listing with its trim, model and make loaded"""
+    parts = matcher.rewrite(query)
+    makes, models = _catalog_ids(parts)
+    model = listing.trim.model
+    if not (makes or models or parts['fuzzy']):
+        needle = query.casefold()
+        names = (model.name_en, model.name_ar, model.make.name_en, model.make.name_ar, listing.description)
+        return any(needle in name.casefold() for name in names)
+    description = listing.description.casefold()
+    return (
+        (not (makes or models) or model.make_id in makes or model.pk in models)
+        and all(
+            model.make_id in fuzzy_makes or model.pk in fuzzy_models or word.casefold() in description
+            for word, fuzzy_makes, fuzzy_models in parts['fuzzy']
+        )
+        and (not parts['years'] or listing.trim.year in parts['years'])
+        and all(word.casefold() in description for word in parts['text'])
+    )
@@ -0,0 +1,18 @@
+"""
+Password hashers.
+
+PBKDF2PasswordHasher is Django's, with the work factor taken from
+``settings.PASSWORD_HASH_ITERATIONS`` (0 keeps Django's default). Hashes
+record their own iteration count, so existing passwords keep verifying and
+are rehashed to the configured count on the next successful login. Measure
+the trade-off with ``python manage.py benchmark_logins``.
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS or hashers.PBKDF2PasswordHasher.iterations
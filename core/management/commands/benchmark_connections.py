@@ -0,0 +1,147 @@
+"""
+Management command to measure what database connection handling costs per request
+Usage: python manage.py benchmark_connections --requests 500
+       DB_ENGINE=django.db.backends.postgresql DB_POOL=True python manage.py benchmark_connections
+
+Sends requests through the real WSGI handler (so Django opens and closes
+connections exactly as under gunicorn) against the configured database in
+three modes:
+
+  per-request  CONN_MAX_AGE=0: connect and disconnect around every request
+  persistent   CONN_MAX_AGE=60 with health checks: reuse the worker's connection
+  pool         psycopg 3 pool (PostgreSQL only; skipped elsewhere)
+
+and reports request latency plus how many connections were opened and how
+long opening one takes (with the pool, both count checkouts from the pool).
+Run it against PostgreSQL over the network to see the real cost; on SQLite
+connecting is nearly free.
+"""
+
+import json
+import time
+from io import BytesIO
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from core.benchmarks import percentile
+from core.models import Make
+
+MODES = ('per-request', 'persistent', 'pool')
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks per-request vs persistent vs pooled database connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per mode (default: 500)')
+        parser.add_argument('--modes', default=','.join(MODES), help=f'Comma-separated: {", ".join(MODES)}')
+        parser.add_argument('--output', help='Also write the results as JSON')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests must be at least 1.')
+        modes = [mode for mode in options['modes'].split(',') if mode]
+        unknown = [mode for mode in modes if mode not in MODES]
+        if unknown or not modes:
+            raise CommandError(
+                f"--modes takes a comma-separated subset of {', '.join(MODES)}, got '{options['modes']}'."
+            )
+
+        make = Make.objects.order_by('pk').first()
+        path = f'/en/ajax/load-models/?make_id={make.pk if make else 0}'
+        environ = RequestFactory(SERVER_NAME='localhost')._base_environ(
+            PATH_INFO='/en/ajax/load-models/', QUERY_STRING=path.partition('?')[2],
+        )
+        handler = WSGIHandler()
+        original = dict(connection.settings_dict)
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{connection.vendor}: GET {path}'))
+
+        results = {}
+        try:
+            for mode in modes:
+                if not self.configure(mode, original):
+                    self.stdout.write(f'  {mode:<12} skipped (needs PostgreSQL with psycopg 3 pool support)')
+                    continue
+                results[mode] = self.run(handler, environ, options['requests'])
+                self.report(mode, results[mode])
+        finally:
+            connection.close()
+            connection.settings_dict.clear()
+            connection.settings_dict.update(original)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(results, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"\n✓ Results written to {options['output']}"))
+
+    def configure(self, mode, original):
+        connection.close()
+        settings_dict = connection.settings_dict
+        settings_dict.clear()
+        settings_dict.update(original)
+        options = {key: value for key, value in original.get('OPTIONS', {}).items() if key != 'pool'}
+        if mode == 'per-request':
+            settings_dict.update(CONN_MAX_AGE=0, OPTIONS=options)
+        elif mode == 'persistent':
+            settings_dict.update(CONN_MAX_AGE=60, CONN_HEALTH_CHECKS=True, OPTIONS=options)
+        else:
+            if connection.vendor != 'postgresql':
+                return False
+            try:
+                import psycopg_pool  # noqa: F401
+            except ImportError:
+                return False
+            pool = original.get('OPTIONS', {}).get('pool') or {'min_size': 1, 'max_size': 1}
+            settings_dict.update(CONN_MAX_AGE=0, OPTIONS={**options, 'pool': pool})
+        return True
+
+    def run(self, handler, environ, total):
+        connects = []
+
+        def on_connect(sender, connection, **kwargs):
+            connects.append(connection.alias)
+
+        timings = []
+        connection_created.connect(on_connect)
+        try:
+            for _ in range(total):
+                request_environ = dict(environ, **{'wsgi.input': BytesIO()})
+                started = time.perf_counter()
+                response = handler(request_environ, lambda status, headers: None)
+                b''.join(response)
+                response.close()  # fires request_finished, which closes/returns the connection
+                timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            connection_created.disconnect(on_connect)
+
+        connect_ms = self.time_connect()
+        timings.sort()
+        return {
+            'requests': total,
+            'connections_opened': len(connects),
+            'connect_ms': round(connect_ms, 3),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+        }
+
+    def time_connect(self):
+        """Average cost of opening a fresh connection (the pool hands out a warm one instead)"""
+        samples = []
+        for _ in range(10):
+            connection.close()
+            started = time.perf_counter()
+            connection.ensure_connection()
+            samples.append((time.perf_counter() - started) * 1000)
+        connection.close()
+        return sum(samples) / len(samples)
+
+    def report(self, mode, stats):
+        self.stdout.write(
+            f"  {mode:<12} p50 {stats['p50_ms']:>7.3f} ms   p95 {stats['p95_ms']:>7.3f} ms   "
+            f"mean {stats['mean_ms']:>7.3f} ms   {stats['connections_opened']:>5} connects "
+            f"(~{stats['connect_ms']:.3f} ms each)"
+        )
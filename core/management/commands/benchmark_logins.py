@@ -0,0 +1,76 @@
+"""
+Management command to measure email login cost at different password hasher work factors
+Usage: python manage.py benchmark_logins --iterations 0,600000,300000 --logins 20
+
+For each PBKDF2 iteration count (0 = Django's default) a throwaway user is
+created inside a rolled-back transaction and authenticated through
+core.backends.EmailBackend with the right password, a wrong one and an
+unknown email. Nearly all of a login is the hash, so logins/s per core is
+roughly what one worker process can sustain; choose
+PASSWORD_HASH_ITERATIONS from the result.
+"""
+import json
+import time
+
+from django.contrib.auth import authenticate, hashers
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from core.benchmarks import percentile
+from core.models import User
+
+EMAIL = 'benchmark-login@example.com'
+PASSWORD = 'correct horse battery staple'
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks email logins with the default and configurable PBKDF2 work factors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', default='0,600000,300000',
+                            help="Comma-separated PBKDF2 iteration counts; 0 is Django's default")
+        parser.add_argument('--logins', type=int, default=20, help='Logins timed per case (default: 20)')
+        parser.add_argument('--output', help='Also write the results as JSON')
+
+    def handle(self, *args, **options):
+        results = {}
+        for iterations in [int(value) for value in options['iterations'].split(',') if value]:
+            with override_settings(PASSWORD_HASH_ITERATIONS=iterations):
+                effective = hashers.get_hasher().iterations
+                results[effective] = self.run(options['logins'])
+            self.report(effective, iterations == 0, results[effective])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(results, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"\n✓ Results written to {options['output']}"))
+
+    def run(self, total):
+        with transaction.atomic():
+            User.objects.create_user(username='benchmark-login', email=EMAIL, password=PASSWORD)
+            with CaptureQueriesContext(connection) as queries:
+                user = authenticate(None, email=EMAIL.upper(), password=PASSWORD)
+            assert user is not None, 'benchmark user did not authenticate'
+            stats = {'queries': len(queries)}
+            for case, email, password in (('success', EMAIL, PASSWORD), ('wrong_password', EMAIL, 'nope'),
+                                          ('unknown_email', 'nobody@example.com', PASSWORD)):
+                timings = []
+                for _ in range(total):
+                    started = time.perf_counter()
+                    authenticate(None, email=email, password=password)
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                stats[case] = {'p50_ms': round(percentile(timings, 50), 2), 'p95_ms': round(percentile(timings, 95), 2)}
+            stats['logins_per_second'] = round(1000 / stats['success']['p50_ms'], 1)
+            transaction.set_rollback(True)
+        return stats
+
+    def report(self, iterations, default, stats):
+        label = f"{iterations:>9,} iterations{' (default)' if default else '          '}"
+        self.stdout.write(
+            f"  {label}  success p50 {stats['success']['p50_ms']:>7.2f} ms   "
+            f"wrong password {stats['wrong_password']['p50_ms']:>7.2f} ms   "
+            f"unknown email {stats['unknown_email']['p50_ms']:>7.2f} ms   "
+            f"{stats['logins_per_second']:>6.1f} logins/s per core   {stats['queries']} queries"
+        )
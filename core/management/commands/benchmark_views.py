@@ -0,0 +1,137 @@
+"""
+Management command to benchmark the core views at several data scales
+Usage: python manage.py benchmark_views --scales 1000,100000 --output results.json
+       python manage.py benchmark_views --baseline results.json --threshold 0.2
+
+Each scale gets its own throwaway database (created the same way the test
+runner creates test databases) seeded with generate_dataset. Use --keepdb to
+keep seeded databases between runs; seeding 1M listings takes a few minutes.
+Exits with an error when a scenario regresses past --threshold.
+"""
+
+import json
+from contextlib import contextmanager
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from core.benchmarks import SCENARIOS, run_all, compare_to_baseline
+from core.models import Listing
+
+DEFAULT_SCALES = '1000,100000,1000000'
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks core views (timings, SQL queries, response size) at fixed data scales'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default=DEFAULT_SCALES,
+                            help=f'Comma-separated listing counts (default: {DEFAULT_SCALES})')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', default='', help='Comma-separated scenario name prefixes')
+        parser.add_argument('--output', default='benchmark-results.json')
+        parser.add_argument('--baseline', help='Results JSON to compare against')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed relative p50 slowdown before failing (default: 0.2 = 20%%)')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse/keep the seeded benchmark databases')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        scales, only, baseline = self.validate(options)
+
+        setup_test_environment()
+        results = {}
+        try:
+            for scale in scales:
+                self.stdout.write(self.style.MIGRATE_HEADING(f'\nScale: {scale:,} listings'))
+                with self.benchmark_database(scale, options['keepdb']):
+                    self.seed(scale, options['seed'])
+                    results[str(scale)] = run_all(
+                        iterations=options['iterations'], warmup=options['warmup'],
+                        only=only, stdout=self.stdout,
+                    )
+        finally:
+            teardown_test_environment()
+
+        with open(options['output'], 'w', encoding='utf-8') as fh:
+            json.dump(results, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"\n✓ Results written to {options['output']}"))
+
+        if baseline is not None:
+            regressions = compare_to_baseline(results, baseline, options['threshold'])
+            if regressions:
+                for message in regressions:
+                    self.stderr.write(f'  ✗ {message}')
+                raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS('✓ No regressions against baseline'))
+
+    def validate(self, options):
+        """(scales, scenario prefixes, baseline results), checked before any database is seeded"""
+        try:
+            scales = [int(scale) for scale in options['scales'].split(',') if scale.strip()]
+        except ValueError:
+            raise CommandError(f"--scales must be comma-separated listing counts, got '{options['scales']}'.")
+        if not scales or min(scales) < 1:
+            raise CommandError('--scales needs at least one listing count above 0.')
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1.')
+        if options['warmup'] < 0:
+            raise CommandError('--warmup cannot be negative.')
+        if options['threshold'] < 0:
+            raise CommandError('--threshold cannot be negative.')
+
+        only = [prefix for prefix in options['only'].split(',') if prefix]
+        unknown = [prefix for prefix in only if not any(scenario.name.startswith(prefix) for scenario in SCENARIOS)]
+        if unknown:
+            raise CommandError(f"--only matches no scenario: {', '.join(unknown)}")
+
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as fh:
+                    baseline = json.load(fh)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read --baseline {options['baseline']}: {exc}")
+        return scales, only, baseline
+
+    @contextmanager
+    def benchmark_database(self, scale, keepdb):
+        """Point the default connection at a per-scale database for the duration"""
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        old_name = connection.settings_dict['NAME']
+        old_test_name = test_settings.get('NAME')
+        if connection.vendor == 'sqlite':
+            test_settings['NAME'] = f'bench_{scale}.sqlite3'
+        else:
+            test_settings['NAME'] = f'bench_{scale}_{old_name}'
+
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+        try:
+            yield
+        finally:
+            if keepdb:
+                connection.close()
+                connection.settings_dict['NAME'] = old_name
+            else:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            test_settings['NAME'] = old_test_name
+
+    def seed(self, scale, seed):
+        existing = Listing.objects.count()
+        if existing >= scale:
+            self.stdout.write(f'  Reusing {existing:,} seeded listings')
+            return
+        self.stdout.write(f'  Seeding {scale:,} listings...')
+        call_command(
+            'generate_dataset',
+            seed=seed,
+            listings=scale - existing,
+            users=max(scale // 20, 50),
+            dealers=max(scale // 500, 5),
+            favorites=scale // 2,
+            prefix=f'bench{scale}_{existing}_',
+            stdout=StringIO(),
+        )
@@ -0,0 +1,348 @@
+"""
+Management command to generate a large synthetic dataset for load/benchmark testing
+Usage: python manage.py generate_dataset --listings 1000000 --seed 42 [--images]
+
+Unlike populate_sample_data, every table is filled with bulk_create in large
+batches and all values are drawn from a seeded RNG, so the same arguments
+always produce the same data. Catalog rows (makes, models, and trims per model
+year) are reused if they already exist, so the command can be run against a
+seeded database.
+"""
+
+import random
+import time
+from array import array
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.utils import timezone
+from core.models import Make, Model, CarTrim, Listing, Favorite
+
+User = get_user_model()
+
+# (name_en, name_ar, price tier in EGP for a new mid-size car, models)
+CATALOG = [
+    ('Toyota', 'تويوتا', 1300000, [
+        ('Corolla', 'كورولا', 'Sedan'), ('Camry', 'كامري', 'Sedan'),
+        ('RAV4', 'راف فور', 'SUV'), ('Yaris', 'ياريس', 'Hatchback'),
+        ('Fortuner', 'فورتشنر', 'SUV'),
+    ]),
+    ('Hyundai', 'هيونداي', 1000000, [
+        ('Elantra', 'النترا', 'Sedan'), ('Accent', 'اكسنت', 'Sedan'),
+        ('Tucson', 'توسان', 'SUV'), ('i10', 'آي 10', 'Hatchback'),
+    ]),
+    ('Kia', 'كيا', 950000, [
+        ('Cerato', 'سيراتو', 'Sedan'), ('Sportage', 'سبورتاج', 'SUV'),
+        ('Picanto', 'بيكانتو', 'Hatchback'), ('Rio', 'ريو', 'Sedan'),
+    ]),
+    ('Nissan', 'نيسان', 950000, [
+        ('Sunny', 'صني', 'Sedan'), ('Sentra', 'سنترا', 'Sedan'),
+        ('Qashqai', 'قشقاي', 'SUV'),
+    ]),
+    ('Chevrolet', 'شيفروليه', 800000, [
+        ('Optra', 'أوبترا', 'Sedan'), ('Aveo', 'أفيو', 'Sedan'),
+        ('Captiva', 'كابتيفا', 'SUV'),
+    ]),
+    ('Mercedes-Benz', 'مرسيدس بنز', 3500000, [
+        ('C-Class', 'الفئة C', 'Sedan'), ('E-Class', 'الفئة E', 'Sedan'),
+        ('GLC', 'جي إل سي', 'SUV'),
+    ]),
+    ('BMW', 'بي إم دبليو', 3300000, [
+        ('320i', '320i', 'Sedan'), ('520i', '520i', 'Sedan'),
+        ('X3', 'X3', 'SUV'), ('X5', 'X5', 'SUV'),
+    ]),
+    ('Renault', 'رينو', 750000, [
+        ('Logan', 'لوجان', 'Sedan'), ('Megane', 'ميجان', 'Sedan'),
+        ('Duster', 'داستر', 'SUV'),
+    ]),
+    ('Peugeot', 'بيجو', 1100000, [
+        ('301', '301', 'Sedan'), ('508', '508', 'Sedan'), ('3008', '3008', 'SUV'),
+    ]),
+    ('Skoda', 'سكودا', 1200000, [
+        ('Octavia', 'أوكتافيا', 'Sedan'), ('Kodiaq', 'كودياك', 'SUV'),
+    ]),
+    ('MG', 'إم جي', 850000, [
+        ('MG5', 'إم جي 5', 'Sedan'), ('ZS', 'زد إس', 'SUV'), ('RX5', 'آر إكس 5', 'SUV'),
+    ]),
+    ('Chery', 'شيري', 800000, [
+        ('Tiggo 7', 'تيجو 7', 'SUV'), ('Arrizo 5', 'أريزو 5', 'Sedan'),
+    ]),
+]
+
+CATEGORY_PRICE_FACTOR = {'Hatchback': 0.75, 'Sedan': 1.0, 'SUV': 1.35}
+ENGINE_SIZES = {'Hatchback': [1000, 1200, 1400], 'Sedan': [1400, 1600, 2000], 'SUV': [1500, 2000, 2500]}
+
+# Most listings come from the big cities
+GOVERNORATE_WEIGHTS = {'CAIRO': 30, 'GIZA': 18, 'ALEX': 14, 'QALIUBIYA': 5, 'SHARKIA': 4, 'DAKAHLIA': 4, 'GHARBIA': 3}
+STATUS_WEIGHTS = [('ACTIVE', 75), ('SOLD', 12), ('PENDING', 8), ('EXPIRED', 5)]
+COLORS = ['White', 'Black', 'Silver', 'Gray', 'Red', 'Blue', 'Beige', 'Green']
+PLACEHOLDER_RGB = {
+    'White': (235, 235, 235), 'Black': (25, 25, 25), 'Silver': (190, 190, 195), 'Gray': (120, 120, 125),
+    'Red': (170, 30, 35), 'Blue': (30, 60, 150), 'Beige': (215, 200, 170), 'Green': (40, 110, 60),
+}
+
+CURRENT_YEAR = timezone.now().year
+OLDEST_YEAR = CURRENT_YEAR - 20
+
+
+class Command(BaseCommand):
+    help = 'Generates a large, deterministic synthetic dataset using bulk inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--dealers', type=int, default=100)
+        parser.add_argument('--makes', type=int, default=len(CATALOG))
+        parser.add_argument('--models-per-make', type=int, default=4)
+        parser.add_argument('--trims-per-model', type=int, default=8)
+        parser.add_argument('--listings', type=int, default=10000)
+        parser.add_argument('--favorites', type=int, default=5000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--images', action='store_true',
+                            help='Attach shared placeholder images (encoded once, reused by every listing)')
+        parser.add_argument('--prefix', default=None,
+                            help='Username prefix for generated accounts (default: synth<seed>_)')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix'] or f"synth{options['seed']}_"
+        started = time.monotonic()
+        self.validate(options)
+
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(
+                f"Users with prefix '{self.prefix}' already exist. Use another --seed or --prefix."
+            )
+
+        sellers = self.create_users(options['users'], options['dealers'])
+        trims = self.create_catalog(options['makes'], options['models_per_make'], options['trims_per_model'])
+        images = self.create_placeholder_images() if options['images'] else {}
+        active_ids = self.create_listings(options['listings'], sellers, trims, images)
+        self.create_favorites(options['favorites'], sellers, active_ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✅ Synthetic dataset generated in {time.monotonic() - started:.1f}s'
+        ))
+
+    def validate(self, options):
+        """Reject option combinations that would fail halfway through the inserts"""
+        for name in ('users', 'dealers', 'makes', 'models_per_make', 'trims_per_model', 'listings', 'favorites'):
+            if options[name] < 0:
+                raise CommandError(f"--{name.replace('_', '-')} cannot be negative.")
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        if options['listings']:
+            if not options['users'] + options['dealers']:
+                raise CommandError('Listings need sellers: pass --users or --dealers above 0.')
+            if not min(options['makes'], options['models_per_make'], options['trims_per_model']):
+                raise CommandError(
+                    'Listings need trims: --makes, --models-per-make and --trims-per-model must be above 0.'
+                )
+
+    def bulk_insert(self, model, objs, on_batch=None, **kwargs):
+        """Insert objects in batches of --batch-size, one transaction per batch"""
+        batch = []
+        for obj in objs:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                self._flush(model, batch, on_batch, **kwargs)
+                batch = []
+        if batch:
+            self._flush(model, batch, on_batch, **kwargs)
+
+    def _flush(self, model, batch, on_batch, **kwargs):
+        with transaction.atomic():
+            model.objects.bulk_create(batch, **kwargs)
+        if on_batch:
+            on_batch(batch)
+
+    # --- Users ---
+    def create_users(self, user_count, dealer_count):
+        # Hashing is deliberately slow, so every account shares one hash
+        password = make_password('synthetic123')
+
+        def users():
+            for i in range(dealer_count):
+                yield User(
+                    username=f'{self.prefix}dealer{i}',
+                    email=f'{self.prefix}dealer{i}@example.com',
+                    password=password,
+                    is_dealer=True,
+                    is_verified_dealer=self.rng.random() < 0.8,
+                )
+            for i in range(user_count):
+                yield User(
+                    username=f'{self.prefix}user{i}',
+                    email=f'{self.prefix}user{i}@example.com',
+                    password=password,
+                )
+
+        sellers = []
+        self.bulk_insert(User, users(), on_batch=lambda batch: sellers.extend((u.pk, u.is_dealer) for u in batch))
+        self.stdout.write(f'✓ Created {dealer_count} dealers and {user_count} users')
+        return sellers
+
+    # --- Catalog ---
+    def create_catalog(self, make_count, models_per_make, trims_per_model):
+        catalog = list(CATALOG[:make_count])
+        for n in range(len(catalog), make_count):
+            tier = self.rng.choice([700000, 1000000, 1500000, 3000000])
+            models = [(f'Model {n}-{m}', f'موديل {n}-{m}', self.rng.choice(list(CATEGORY_PRICE_FACTOR)))
+                      for m in range(models_per_make)]
+            catalog.append((f'Make {n}', f'ماركة {n}', tier, models))
+
+        # Makes: reuse existing rows by English name
+        existing_makes = {make.name_en: make for make in Make.objects.all()}
+        new_makes = [Make(name_en=name_en, name_ar=name_ar)
+                     for name_en, name_ar, _tier, _models in catalog if name_en not in existing_makes]
+        for make in Make.objects.bulk_create(new_makes):
+            existing_makes[make.name_en] = make
+
+        # Models
+        existing_models = {(model.make_id, model.name_en): model for model in Model.objects.all()}
+        model_tiers = {}
+        new_models = []
+        for name_en, _name_ar, tier, models in catalog:
+            make = existing_makes[name_en]
+            for model_en, model_ar, category in models[:models_per_make]:
+                key = (make.pk, model_en)
+                model_tiers[key] = (tier, category)
+                if key not in existing_models:
+                    new_models.append(Model(make=make, name_en=model_en, name_ar=model_ar, category=category))
+        for model in Model.objects.bulk_create(new_models):
+            existing_models[(model.make_id, model.name_en)] = model
+
+        # Trims: spread over model years, skewed towards recent cars. A model year that already
+        # has a trim reuses it; values are still drawn so the RNG stream does not depend on the database.
+        existing_trims = {
+            (trim.model_id, trim.year): trim
+            for trim in CarTrim.objects.filter(model__in=[existing_models[key] for key in model_tiers]).order_by('-pk')
+        }
+        trims, new_trims = [], []
+        for key, (tier, category) in model_tiers.items():
+            model = existing_models[key]
+            years = sorted({int(self.rng.triangular(OLDEST_YEAR, CURRENT_YEAR, CURRENT_YEAR - 4))
+                            for _ in range(trims_per_model)})
+            for year in years:
+                engine_cc = self.rng.choice(ENGINE_SIZES.get(category, ENGINE_SIZES['Sedan']))
+                transmission = 'AUTO' if self.rng.random() < 0.75 else 'MANUAL'
+                fuel_type = self.rng.choices(['PETROL', 'DIESEL', 'HYBRID', 'ELECTRIC'], [85, 7, 6, 2])[0]
+                name = f"{engine_cc / 1000:.1f}L {self.rng.choice(['Standard', 'Highline', 'Limited', 'Sport'])}"
+                horsepower = int(engine_cc * self.rng.uniform(0.07, 0.11))
+                fuel_consumption = round(engine_cc / 320 + self.rng.uniform(0.5, 2.0), 1)
+                trim = existing_trims.get((model.pk, year))
+                if trim is None:
+                    trim = CarTrim(
+                        model=model,
+                        name=name,
+                        year=year,
+                        engine_cc=engine_cc,
+                        horsepower=horsepower,
+                        fuel_consumption=fuel_consumption,
+                        transmission=transmission,
+                        fuel_type=fuel_type,
+                    )
+                    new_trims.append(trim)
+                trims.append((trim, tier, category))
+        CarTrim.objects.bulk_create(new_trims)
+
+        self.stdout.write(f'✓ Catalog ready: {len(existing_makes)} makes, {len(existing_models)} models, '
+                          f'{len(new_trims)} new trims, {len(trims) - len(new_trims)} reused')
+        return [(trim.pk, trim.year, tier, category) for trim, tier, category in trims]
+
+    # --- Images ---
+    def create_placeholder_images(self):
+        """Encode one WebP placeholder per colour; every listing points at these files"""
+        from PIL import Image
+
+        images = {}
+        for color, rgb in PLACEHOLDER_RGB.items():
+            name = f'cars/placeholders/{color.lower()}.webp'
+            if not default_storage.exists(name):
+                buffer = BytesIO()
+                Image.new('RGB', (800, 600), rgb).save(buffer, format='WEBP', quality=75)
+                name = default_storage.save(name, ContentFile(buffer.getvalue()))
+            images[color] = name
+        self.stdout.write(f'✓ {len(images)} shared placeholder images ready')
+        return images
+
+    # --- Listings ---
+    def create_listings(self, count, sellers, trims, images):
+        rng = self.rng
+        now = timezone.now()
+        governorates = [code for code, _label in Listing.GOVERNORATES]
+        statuses, status_weights = zip(*STATUS_WEIGHTS)
+        seller_ids = [pk for pk, _is_dealer in sellers]
+        # Cumulative weights are precomputed once; choices() would rebuild them per call.
+        # Dealers post far more listings than private sellers.
+        governorate_cum = list(accumulate(GOVERNORATE_WEIGHTS.get(code, 1) for code in governorates))
+        status_cum = list(accumulate(status_weights))
+        seller_cum = list(accumulate(25 if is_dealer else 1 for _pk, is_dealer in sellers))
+
+        def listings():
+            for _ in range(count):
+                trim_id, year, tier, category = rng.choice(trims)
+                age = max(CURRENT_YEAR - year, 0)
+                price = tier * CATEGORY_PRICE_FACTOR.get(category, 1.0) * (0.88 ** age) * rng.lognormvariate(0, 0.15)
+                odometer = int(rng.gammavariate(4, 15000 / 4) * age + rng.uniform(0, 5000)) // 100 * 100
+                status = rng.choices(statuses, cum_weights=status_cum)[0]
+                color = rng.choice(COLORS)
+                yield Listing(
+                    seller_id=rng.choices(seller_ids, cum_weights=seller_cum)[0],
+                    trim_id=trim_id,
+                    price=Decimal(int(price) // 1000 * 1000),
+                    odometer=odometer,
+                    color=color,
+                    description_en=f'{color} {year} car, {odometer:,} km, well maintained.',
+                    description_ar=f'سيارة موديل {year}، {odometer:,} كم، صيانة دورية.',
+                    location=rng.choices(governorates, cum_weights=governorate_cum)[0],
+                    image_main=images.get(color, ''),
+                    status=status,
+                    active_date=now - timedelta(days=rng.randrange(365)) if status in ('ACTIVE', 'SOLD') else None,
+                    views=int(rng.expovariate(1 / 150)),
+                    phone_clicks=int(rng.expovariate(1 / 8)),
+                )
+
+        active_ids = array('q')
+        progress = [0]
+
+        def on_batch(batch):
+            active_ids.extend(listing.pk for listing in batch if listing.status == 'ACTIVE')
+            progress[0] += len(batch)
+            self.stdout.write(f'  ... {progress[0]:,}/{count:,} listings')
+
+        self.bulk_insert(Listing, listings(), on_batch=on_batch)
+        self.stdout.write(f'✓ Created {progress[0]:,} listings ({len(active_ids):,} active)')
+        return active_ids
+
+    # --- Favorites ---
+    def create_favorites(self, count, sellers, listing_ids):
+        if not count or not listing_ids or not sellers:
+            return
+        user_ids = [pk for pk, _is_dealer in sellers]
+
+        def favorites():
+            for _ in range(count):
+                yield Favorite(user_id=self.rng.choice(user_ids), listing_id=self.rng.choice(listing_ids))
+
+        self.bulk_insert(Favorite, favorites(), ignore_conflicts=True)
+
+        # bulk_create skips toggle_favorite, so recompute the denormalized counters in one UPDATE
+        counts = (
+            Favorite.objects.filter(listing_id=OuterRef('pk'))
+            .order_by().values('listing_id').annotate(n=Count('pk')).values('n')
+        )
+        Listing.objects.filter(pk__in=Favorite.objects.values('listing_id')).update(
+            favorites_count=Subquery(counts)
+        )
+        self.stdout.write(f'✓ Created up to {count:,} favorites')
@@ -0,0 +1,25 @@
+"""
+Management command to (re)generate the listing sitemaps
+Usage: python manage.py generate_sitemaps [--force] [--base-url https://example.com]
+
+Only shards whose listings changed since the last run are rewritten, so this
+is cheap enough to run from cron every few minutes.
+"""
+
+from django.core.management.base import BaseCommand
+from core.sitemaps import generate_sitemaps
+
+
+class Command(BaseCommand):
+    help = 'Generates sharded sitemap files for all active listings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rewrite every shard')
+        parser.add_argument('--base-url', help='Override the scheme and domain from the Sites framework')
+
+    def handle(self, *args, **options):
+        result = generate_sitemaps(base_url=options['base_url'], force=options['force'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Sitemaps up to date: {len(result['written'])} shard(s) written, "
+            f"{len(result['removed'])} removed, {result['total']} total"
+        ))
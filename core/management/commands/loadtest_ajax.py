@@ -0,0 +1,208 @@
+"""
+Management command to load-test the AJAX endpoints, sync (WSGI) versus async (ASGI)
+Usage: python manage.py loadtest_ajax --scale 10000 --concurrency 8,64 --requests 2000
+       python manage.py loadtest_ajax --servers asgi --workers 4 --output asgi.json
+
+Seeds a benchmark database (shared with benchmark_views, so --keepdb reuses
+it), then for each server starts a real server process on that database:
+
+  wsgi  gunicorn sync workers serving core.views
+  asgi  uvicorn workers serving core.async_views (aboraaya_project.asgi)
+
+and fires --requests requests per endpoint from --concurrency client threads
+over keep-alive connections. Reports requests/second and p50/p95/p99 latency.
+The client runs in this process, so on small machines compare the two
+servers against each other rather than reading the numbers as absolutes.
+"""
+
+import http.client
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from core.benchmarks import load_fixtures, percentile
+from core.models import Listing
+from core.management.commands.benchmark_views import Command as BenchmarkCommand
+
+SERVERS = {
+    'wsgi': lambda workers, port: [
+        sys.executable, '-m', 'gunicorn', 'aboraaya_project.wsgi:application',
+        '--workers', str(workers), '--bind', f'127.0.0.1:{port}', '--log-level', 'warning',
+    ],
+    'asgi': lambda workers, port: [
+        sys.executable, '-m', 'uvicorn', 'aboraaya_project.asgi:application',
+        '--workers', str(workers), '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning',
+    ],
+}
+
+
+class Command(BenchmarkCommand):
+    help = 'Load-tests the AJAX endpoints under gunicorn (sync) and uvicorn (async)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=10000, help='Listings to seed (default: 10000)')
+        parser.add_argument('--servers', default='wsgi,asgi', help='Comma-separated: wsgi, asgi')
+        parser.add_argument('--workers', type=int, default=2, help='Server worker processes (default: 2)')
+        parser.add_argument('--concurrency', default='8,64', help='Comma-separated client thread counts')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint and level')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--output', default='loadtest-results.json')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse/keep the seeded benchmark database')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        servers = [name for name in options['servers'].split(',') if name]
+        unknown = set(servers) - set(SERVERS)
+        if unknown:
+            raise ValueError(f'Unknown server(s): {", ".join(sorted(unknown))}')
+        levels = [int(level) for level in options['concurrency'].split(',') if level.strip()]
+
+        setup_test_environment()
+        results = {}
+        try:
+            with self.benchmark_database(options['scale'], options['keepdb']):
+                self.seed(options['scale'], options['seed'])
+                targets = self.targets()
+                db_name = str(connection.settings_dict['NAME'])
+                connection.close()  # the servers open their own connections
+
+                for server in servers:
+                    self.stdout.write(self.style.MIGRATE_HEADING(f'\n{server}: {options["workers"]} worker(s)'))
+                    with self.running_server(server, options['workers'], options['port'], db_name):
+                        results[server] = {}
+                        for level in levels:
+                            for name, make_request in targets.items():
+                                stats = self.load(options['port'], make_request, level, options['requests'])
+                                results[server][f'{name}@{level}'] = stats
+                                self.report(f'{name}@{level}', stats)
+        finally:
+            teardown_test_environment()
+
+        with open(options['output'], 'w', encoding='utf-8') as fh:
+            json.dump(results, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"\n✓ Results written to {options['output']}"))
+
+    def targets(self):
+        """Request builders per endpoint: callable(i) -> (method, path, headers)"""
+        fixtures = load_fixtures()
+        listing_ids = list(
+            Listing.objects.filter(status='ACTIVE').order_by('pk').values_list('pk', flat=True)[:500]
+        )
+
+        # A logged-in session (and CSRF token) for toggle_favorite
+        client = Client()
+        client.force_login(fixtures['seller'])
+        csrf_token = 'loadtest' * 4  # an unmasked 32-character secret is a valid token
+        cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}; ' \
+                 f'{settings.CSRF_COOKIE_NAME}={csrf_token}'
+        post_headers = {'Cookie': cookie, 'X-CSRFToken': csrf_token, 'Content-Length': '0'}
+
+        return {
+            'load_models': lambda i: ('GET', f"/en/ajax/load-models/?make_id={fixtures['make_id']}", {}),
+            'load_trims': lambda i: ('GET', f"/en/ajax/load-trims/?model_id={fixtures['model_id']}", {}),
+            'reveal_phone': lambda i: ('GET', f'/en/ajax/reveal-phone/{listing_ids[i % len(listing_ids)]}/', {}),
+            'toggle_favorite': lambda i: (
+                'POST', f'/en/ajax/toggle-favorite/{listing_ids[i % len(listing_ids)]}/', post_headers,
+            ),
+        }
+
+    def running_server(self, server, workers, port, db_name):
+        command = self
+
+        class RunningServer:
+            def __enter__(self):
+                env = dict(os.environ, DB_NAME=db_name)
+                env.pop('ASYNC_AJAX_VIEWS', None)  # asgi.py turns it on for the ASGI server only
+                self.process = subprocess.Popen(SERVERS[server](workers, port), env=env)
+                deadline = time.monotonic() + 30
+                while time.monotonic() < deadline:
+                    if self.process.poll() is not None:
+                        raise RuntimeError(f'{server} server exited with code {self.process.returncode}')
+                    try:
+                        socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+                        command.warm_up(port)
+                        return self
+                    except OSError:
+                        time.sleep(0.2)
+                self.process.terminate()
+                raise RuntimeError(f'{server} server did not start listening on port {port}')
+
+            def __exit__(self, *exc_info):
+                self.process.terminate()
+                self.process.wait(timeout=30)
+
+        return RunningServer()
+
+    def warm_up(self, port):
+        # Import views, open DB connections and fill caches in every worker
+        for _ in range(20):
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            conn.request('GET', '/en/ajax/load-models/?make_id=1')
+            conn.getresponse().read()
+            conn.close()
+
+    def load(self, port, make_request, concurrency, total):
+        """Send `total` requests from `concurrency` keep-alive clients"""
+        counter = itertools.count()
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def client():
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            timings, failures = [], 0
+            while (i := next(counter)) < total:
+                method, path, headers = make_request(i)
+                started = time.perf_counter()
+                try:
+                    conn.request(method, path, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                    if response.status >= 400:
+                        failures += 1
+                except (OSError, http.client.HTTPException):
+                    failures += 1
+                    conn.close()
+                    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                timings.append((time.perf_counter() - started) * 1000)
+            conn.close()
+            with lock:
+                latencies.extend(timings)
+                errors.append(failures)
+
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'requests': len(latencies),
+            'errors': sum(errors),
+            'rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'max_ms': round(latencies[-1], 2) if latencies else 0.0,
+        }
+
+    def report(self, name, stats):
+        line = (
+            f"  {name:<22} {stats['rps']:>8.1f} req/s   p50 {stats['p50_ms']:>7.2f} ms   "
+            f"p95 {stats['p95_ms']:>7.2f} ms   p99 {stats['p99_ms']:>7.2f} ms"
+        )
+        if stats['errors']:
+            line += self.style.ERROR(f"   {stats['errors']} errors")
+        self.stdout.write(line)
@@ -0,0 +1,27 @@
+"""
+Management command to refresh the precomputed similar listings
+Usage: python manage.py refresh_similar_listings [--force]
+
+Only listings affected by changes since the last run are recomputed, so this
+is cheap enough to run from cron every few minutes; run it with --force
+nightly to rebuild with fresh feature scaling.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from core.similar import refresh_similar_listings
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the nearest-neighbour "similar listings" of changed ACTIVE listings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Recompute every listing')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = refresh_similar_listings(force=options['force'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Similar listings up to date: {result['recomputed']} of {result['total']} listing(s) "
+            f"recomputed, {result['rows']} neighbour rows written in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,23 @@
+"""
+Management command to recompute market price statistics
+Usage: python manage.py rollup_price_stats
+
+Run nightly from cron; workers pick up the new table within
+PRICE_STATS_CHECK_INTERVAL seconds.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from core.pricing import rollup_price_stats
+
+
+class Command(BaseCommand):
+    help = 'Recomputes price percentiles per trim and per model/year from ACTIVE and SOLD listings'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = rollup_price_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Price statistics rebuilt from {result['listings']} listing(s): {result['trims']} trims, "
+            f"{result['model_years']} model/years in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,25 @@
+"""
+Management command to risk-score pending listings for moderation
+Usage: python manage.py screen_pending_listings [--all]
+
+Run every few minutes from cron; only listings not yet scored (new or
+edited since) are screened unless --all is given.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from core.screening import screen_pending
+
+
+class Command(BaseCommand):
+    help = 'Scores PENDING listings for price and mileage outliers in one batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rescreen every pending listing')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        screened = screen_pending(rescreen=options['all'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Screened {screened} pending listing(s) in {time.perf_counter() - started:.1f}s"
+        ))
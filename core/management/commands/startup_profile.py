@@ -0,0 +1,124 @@
+"""
+Management command to measure cold-start time of a worker process
+Usage: python manage.py startup_profile
+       python manage.py startup_profile --top 25 --budget 1500 --output startup.json
+
+Starts a fresh interpreter with ``-X importtime`` that does what a gunicorn
+worker does on boot - django.setup(), load the WSGI application, run the
+core.warmup steps - and reports the time of each phase plus the slowest
+imports, grouped by top-level package. With --budget (milliseconds) the
+command fails when the total exceeds it, so CI can keep cold start in check.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in the child process; prints phase timings as JSON on stdout
+PROFILE_SCRIPT = '''
+import json, time
+started = time.perf_counter()
+phases = []
+def phase(name):
+    global started
+    now = time.perf_counter()
+    phases.append((name, now - started))
+    started = now
+
+import django
+django.setup()
+phase('django.setup()')
+from django.core.servers.basehttp import get_internal_wsgi_application
+get_internal_wsgi_application()
+phase('WSGI application')
+from core import warmup
+for name, seconds in warmup.warm_up(database={database}):
+    phases.append(('warm-up: ' + name, seconds))
+started = time.perf_counter()
+print(json.dumps(phases))
+'''
+
+
+def parse_importtime(lines):
+    """
+    Parse `python -X importtime` output into [(module, self_us, cumulative_us)]
+    """
+    imports = []
+    for line in lines:
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        imports.append((module.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def by_package(imports):
+    """Total self time per top-level package, slowest first"""
+    totals = defaultdict(int)
+    for module, self_us, _cumulative in imports:
+        totals[module.split('.')[0]] += self_us
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+class Command(BaseCommand):
+    help = 'Reports worker startup time by phase and by imported package'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help='Packages/modules to list (default: 15)')
+        parser.add_argument('--budget', type=float, help='Fail if total startup exceeds this many ms')
+        parser.add_argument('--no-db', action='store_true', help='Skip warm-up steps that need the database')
+        parser.add_argument('--output', help='Also write the report as JSON')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get(
+            'DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE,
+        ))
+        script = PROFILE_SCRIPT.format(database=not options['no_db'])
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+        )
+        total_ms = (time.perf_counter() - started) * 1000
+        if result.returncode:
+            self.stderr.write(result.stderr[-3000:])
+            raise CommandError('Startup failed')
+
+        phases = [(name, seconds * 1000) for name, seconds in json.loads(result.stdout.strip().splitlines()[-1])]
+        imports = parse_importtime(result.stderr.splitlines())
+        packages = by_package(imports)
+        top = options['top']
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Phases'))
+        self.stdout.write(f"  {'interpreter + process':<28} {total_ms - sum(ms for _, ms in phases):>8.1f} ms")
+        for name, ms in phases:
+            self.stdout.write(f'  {name:<28} {ms:>8.1f} ms')
+        self.stdout.write(f"  {'total':<28} {total_ms:>8.1f} ms")
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\nImport time by package (top {top} of {len(packages)})'))
+        for package, self_us in packages[:top]:
+            self.stdout.write(f'  {package:<28} {self_us / 1000:>8.1f} ms')
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\nSlowest modules (self time, top {top})'))
+        for module, self_us, cumulative_us in sorted(imports, key=lambda item: item[1], reverse=True)[:top]:
+            self.stdout.write(f'  {module:<50} {self_us / 1000:>8.1f} ms  (cumulative {cumulative_us / 1000:.1f} ms)')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump({
+                    'total_ms': round(total_ms, 1),
+                    'phases': {name: round(ms, 1) for name, ms in phases},
+                    'packages': {package: round(self_us / 1000, 1) for package, self_us in packages},
+                }, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"\n✓ Results written to {options['output']}"))
+
+        if options['budget'] is not None and total_ms > options['budget']:
+            raise CommandError(f"Startup took {total_ms:.0f} ms, over the {options['budget']:.0f} ms budget")
+        if options['budget'] is not None:
+            self.stdout.write(self.style.SUCCESS(f"✓ Startup within the {options['budget']:.0f} ms budget"))
@@ -0,0 +1,184 @@
+"""
+Per-view request metrics aggregated in the shared cache.
+
+Every instrumented request increments a handful of integer counters in
+``settings.CACHES['default']`` (atomic ``incr`` on Redis), so all workers
+contribute to the same histograms without any DB writes. Latency and query
+counts are kept as fixed-bucket histograms; percentiles are read back as the
+upper edge of the bucket the percentile falls in.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+KEY_PREFIX = 'reqmetrics'
+VIEWS_KEY = f'{KEY_PREFIX}:views'
+
+# Histogram bucket upper edges (the last bucket is open-ended)
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+QUERY_BUCKETS = [0, 1, 2, 3, 5, 10, 20, 50, 100, 250]
+
+# How many of the slowest statements to keep per view
+SLOW_QUERIES_KEPT = 5
+
+
+def _timeout():
+    return getattr(settings, 'REQUEST_METRICS_TTL', 7 * 24 * 3600)
+
+
+def _bucket(value, edges):
+    for index, edge in enumerate(edges):
+        if value <= edge:
+            return index
+    return len(edges)
+
+
+def _incr(key, delta=1):
+    """Atomic increment that creates the counter on first use; True if it created it"""
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Key missing (or evicted); add() keeps concurrent creators from clobbering each other
+        if cache.add(key, delta, _timeout()):
+            return True
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            pass
+    return False
+
+
+def _register(names_key, name):
+    """
+    Add `name` to the list the report enumerates. Called whenever one of its
+    counters is created, so a name is listed again after the list expires or
+    another worker resets the metrics.
+    """
+    names = cache.get(names_key) or []
+    if name not in names:
+        cache.set(names_key, sorted(set(names) | {name}), _timeout())
+
+
+def record_request(view_name, total_ms, query_count, sql_ms, template_ms, slow_queries):
+    """Fold one request's measurements into the per-view histograms"""
+    prefix = f'{KEY_PREFIX}:{view_name}'
+    if _incr(f'{prefix}:count'):
+        _register(VIEWS_KEY, view_name)
+    _incr(f'{prefix}:total_us', int(total_ms * 1000))
+    _incr(f'{prefix}:sql_us', int(sql_ms * 1000))
+    _incr(f'{prefix}:template_us', int(template_ms * 1000))
+    _incr(f'{prefix}:queries', query_count)
+    _incr(f'{prefix}:lat:{_bucket(total_ms, LATENCY_BUCKETS_MS)}')
+    _incr(f'{prefix}:q:{_bucket(query_count, QUERY_BUCKETS)}')
+
+    if slow_queries:
+        key = f'{prefix}:slow'
+        kept = cache.get(key) or []
+        # Only touch the cache when this request has a statement worth keeping
+        if len(kept) < SLOW_QUERIES_KEPT or slow_queries[0]['ms'] > kept[-1]['ms']:
+            merged = sorted(kept + slow_queries, key=lambda q: q['ms'], reverse=True)
+            cache.set(key, merged[:SLOW_QUERIES_KEPT], _timeout())
+
+
+def _histogram_percentile(counts, edges, pct):
+    total = sum(counts)
+    if not total:
+        return None
+    threshold = total * pct / 100
+    running = 0
+    for index, count in enumerate(counts):
+        running += count
+        if running >= threshold:
+            return edges[index] if index < len(edges) else f'>{edges[-1]}'
+    return f'>{edges[-1]}'
+
+
+def get_report():
+    """Aggregate the cached counters into one row per view"""
+    rows = []
+    for view_name in cache.get(VIEWS_KEY) or []:
+        prefix = f'{KEY_PREFIX}:{view_name}'
+        lat_keys = [f'{prefix}:lat:{i}' for i in range(len(LATENCY_BUCKETS_MS) + 1)]
+        q_keys = [f'{prefix}:q:{i}' for i in range(len(QUERY_BUCKETS) + 1)]
+        scalar_keys = [f'{prefix}:{name}' for name in ('count', 'total_us', 'sql_us', 'template_us', 'queries')]
+        values = cache.get_many(lat_keys + q_keys + scalar_keys + [f'{prefix}:slow'])
+
+        count = values.get(f'{prefix}:count', 0)
+        if not count:
+            continue
+        lat_counts = [values.get(key, 0) for key in lat_keys]
+        q_counts = [values.get(key, 0) for key in q_keys]
+        rows.append({
+            'view_name': view_name,
+            'count': count,
+            'p50_ms': _histogram_percentile(lat_counts, LATENCY_BUCKETS_MS, 50),
+            'p95_ms': _histogram_percentile(lat_counts, LATENCY_BUCKETS_MS, 95),
+            'p99_ms': _histogram_percentile(lat_counts, LATENCY_BUCKETS_MS, 99),
+            'mean_ms': values.get(f'{prefix}:total_us', 0) / count / 1000,
+            'mean_sql_ms': values.get(f'{prefix}:sql_us', 0) / count / 1000,
+            'mean_template_ms': values.get(f'{prefix}:template_us', 0) / count / 1000,
+            'mean_queries': values.get(f'{prefix}:queries', 0) / count,
+            'p95_queries': _histogram_percentile(q_counts, QUERY_BUCKETS, 95),
+            'slow_queries': values.get(f'{prefix}:slow', []),
+        })
+    rows.sort(key=lambda row: row['mean_ms'] * row['count'], reverse=True)
+    return rows
+
+
+# --- Cache fill (stampede) counters, recorded by core.cachefill ---
+CACHE_FILLS_KEY = f'{KEY_PREFIX}:cachefill'
+CACHE_EVENTS = ('fill', 'refresh', 'early', 'wait', 'stale', 'timeout')
+
+
+def record_cache_event(name, event):
+    """Count one cache-fill outcome (see CACHE_EVENTS) for a named cached computation"""
+    if _incr(f'{CACHE_FILLS_KEY}:{name}:{event}'):
+        _register(CACHE_FILLS_KEY, name)
+
+
+def get_cache_report():
+    """One row per cached computation with a count per CACHE_EVENTS entry"""
+    rows = []
+    for name in cache.get(CACHE_FILLS_KEY) or []:
+        keys = {event: f'{CACHE_FILLS_KEY}:{name}:{event}' for event in CACHE_EVENTS}
+        values = cache.get_many(keys.values())
+        rows.append({'name': name, **{event: values.get(key, 0) for event, key in keys.items()}})
+    return rows
+
+
+# --- Throttling counters, recorded by core.middleware.ThrottleMiddleware ---
+THROTTLE_KEY = f'{KEY_PREFIX}:throttle'
+THROTTLE_EVENTS = ('throttled', 'shed')
+
+
+def record_throttle_event(view_name, event):
+    """Count one request refused by a token bucket ('throttled') or by the concurrency limit ('shed')"""
+    if _incr(f'{THROTTLE_KEY}:{view_name}:{event}'):
+        _register(THROTTLE_KEY, view_name)
+
+
+def get_throttle_report():
+    """One row per view with a count per THROTTLE_EVENTS entry"""
+    rows = []
+    for name in cache.get(THROTTLE_KEY) or []:
+        keys = {event: f'{THROTTLE_KEY}:{name}:{event}' for event in THROTTLE_EVENTS}
+        values = cache.get_many(keys.values())
+        rows.append({'view_name': name, **{event: values.get(key, 0) for event, key in keys.items()}})
+    return rows
+
+
+def reset():
+    """Forget all collected metrics"""
+    for name in cache.get(THROTTLE_KEY) or []:
+        cache.delete_many([f'{THROTTLE_KEY}:{name}:{event}' for event in THROTTLE_EVENTS])
+    cache.delete(THROTTLE_KEY)
+    for name in cache.get(CACHE_FILLS_KEY) or []:
+        cache.delete_many([f'{CACHE_FILLS_KEY}:{name}:{event}' for event in CACHE_EVENTS])
+    cache.delete(CACHE_FILLS_KEY)
+    for view_name in cache.get(VIEWS_KEY) or []:
+        prefix = f'{KEY_PREFIX}:{view_name}'
+        cache.delete_many(
+            [f'{prefix}:lat:{i}' for i in range(len(LATENCY_BUCKETS_MS) + 1)]
+            + [f'{prefix}:q:{i}' for i in range(len(QUERY_BUCKETS) + 1)]
+            + [f'{prefix}:{name}' for name in ('count', 'total_us', 'sql_us', 'template_us', 'queries', 'slow')]
+        )
+    cache.delete(VIEWS_KEY)
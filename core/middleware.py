@@ -0,0 +1,372 @@
+"""
+Custom middleware for the core app.
+
+The middleware here is sync- and async-capable, so under ASGI a request
+only leaves the event loop for the sync views themselves.
+"""
+import math
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.template.backends.django import Template as DjangoTemplate
+from django.utils.functional import SimpleLazyObject
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics, profiling, throttle
+from .auth import get_cached_user
+
+# Recorder and template-time cell of the current request. Both are mutated in
+# place, so work done in sync_to_async threads (which run on a copy of the
+# context) is still counted.
+_query_recorder = ContextVar('query_recorder', default=None)
+_template_time = ContextVar('template_time', default=None)
+
+
+class HybridMiddleware:
+    """Base for middleware with a sync __call__ and an async __acall__"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.handle(request)
+
+
+def _instrument_templates():
+    """Wrap the Django template backend so top-level renders are timed"""
+    if getattr(DjangoTemplate.render, '_timed', False):
+        return
+    original_render = DjangoTemplate.render
+
+    def timed_render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return original_render(self, context, request)
+        finally:
+            cell = _template_time.get()
+            if cell is not None:
+                cell[0] += time.perf_counter() - started
+
+    timed_render._timed = True
+    DjangoTemplate.render = timed_render
+
+
+def _record_queries(execute, sql, params, many, context):
+    recorder = _query_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def _install_query_hook(sender=None, connection=None, **kwargs):
+    # Prepended so it never disturbs the push/pop of connection.execute_wrapper() blocks
+    if _record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_queries)
+
+
+def _instrument_queries():
+    """Hook every connection (in any thread, replicas included) once"""
+    connection_created.connect(_install_query_hook, dispatch_uid='core.middleware.query_hook')
+    for connection in connections.all(initialized_only=True):
+        _install_query_hook(connection=connection)
+
+
+class QueryRecorder:
+    """DB execute wrapper that counts and times every statement"""
+
+    def __init__(self, keep=3):
+        self.count = 0
+        self.total = 0.0
+        self.keep = keep
+        self.slowest = []
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.count += 1
+                self.total += elapsed
+                if len(self.slowest) < self.keep or elapsed > self.slowest[-1][0]:
+                    self.slowest.append((elapsed, sql))
+                    self.slowest.sort(key=lambda item: item[0], reverse=True)
+                    del self.slowest[self.keep:]
+
+
+class RequestMetricsMiddleware(HybridMiddleware):
+    """
+    Record query count, SQL time, template render time and total latency per request.
+
+    Measurements are aggregated per URL name in the cache (see core.metrics)
+    and exposed to staff as a Server-Timing header, which browser dev tools
+    show in the network panel.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.enabled = getattr(settings, 'REQUEST_METRICS_ENABLED', True)
+        if self.enabled:
+            _instrument_templates()
+            _instrument_queries()
+
+    def _start(self):
+        recorder = QueryRecorder()
+        cell = [0.0]
+        tokens = (_query_recorder.set(recorder), _template_time.set(cell))
+        return recorder, cell, tokens, time.perf_counter()
+
+    def _stop(self, tokens):
+        _query_recorder.reset(tokens[0])
+        _template_time.reset(tokens[1])
+
+    def handle(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+        recorder, cell, tokens, started = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            self._stop(tokens)
+        self._finish(request, response, recorder, cell[0], started)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        recorder, cell, tokens, started = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._stop(tokens)
+        # Cache round trips (Redis) stay off the event loop
+        await sync_to_async(self._finish, thread_sensitive=False)(request, response, recorder, cell[0], started)
+        return response
+
+    def _finish(self, request, response, recorder, template_seconds, started):
+        total_ms = (time.perf_counter() - started) * 1000
+        sql_ms = recorder.total * 1000
+        template_ms = template_seconds * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            view_name = match.view_name
+            metrics.record_request(
+                view_name, total_ms, recorder.count, sql_ms, template_ms,
+                [{'ms': round(elapsed * 1000, 2), 'sql': sql[:500], 'view': view_name}
+                 for elapsed, sql in recorder.slowest],
+            )
+
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={sql_ms:.1f};desc="{recorder.count} queries"',
+                f'tpl;dur={template_ms:.1f};desc="templates"',
+                f'app;dur={total_ms:.1f};desc="total"',
+            ])
+
+
+class SamplingProfilerMiddleware(HybridMiddleware):
+    """
+    Capture a stack-sampled profile of selected requests.
+
+    A request is profiled when a staff user asks for it (``?_profile=1`` or an
+    ``X-Profile: 1`` header), when it wins the 1-in-``PROFILER_SAMPLE_RATE``
+    draw, or - if ``PROFILER_SLOW_MS`` is set - when it runs longer than that.
+    The slow-request mode has to sample every request and discard the fast
+    ones, so keep it for investigations rather than leaving it on.
+
+    Under ASGI the sampled thread is the event loop's, which covers async
+    views; sync views there run in a worker thread and are not captured.
+
+    Must come after AuthenticationMiddleware (it checks ``request.user``).
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.sample_rate = getattr(settings, 'PROFILER_SAMPLE_RATE', 0)
+        self.slow_ms = getattr(settings, 'PROFILER_SLOW_MS', 0)
+
+    def _requested_by_staff(self, request, user):
+        flag = request.GET.get('_profile') or request.headers.get('X-Profile')
+        return flag in ('1', 'true') and user.is_staff
+
+    def _triggers(self, request, user):
+        forced = self._requested_by_staff(request, user)
+        sampled = bool(self.sample_rate) and random.randrange(self.sample_rate) == 0
+        return forced, sampled
+
+    def handle(self, request):
+        forced, sampled = self._triggers(request, request.user)
+        if not (forced or sampled or self.slow_ms):
+            return self.get_response(request)
+
+        sampler = profiling.get_sampler()
+        thread_id = threading.get_ident()
+        started = time.perf_counter()
+        sampler.start(thread_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            collector = sampler.stop(thread_id)
+        self._save(request, response, collector, started, forced, sampled)
+        return response
+
+    async def __acall__(self, request):
+        forced, sampled = self._triggers(request, await request.auser())
+        if not (forced or sampled or self.slow_ms):
+            return await self.get_response(request)
+
+        sampler = profiling.get_sampler()
+        thread_id = threading.get_ident()
+        started = time.perf_counter()
+        sampler.start(thread_id)
+        try:
+            response = await self.get_response(request)
+        finally:
+            collector = sampler.stop(thread_id)
+        await sync_to_async(self._save, thread_sensitive=False)(request, response, collector, started, forced, sampled)
+        return response
+
+    def _save(self, request, response, collector, started, forced, sampled):
+        duration_ms = (time.perf_counter() - started) * 1000
+        if forced or sampled or duration_ms >= self.slow_ms:
+            match = getattr(request, 'resolver_match', None)
+            filename = profiling.save_profile(
+                collector, match.view_name if match else None, request.path, duration_ms,
+            )
+            if forced:
+                response['X-Profile-File'] = filename
+
+
+class StaticFilesMiddleware(HybridMiddleware, WhiteNoiseMiddleware):
+    """
+    WhiteNoise with an async path.
+
+    WhiteNoiseMiddleware is sync-only, which under ASGI would push every
+    request through a thread before it reaches the rest of the stack.
+    """
+
+    def __init__(self, get_response=None):
+        WhiteNoiseMiddleware.__init__(self, get_response)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def handle(self, request):
+        return WhiteNoiseMiddleware.__call__(self, request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    AuthenticationMiddleware whose request.user comes from core.auth's cache,
+    saving the user query on logged-in requests. request.auser() (async
+    views) is Django's own.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_cached_user(request))
+
+
+class ThrottleMiddleware(HybridMiddleware):
+    """
+    Admission control, decided before the view runs.
+
+    Requests to views in THROTTLE_RULES take a token from their client's
+    bucket (core.throttle) and get a bare 429 with Retry-After when it is
+    empty. Separately, once this worker has more than THROTTLE_MAX_IN_FLIGHT
+    requests in progress, further ones are shed with a 503 (staff excepted)
+    so the admitted ones still finish in time. Refusals are counted in
+    core.metrics.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.enabled = settings.THROTTLE_ENABLED
+        self.max_in_flight = settings.THROTTLE_MAX_IN_FLIGHT
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        if iscoroutinefunction(self):
+            # Django's handler would otherwise wrap the sync hook in sync_to_async for every request
+            self.process_view = self._aprocess_view
+
+    def _enter(self, request):
+        with self.lock:
+            self.in_flight += 1
+            request.in_flight = self.in_flight
+
+    def _leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def handle(self, request):
+        self._enter(request)
+        try:
+            return self.get_response(request)
+        finally:
+            self._leave()
+
+    async def __acall__(self, request):
+        self._enter(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            self._leave()
+
+    def _overloaded(self, request):
+        return self.enabled and 0 < self.max_in_flight < getattr(request, 'in_flight', 0)
+
+    def _needs_check(self, request):
+        return self._overloaded(request) or (
+            self.enabled and request.resolver_match.view_name in settings.THROTTLE_RULES
+        )
+
+    def _check(self, request):
+        view_name = request.resolver_match.view_name
+        if self._overloaded(request) and not request.user.is_staff:
+            return self._refuse(view_name, 'shed', 503, 1)
+        wait = throttle.take(view_name, request)
+        if wait is not None:
+            return self._refuse(view_name, 'throttled', 429, wait)
+        return None
+
+    def _refuse(self, view_name, event, status, retry_after):
+        metrics.record_throttle_event(view_name, event)
+        response = HttpResponse(status=status)
+        response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        return self._check(request) if self._needs_check(request) else None
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        if not self._needs_check(request):
+            return None
+        # The user and session may be loaded with ORM queries, so the check runs on the thread
+        # that owns the request's sync database connections rather than a throwaway executor thread
+        return await sync_to_async(self._check)(request)
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:27
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_favorites_count(apps, schema_editor):
+    Listing = apps.get_model('core', 'Listing')
+    Favorite = apps.get_model('core', 'Favorite')
+    counts = (
+        Favorite.objects.filter(listing_id=OuterRef('pk'))
+        .order_by().values('listing_id').annotate(n=Count('pk')).values('n')
+    )
+    Listing.objects.update(favorites_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_favorite'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Favorites'),
+        ),
+        migrations.RunPython(backfill_favorites_count, migrations.RunPython.noop),
+    ]
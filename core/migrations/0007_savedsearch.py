@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_listing_favorites_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedSearch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(blank=True, max_length=100, verbose_name='Keywords')),
+                ('governorate', models.CharField(blank=True, choices=[('CAIRO', 'Cairo'), ('ALEX', 'Alexandria'), ('GIZA', 'Giza'), ('SHARM', 'Sharm El Sheikh'), ('HURGHADA', 'Hurghada'), ('ALAMEIN', 'El Alamein'), ('DAHAB', 'Dahab'), ('MARSA_ALAM', 'Marsa Alam'), ('SIWA', 'Siwa Oasis'), ('QALIUBIYA', 'Qaliubiya'), ('SHARKIA', 'Sharkia'), ('DAKAHLIA', 'Dakahlia'), ('GHARBIA', 'Gharbia'), ('MENOUFIA', 'Menoufia'), ('BEHEIRA', 'Beheira'), ('KAFR_EL_SHEIKH', 'Kafr El Sheikh'), ('DAMIETTA', 'Damietta'), ('PORT_SAID', 'Port Said'), ('ISMAILIA', 'Ismailia'), ('SUEZ', 'Suez'), ('NORTH_SINAI', 'North Sinai'), ('SOUTH_SINAI', 'South Sinai'), ('RED_SEA', 'Red Sea'), ('FAIYUM', 'Faiyum'), ('BENI_SUEF', 'Beni Suef'), ('MINYA', 'Minya'), ('ASYUT', 'Asyut'), ('SOHAG', 'Sohag'), ('QENA', 'Qena'), ('LUXOR', 'Luxor'), ('ASWAN', 'Aswan'), ('NEW_VALLEY', 'New Valley'), ('MATROUH', 'Matrouh')], max_length=20)),
+                ('fuel_type', models.CharField(blank=True, choices=[('PETROL', 'Petrol'), ('DIESEL', 'Diesel'), ('ELECTRIC', 'Electric'), ('HYBRID', 'Hybrid')], max_length=20)),
+                ('transmission', models.CharField(blank=True, choices=[('AUTO', 'Automatic'), ('MANUAL', 'Manual')], max_length=20)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('min_year', models.PositiveIntegerField(blank=True, null=True)),
+                ('max_year', models.PositiveIntegerField(blank=True, null=True)),
+                ('max_mileage', models.PositiveIntegerField(blank=True, null=True)),
+                ('color', models.CharField(blank=True, max_length=30)),
+                ('seller_type', models.CharField(blank=True, choices=[('dealer', 'Verified Dealer'), ('private', 'Private Seller')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('make', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.make')),
+                ('model', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.model')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_searches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Saved Search',
+                'verbose_name_plural': 'Saved Searches',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
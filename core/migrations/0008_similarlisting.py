@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_savedsearch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarListing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('distance', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='core.listing')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.listing')),
+            ],
+            options={
+                'verbose_name': 'Similar Listing',
+                'verbose_name_plural': 'Similar Listings',
+                'ordering': ['listing', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('listing', 'rank'), name='unique_similar_listing_rank')],
+            },
+        ),
+    ]
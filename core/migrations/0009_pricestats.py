@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_similarlisting'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('count', models.PositiveIntegerField()),
+                ('p10', models.PositiveIntegerField()),
+                ('p25', models.PositiveIntegerField()),
+                ('median', models.PositiveIntegerField()),
+                ('p75', models.PositiveIntegerField()),
+                ('p90', models.PositiveIntegerField()),
+                ('median_odometer', models.PositiveIntegerField()),
+                ('computed_at', models.DateTimeField()),
+                ('model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.model')),
+                ('trim', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.cartrim')),
+            ],
+            options={
+                'verbose_name': 'Price Statistics',
+                'verbose_name_plural': 'Price Statistics',
+                'constraints': [models.UniqueConstraint(condition=models.Q(('trim__isnull', False)), fields=('trim',), name='unique_price_stats_trim'), models.UniqueConstraint(condition=models.Q(('trim__isnull', True)), fields=('model', 'year'), name='unique_price_stats_model_year')],
+            },
+        ),
+    ]
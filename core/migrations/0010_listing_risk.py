@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_pricestats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='risk_reasons',
+            field=models.JSONField(blank=True, default=list, verbose_name='Risk Reasons'),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='risk_score',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Risk Score'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_listing_risk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingImageHash',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=20)),
+                ('hash', models.BigIntegerField(db_index=True)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_hashes', to='core.listing')),
+            ],
+            options={
+                'verbose_name': 'Image Hash',
+                'verbose_name_plural': 'Image Hashes',
+                'constraints': [models.UniqueConstraint(fields=('listing', 'field'), name='unique_listing_image_hash')],
+            },
+        ),
+    ]
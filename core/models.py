@@ -1,15 +1,21 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
-from PIL import Image
 from io import BytesIO
+from urllib.parse import urlencode
 from django.core.files.base import ContentFile
+from django.db.models.functions import Lower
+from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 
 # --- Utilities ---
 def compress_image(image_field, filename):
     """
-    Compress and convert images to WebP format with max width of 1200px
+    Compress and convert images to WebP format with max width of 1200px.
+    Also returns the image's perceptual hash, taken while it is decoded anyway.
     """
+    from PIL import Image  # only needed on upload; keeps Pillow out of every worker's boot
+    from .photohash import dhash
+
     im = Image.open(image_field)
     if im.mode in ("RGBA", "P"): 
         im = im.convert("RGB")
@@ -19,7 +25,7 @@ def compress_image(image_field, filename):
     im_io = BytesIO()
     im.save(im_io, format='WEBP', quality=75)
     new_filename = f"{filename.split('.')[0]}.webp"
-    return ContentFile(im_io.getvalue()), new_filename
+    return ContentFile(im_io.getvalue()), new_filename, dhash(im)
 
 # --- 1. Authentication ---
 class User(AbstractUser):
@@ -34,6 +40,10 @@ class User(AbstractUser):
     class Meta:
         verbose_name = _("User")
         verbose_name_plural = _("Users")
+        indexes = [
+            # Case-insensitive email login (core.backends.EmailBackend)
+            models.Index(Lower('email'), name='core_user_email_lower_idx'),
+        ]
 
 # --- 2. Master Data (Auto-Fill Engine) ---
 class Make(models.Model):
@@ -163,6 +173,11 @@ class Listing(models.Model):
     active_date = models.DateTimeField(null=True, blank=True, help_text=_("Set when admin approves"))
     views = models.IntegerField(default=0, verbose_name=_("View Count"))
     phone_clicks = models.IntegerField(default=0, verbose_name=_("Phone Reveal Clicks"))
+    # Denormalized; kept in sync by toggle_favorite with atomic F() updates
+    favorites_count = models.PositiveIntegerField(default=0, verbose_name=_("Favorites"))
+    # Moderation screening (core.screening); None until the next batch scores it
+    risk_score = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name=_("Risk Score"))
+    risk_reasons = models.JSONField(default=list, blank=True, verbose_name=_("Risk Reasons"))
 
     @property
     def mileage(self):
@@ -174,20 +189,34 @@ class Listing(models.Model):
         """Return price as integer for display without decimals"""
         return int(self.price) if self.price else 0
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so core.signals can tell what a save changed
+        instance._loaded_status = instance.__dict__.get('status')
+        instance._loaded_trim_id = instance.__dict__.get('trim_id')
+        return instance
+
     def save(self, *args, **kwargs):
         """Auto-compress images on save"""
         # Compress all uploaded images
+        hashes = {}
         for field_name in ['image_main', 'image_2', 'image_3', 'image_4', 'image_5']:
             image_field = getattr(self, field_name)
             if image_field and hasattr(image_field, 'file') and not image_field.name.endswith('.webp'):
                 try:
-                    compressed_file, new_name = compress_image(image_field, image_field.name)
+                    compressed_file, new_name, hashes[field_name] = compress_image(image_field, image_field.name)
                     image_field.save(new_name, compressed_file, save=False)
                 except Exception as e:
                     # Log error but don't fail the save
                     print(f"Error compressing {field_name}: {e}")
         
         super().save(*args, **kwargs)
+        if hashes:
+            ListingImageHash.objects.bulk_create(
+                [ListingImageHash(listing=self, field=field_name, hash=value) for field_name, value in hashes.items()],
+                update_conflicts=True, unique_fields=['listing', 'field'], update_fields=['hash', 'computed_at'],
+            )
 
     def __str__(self): 
         return f"{self.trim} - {self.price} EGP ({self.status})"
@@ -213,3 +242,130 @@ class Favorite(models.Model):
         verbose_name_plural = _("Favorites")
         unique_together = ['user', 'listing']
         ordering = ['-created_at']
+
+
+# --- 5. Saved Searches ---
+class SavedSearch(models.Model):
+    """A search_listings filter set; newly approved listings that match are sent as alerts (core.alerts)"""
+    SELLER_TYPES = [
+        ('dealer', _('Verified Dealer')),
+        ('private', _('Private Seller')),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='saved_searches')
+    query = models.CharField(max_length=100, blank=True, verbose_name=_("Keywords"))
+    # Equality constraints: core.alerts indexes saved searches by these
+    make = models.ForeignKey(Make, on_delete=models.CASCADE, null=True, blank=True)
+    model = models.ForeignKey(Model, on_delete=models.CASCADE, null=True, blank=True)
+    governorate = models.CharField(max_length=20, choices=Listing.GOVERNORATES, blank=True)
+    fuel_type = models.CharField(max_length=20, choices=CarTrim.FUEL_CHOICES, blank=True)
+    transmission = models.CharField(max_length=20, choices=CarTrim.TRANSMISSION_CHOICES, blank=True)
+    # Checked per candidate after the index lookup
+    min_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    min_year = models.PositiveIntegerField(null=True, blank=True)
+    max_year = models.PositiveIntegerField(null=True, blank=True)
+    max_mileage = models.PositiveIntegerField(null=True, blank=True)
+    color = models.CharField(max_length=30, blank=True)
+    seller_type = models.CharField(max_length=10, choices=SELLER_TYPES, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # search_listings parameter -> field, for saving and re-running the search
+    PARAMS = {
+        'q': 'query', 'make': 'make', 'model': 'model', 'governorate': 'governorate',
+        'fuel_type': 'fuel_type', 'transmission': 'transmission',
+        'min_price': 'min_price', 'max_price': 'max_price', 'min_year': 'min_year',
+        'max_year': 'max_year', 'max_mileage': 'max_mileage', 'color': 'color',
+        'seller_type': 'seller_type',
+    }
+
+    def search_params(self):
+        """The search_listings query parameters that reproduce this search"""
+        params = {}
+        for param, field in self.PARAMS.items():
+            value = getattr(self, field + '_id' if field in ('make', 'model') else field)
+            if value not in (None, ''):
+                params[param] = value
+        return params
+
+    def get_absolute_url(self):
+        return f"{reverse('core:search')}?{urlencode(self.search_params())}"
+
+    def __str__(self):
+        return f"{self.user.username}: {self.search_params()}"
+
+    class Meta:
+        verbose_name = _("Saved Search")
+        verbose_name_plural = _("Saved Searches")
+        ordering = ['-created_at']
+
+
+# --- 6. Similar Listings ---
+class SimilarListing(models.Model):
+    """Precomputed nearest neighbours of an ACTIVE listing, nearest first (core.similar)"""
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='neighbors')
+    similar = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    distance = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.listing_id} #{self.rank}: {self.similar_id}"
+
+    class Meta:
+        verbose_name = _("Similar Listing")
+        verbose_name_plural = _("Similar Listings")
+        ordering = ['listing', 'rank']
+        constraints = [
+            # Also the index the listing page reads its neighbours with
+            models.UniqueConstraint(fields=['listing', 'rank'], name='unique_similar_listing_rank'),
+        ]
+
+
+# --- 7. Market Prices ---
+class PriceStats(models.Model):
+    """Price percentiles of ACTIVE and SOLD listings per trim, or per model and year when trim is empty (core.pricing)"""
+    model = models.ForeignKey(Model, on_delete=models.CASCADE, related_name='+')
+    year = models.IntegerField()
+    trim = models.ForeignKey(CarTrim, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    count = models.PositiveIntegerField()
+    p10 = models.PositiveIntegerField()
+    p25 = models.PositiveIntegerField()
+    median = models.PositiveIntegerField()
+    p75 = models.PositiveIntegerField()
+    p90 = models.PositiveIntegerField()
+    median_odometer = models.PositiveIntegerField()
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.trim or self.model} {self.year}: {self.median} EGP ({self.count})"
+
+    class Meta:
+        verbose_name = _("Price Statistics")
+        verbose_name_plural = _("Price Statistics")
+        constraints = [
+            models.UniqueConstraint(fields=['trim'], condition=models.Q(trim__isnull=False),
+                                    name='unique_price_stats_trim'),
+            models.UniqueConstraint(fields=['model', 'year'], condition=models.Q(trim__isnull=True),
+                                    name='unique_price_stats_model_year'),
+        ]
+
+
+# --- 8. Image Hashes ---
+class ListingImageHash(models.Model):
+    """Perceptual hash of one listing photo, for near-duplicate detection (core.photohash)"""
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='image_hashes')
+    field = models.CharField(max_length=20)
+    # 64-bit dHash stored signed to fit BigIntegerField
+    hash = models.BigIntegerField(db_index=True)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.listing_id} {self.field}: {self.hash & 0xFFFFFFFFFFFFFFFF:016x}"
+
+    class Meta:
+        verbose_name = _("Image Hash")
+        verbose_name_plural = _("Image Hashes")
+        constraints = [
+            models.UniqueConstraint(fields=['listing', 'field'], name='unique_listing_image_hash'),
+        ]
@@ -0,0 +1,153 @@
+"""
+Full-page cache for anonymous GET requests.
+
+Pages such as the home page and listing details are identical for every
+anonymous visitor in the same language, so their rendered HTML is cached
+under the language, path and the query parameters the view reads, so
+tracking parameters (``utm_*``, ``fbclid``) and their order do not split
+entries. While rendering, a view declares the data the page depends on with
+``tag_page(request, ...)``:
+
+* ``listing:<pk>`` - a listing shown on the page
+* ``seller:<pk>`` - a seller whose details are shown
+* ``active:all`` / ``active:make:<id>`` - the set of ACTIVE listings (all, or
+  of one make), for pages showing "the newest N" style selections
+* ``catalog`` - makes/models/trims, tracked by the catalog version key
+* ``similar`` / ``similar:<pk>`` - precomputed similar listings (all, or of one
+  listing), purged by core.similar
+
+Each tag has a version number in the cache; an entry stores the versions it
+was rendered with and is stale once any of them changes.
+``purge_tags()`` bumps versions, so invalidation is a handful of ``incr``
+calls no matter how many cached pages reference a listing (see core.signals).
+Misses are rendered from the primary database, never a lagging replica, so
+an entry cannot pair rows from before a purge with the versions after it.
+"""
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .cachefill import SkipCache, get_or_fill, new_version
+from .catalog import CATALOG_VERSION_KEY
+from .replicas import primary_reads
+
+KEY_PREFIX = 'pagecache'
+
+
+def _tag_key(tag):
+    # The catalog tag reuses the catalog version maintained by core.catalog
+    return CATALOG_VERSION_KEY if tag == 'catalog' else f'{KEY_PREFIX}:tag:{tag}'
+
+
+def _page_key(request, params):
+    query = urlencode(sorted((name, value) for name in params for value in request.GET.getlist(name)))
+    path = hashlib.md5(f'{request.path}?{query}'.encode()).hexdigest()
+    return f'{KEY_PREFIX}:page:{request.LANGUAGE_CODE}:{path}'
+
+
+def tag_page(request, *tags):
+    """
+    Record data the page being rendered depends on.
+
+    Call it as soon as the data is loaded: the tag versions are read here, so
+    a purge that races with the rest of the render still retires the entry.
+    """
+    if hasattr(request, '_page_tags'):
+        request._page_tags.update(_tag_versions(tags))
+
+
+def purge_tags(*tags):
+    """Invalidate every cached page carrying any of the tags"""
+    for tag in tags:
+        key = _tag_key(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Never versioned or evicted: any version other than the old one retires its entries
+            cache.add(key, new_version(), None)
+
+
+def tag_versions(*tags):
+    """Current version of each tag, for other caches built from the same data"""
+    return _tag_versions(tags)
+
+
+def _tag_versions(tags):
+    keys = {tag: _tag_key(tag) for tag in tags}
+    stored = cache.get_many(keys.values())
+    seeded = {key: new_version() for key in keys.values() if key not in stored}
+    if seeded:
+        for key, version in seeded.items():
+            cache.add(key, version, None)
+        # Another worker may have seeded the same key first
+        stored.update(cache.get_many(seeded))
+    return {tag: stored.get(key, seeded.get(key)) for tag, key in keys.items()}
+
+
+def _cacheable_request(request):
+    return (
+        getattr(settings, 'PAGE_CACHE_ENABLED', True)
+        and request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        # Flash messages are per visitor and consumed by the render
+        and not len(get_messages(request))
+    )
+
+
+def anonymous_page_cache(on_hit=None, params=()):
+    """
+    Serve anonymous GETs from the page cache.
+
+    Fills go through core.cachefill, so concurrent misses render the page
+    once and a purged page is served stale while one request re-renders it.
+    ``on_hit(request, *args, **kwargs)`` runs whenever the view itself did
+    not, for side effects it would otherwise perform (e.g. counting a view).
+    ``params`` names the query parameters the view reads; others are ignored.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _cacheable_request(request):
+                return view(request, *args, **kwargs)
+
+            rendered = {}
+
+            def render_page():
+                request._page_tags = {}
+                with primary_reads():
+                    response = rendered['response'] = view(request, *args, **kwargs)
+                tags = request._page_tags
+                del request._page_tags
+                if (
+                    response.status_code != 200
+                    or response.streaming
+                    or response.cookies
+                    # The page embedded a CSRF token tied to this visitor's cookie
+                    or request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+                ):
+                    raise SkipCache(None)
+                return {'tags': tags, 'content': response.content, 'content_type': response['Content-Type']}
+
+            entry = get_or_fill(
+                _page_key(request, params), render_page, getattr(settings, 'PAGE_CACHE_TIMEOUT', 300),
+                name=f'page:{view.__name__}',
+                is_stale=lambda entry: _tag_versions(entry['tags']) != entry['tags'],
+            )
+            if 'response' in rendered:
+                response = rendered['response']
+                if entry is not None:
+                    response['X-Page-Cache'] = 'miss'
+                return response
+
+            if on_hit is not None:
+                on_hit(request, *args, **kwargs)
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+            response['X-Page-Cache'] = 'hit'
+            return response
+        return wrapper
+    return decorator
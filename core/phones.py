@@ -0,0 +1,66 @@
+"""
+Seller phone numbers for reveal_phone without database queries.
+
+``listing id -> seller phone`` is cached for ACTIVE listings: primed when
+listings are approved and filled on a miss. core.signals drops a listing's
+entry whenever the listing is saved or deleted, and all of a seller's entries
+when their phone number may have changed, once the change commits. Clicks go
+to a buffered counter, so a cache hit costs no query at all.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Listing
+
+PHONE_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def _cache_key(listing_id):
+    return f'listing_phone:{listing_id}'
+
+
+def _active_phones(listing_ids):
+    return Listing.objects.filter(pk__in=listing_ids, status='ACTIVE').values_list('pk', 'seller__phone_number')
+
+
+def get_phone(listing_id):
+    """(found, phone number) for an ACTIVE listing; found is False for any other listing"""
+    cached = cache.get(_cache_key(listing_id))
+    if cached is not None:
+        return True, cached[0]
+    for pk, phone in _active_phones([listing_id]):
+        cache.set(_cache_key(pk), (phone,), PHONE_CACHE_TIMEOUT)
+        return True, phone
+    return False, None
+
+
+async def aget_phone(listing_id):
+    cached = await cache.aget(_cache_key(listing_id))
+    if cached is not None:
+        return True, cached[0]
+    async for pk, phone in _active_phones([listing_id]):
+        await cache.aset(_cache_key(pk), (phone,), PHONE_CACHE_TIMEOUT)
+        return True, phone
+    return False, None
+
+
+def prime_on_commit(listing_ids):
+    """Cache the phones of newly approved listings once the current transaction commits"""
+    listing_ids = list(listing_ids)
+    transaction.on_commit(lambda: cache.set_many(
+        {_cache_key(pk): (phone,) for pk, phone in _active_phones(listing_ids)}, PHONE_CACHE_TIMEOUT,
+    ))
+
+
+def invalidate_listing(listing_id):
+    """Drop a listing's entry once the current transaction commits"""
+    # Dropped any earlier, a concurrent miss could re-cache the uncommitted change's old row
+    transaction.on_commit(lambda: cache.delete(_cache_key(listing_id)))
+
+
+def invalidate_seller(seller_id):
+    """Drop the entries of a seller's ACTIVE listings once the current transaction commits"""
+    def delete():
+        listing_ids = Listing.objects.filter(seller_id=seller_id, status='ACTIVE').values_list('pk', flat=True)
+        cache.delete_many([_cache_key(pk) for pk in listing_ids])
+    transaction.on_commit(delete)
@@ -0,0 +1,150 @@
+"""
+Perceptual hashes of listing photos, for spotting reposted cars and stolen photos.
+
+Each photo gets a 64-bit difference hash (dHash): shrunk to 9x8 grayscale,
+one bit per pixel saying whether it is brighter than its right neighbour.
+Re-encoding, resizing and light edits change only a few bits, so two photos
+are near-duplicates when their hashes differ in at most MAX_DISTANCE bits.
+
+Hashes are taken when an upload is compressed (Listing.save) and stored in
+ListingImageHash; ``hash_listing_images`` backfills existing media in
+parallel. ``find_duplicates`` loads the hashes of ACTIVE and PENDING
+listings once per screening run into a multi-index (HashIndex), which answers
+"everything within k bits" from a few dict lookups per slice of the hash
+instead of comparing against every photo. Sold, expired and rejected
+listings are left out, so the index grows with the live inventory rather
+than with every photo ever uploaded.
+"""
+from collections import defaultdict
+from itertools import combinations
+
+from django.core.files.storage import default_storage
+
+from .models import Listing, ListingImageHash
+
+IMAGE_FIELDS = ('image_main', 'image_2', 'image_3', 'image_4', 'image_5')
+HASH_SIZE = 8
+MASK = (1 << 64) - 1
+SLICES = 4
+SLICE_BITS = 16
+SLICE_MASK = (1 << SLICE_BITS) - 1
+# Differing bits still counted as the same photo
+MAX_DISTANCE = 6
+# Flat images (placeholders, plain backgrounds) hash to nearly all 0s or 1s and match each other
+MIN_DETAIL_BITS = 4
+# Listings whose photos are indexed for matching
+LIVE_STATUSES = ('ACTIVE', 'PENDING')
+
+
+def dhash(image):
+    """Signed 64-bit difference hash of a PIL image"""
+    from PIL import Image  # keeps Pillow out of every worker's boot, as in models.compress_image
+
+    small = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            offset = row * (HASH_SIZE + 1) + col
+            value = value << 1 | (pixels[offset] > pixels[offset + 1])
+    return value - (1 << 64) if value >> 63 else value
+
+
+def hash_file(name):
+    """dHash of a stored image, or None when it cannot be read"""
+    from PIL import Image
+
+    try:
+        with default_storage.open(name) as file, Image.open(file) as image:
+            # JPEGs decode at a fraction of their size; the hash only needs 9x8 pixels
+            image.draft('L', (HASH_SIZE * 4, HASH_SIZE * 4))
+            return dhash(image)
+    except (OSError, ValueError):
+        return None
+
+
+def hamming(a, b):
+    return ((a ^ b) & MASK).bit_count()
+
+
+def has_detail(value):
+    return MIN_DETAIL_BITS <= (value & MASK).bit_count() <= 64 - MIN_DETAIL_BITS
+
+
+def _slices(value):
+    value &= MASK
+    return [(value >> (SLICE_BITS * i)) & SLICE_MASK for i in range(SLICES)]
+
+
+def _variants(part, radius):
+    """`part` and every slice value within `radius` flipped bits of it"""
+    variants = [part]
+    for count in range(1, radius + 1):
+        for bits in combinations(range(SLICE_BITS), count):
+            variants.append(part ^ sum(1 << bit for bit in bits))
+    return variants
+
+
+class HashIndex:
+    """
+    Multi-index hashing: one table per 16-bit slice of the hash. Hashes within
+    k bits of each other differ in at most k // 4 bits on some slice
+    (pigeonhole), so a search probes each table at the slice's value and its
+    variants within that radius, and measures the full distance only for the
+    few hashes found there.
+    """
+
+    def __init__(self, items=()):
+        self.entries = []
+        self.tables = [defaultdict(list) for _slice in range(SLICES)]
+        for value, ref in items:
+            self.add(value, ref)
+
+    def add(self, value, ref):
+        for table, part in zip(self.tables, _slices(value)):
+            table[part].append(len(self.entries))
+        self.entries.append((value, ref))
+
+    def search(self, value, k):
+        """[(distance, ref)] for stored hashes within `k` bits of `value`"""
+        seen, found = set(), []
+        for table, part in zip(self.tables, _slices(value)):
+            for probe in _variants(part, k // SLICES):
+                for entry in table.get(probe, ()):
+                    if entry in seen:
+                        continue
+                    seen.add(entry)
+                    other, ref = self.entries[entry]
+                    distance = hamming(value, other)
+                    if distance <= k:
+                        found.append((distance, ref))
+        return found
+
+
+def find_duplicates(listing_ids, k=MAX_DISTANCE):
+    """{listing id: (other listing id, distance)} with the closest photo match among other live listings"""
+    listing_ids = set(listing_ids)
+    rows = list(ListingImageHash.objects.filter(listing__status__in=LIVE_STATUSES).values_list('listing_id', 'hash'))
+    index = HashIndex((value, listing_id) for listing_id, value in rows if has_detail(value))
+    matches = {}
+    for listing_id, value in rows:
+        if listing_id not in listing_ids or not has_detail(value):
+            continue
+        for distance, other in index.search(value, k):
+            if other != listing_id and distance < matches.get(listing_id, (None, k + 1))[1]:
+                matches[listing_id] = (other, distance)
+    return matches
+
+
+def missing_images(rehash=False):
+    """[(listing id, field, file name)] for stored photos without a hash (all of them with `rehash`)"""
+    hashed = defaultdict(set)
+    if not rehash:
+        for listing_id, field in ListingImageHash.objects.values_list('listing_id', 'field'):
+            hashed[listing_id].add(field)
+    return [
+        (row[0], field, name)
+        for row in Listing.objects.order_by().values_list('pk', *IMAGE_FIELDS).iterator(chunk_size=2000)
+        for field, name in zip(IMAGE_FIELDS, row[1:])
+        if name and field not in hashed[row[0]]
+    ]
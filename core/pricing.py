@@ -0,0 +1,145 @@
+"""
+Market price statistics per trim, and per model and year.
+
+``rollup_price_stats`` (run nightly by the management command) loads the
+prices and odometers of ACTIVE and SOLD listings in one query and computes
+count, price percentiles and median odometer for every group at once with
+NumPy: rows are sorted by (group, value) and each percentile is read at its
+interpolated position inside the group's slice. The results replace the
+PriceStats table and bump the ``prices`` page-cache tag.
+
+Each worker keeps the (small) table in memory and reloads it when the tag
+changes, so price estimates and "good deal" badges cost no queries; pages
+showing badges carry the ``prices`` tag.
+"""
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Listing, PriceStats
+from .pagecache import purge_tags, tag_versions
+
+PERCENTILES = {'p10': 10, 'p25': 25, 'median': 50, 'p75': 75, 'p90': 90}
+# Fewer listings than this and a trim falls back to its model and year
+MIN_SAMPLE = 5
+
+
+def group_percentiles(groups, values, percentiles):
+    """
+    (group ids, counts, {name: values}) for integer group codes, with
+    percentiles linearly interpolated like numpy.percentile within each group.
+    """
+    order = np.lexsort((values, groups))
+    groups, values = groups[order], values[order]
+    ids, starts, counts = np.unique(groups, return_index=True, return_counts=True)
+    results = {}
+    for name, q in percentiles.items():
+        position = starts + (counts - 1) * (q / 100)
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        results[name] = values[low] + (values[high] - values[low]) * (position - low)
+    return ids, counts, results
+
+
+def _stats_rows(keys, prices, odometers, computed_at):
+    """PriceStats field dicts for rows grouped by `keys` (one tuple per listing)"""
+    unique_keys, groups = np.unique(keys, axis=0, return_inverse=True)
+    groups = groups.ravel()
+    ids, counts, price_stats = group_percentiles(groups, prices, PERCENTILES)
+    _ids, _counts, odometer_stats = group_percentiles(groups, odometers, {'median_odometer': 50})
+    rows = []
+    for i, group in enumerate(ids):
+        row = {name: int(round(values[i])) for name, values in {**price_stats, **odometer_stats}.items()}
+        row.update(key=tuple(int(part) for part in unique_keys[group]), count=int(counts[i]), computed_at=computed_at)
+        rows.append(row)
+    return rows
+
+
+def rollup_price_stats():
+    """Recompute the PriceStats table; returns {'listings', 'trims', 'model_years'}"""
+    computed_at = timezone.now()
+    rows = list(Listing.objects.filter(status__in=['ACTIVE', 'SOLD']).order_by().values_list(
+        'trim_id', 'trim__model_id', 'trim__year', 'price', 'odometer',
+    ))
+    stats = []
+    if rows:
+        trim_ids, model_ids, years, prices, odometers = (np.array(column) for column in zip(*rows))
+        prices = prices.astype(np.float64)
+        odometers = odometers.astype(np.float64)
+        by_trim = _stats_rows(np.column_stack([trim_ids, model_ids, years]), prices, odometers, computed_at)
+        by_model_year = _stats_rows(np.column_stack([model_ids, years]), prices, odometers, computed_at)
+        for row in by_trim:
+            trim_id, model_id, year = row.pop('key')
+            stats.append(PriceStats(trim_id=trim_id, model_id=model_id, year=year, **row))
+        for row in by_model_year:
+            model_id, year = row.pop('key')
+            stats.append(PriceStats(model_id=model_id, year=year, **row))
+
+    with transaction.atomic():
+        PriceStats.objects.all().delete()
+        PriceStats.objects.bulk_create(stats, batch_size=2000)
+    purge_tags('prices')
+    trims = sum(1 for row in stats if row.trim_id)
+    return {'listings': len(rows), 'trims': trims, 'model_years': len(stats) - trims}
+
+
+def _as_dict(row):
+    return {'count': row.count, **{name: getattr(row, name) for name in PERCENTILES},
+            'median_odometer': row.median_odometer}
+
+
+class PriceIndex:
+    """The PriceStats table in memory, reloaded when a new rollup bumps the ``prices`` tag"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.checked_at = 0.0
+        self.by_trim = {}
+        self.by_model_year = {}
+
+    def refresh(self):
+        now = time.monotonic()
+        if self.version is not None and now - self.checked_at < settings.PRICE_STATS_CHECK_INTERVAL:
+            return
+        with self.lock:
+            if self.version is not None and now - self.checked_at < settings.PRICE_STATS_CHECK_INTERVAL:
+                return  # another thread refreshed while we waited
+            version = tag_versions('prices')['prices']
+            if version != self.version:
+                by_trim, by_model_year = {}, {}
+                for row in PriceStats.objects.all():
+                    if row.trim_id:
+                        by_trim[row.trim_id] = _as_dict(row)
+                    else:
+                        by_model_year[(row.model_id, row.year)] = _as_dict(row)
+                self.by_trim, self.by_model_year = by_trim, by_model_year
+                self.version = version
+            self.checked_at = now
+
+    def estimate(self, trim_id, model_id, year):
+        """Stats for the trim, else for its model and year; None without MIN_SAMPLE listings"""
+        self.refresh()
+        stats = self.by_trim.get(trim_id)
+        if stats and stats['count'] >= MIN_SAMPLE:
+            return {**stats, 'basis': 'trim'}
+        stats = self.by_model_year.get((model_id, year))
+        if stats and stats['count'] >= MIN_SAMPLE:
+            return {**stats, 'basis': 'model_year'}
+        return None
+
+    def is_good_deal(self, listing):
+        """Priced at or below the 25th percentile of comparable cars (needs listing.trim loaded)"""
+        stats = self.estimate(listing.trim_id, listing.trim.model_id, listing.trim.year)
+        return bool(stats) and listing.price <= stats['p25']
+
+    def clear(self):
+        with self.lock:
+            self.version = None
+
+
+price_index = PriceIndex()
@@ -0,0 +1,223 @@
+"""
+Low-overhead stack-sampling profiler for individual requests.
+
+A single daemon thread wakes every ``PROFILER_INTERVAL_MS`` and records the
+current Python stack of every thread that is being profiled (via
+``sys._current_frames()``). Nothing is traced per function call, so the
+request runs at close to normal speed and the result is a statistical
+profile, written as a speedscope file (https://www.speedscope.app) that can
+also be exported as collapsed stacks for flamegraph.pl.
+
+Profiles are stored in ``settings.PROFILER_DIR``; the filename carries the
+timestamp, URL name and duration so listing them never opens a file. The
+directory is pruned to ``PROFILER_MAX_FILES`` / ``PROFILER_MAX_AGE_DAYS``
+after every save.
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+
+FILE_SUFFIX = '.speedscope.json'
+_FILENAME_RE = re.compile(
+    r'^(?P<timestamp>\d{8}T\d{6})_(?P<url_name>[\w.-]+)_(?P<duration>\d+)ms_(?P<token>[0-9a-f]+)'
+    + re.escape(FILE_SUFFIX) + '$'
+)
+
+
+class StackCollector:
+    """Counts identical stacks seen for one profiled thread"""
+
+    def __init__(self):
+        self.stacks = Counter()
+        self.samples = 0
+
+    def add(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        stack.reverse()
+        self.stacks[tuple(stack)] += 1
+        self.samples += 1
+
+
+class Sampler:
+    """Process-wide sampling thread shared by all profiled requests"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.collectors = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def start(self, thread_id):
+        collector = StackCollector()
+        with self.lock:
+            self.collectors[thread_id] = collector
+            if self.thread is None or not self.thread.is_alive():
+                # Started lazily (and again after a fork) so idle workers pay nothing
+                self.thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+        return collector
+
+    def stop(self, thread_id):
+        with self.lock:
+            collector = self.collectors.pop(thread_id, None)
+            if not self.collectors:
+                self.wakeup.clear()
+        return collector
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            self.wakeup.wait()
+            time.sleep(self.interval)
+            with self.lock:
+                active = list(self.collectors.items())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for thread_id, collector in active:
+                frame = frames.get(thread_id)
+                if frame is not None and thread_id != own_id:
+                    collector.add(frame)
+
+
+_sampler = None
+
+
+def get_sampler():
+    global _sampler
+    if _sampler is None:
+        _sampler = Sampler(getattr(settings, 'PROFILER_INTERVAL_MS', 5) / 1000)
+    return _sampler
+
+
+# --- Storage ---
+def _profile_dir():
+    return str(settings.PROFILER_DIR)
+
+
+def to_speedscope(collector, name, duration_ms, interval_ms):
+    """Build a speedscope 'sampled' profile from collected stacks"""
+    frame_index = {}
+    frames = []
+    samples = []
+    weights = []
+    for stack, count in collector.stacks.items():
+        indexes = []
+        for func, filename, line in stack:
+            key = (func, filename, line)
+            if key not in frame_index:
+                frame_index[key] = len(frames)
+                frames.append({'name': func, 'file': filename, 'line': line})
+            indexes.append(frame_index[key])
+        samples.append(indexes)
+        weights.append(count * interval_ms)
+
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'aboraaya-profiler',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': max(duration_ms, sum(weights)),
+            'samples': samples,
+            'weights': weights,
+        }],
+    }
+
+
+def to_collapsed(speedscope):
+    """Convert a stored speedscope profile to collapsed-stack text (flamegraph.pl format)"""
+    frames = speedscope['shared']['frames']
+    profile = speedscope['profiles'][0]
+    lines = []
+    for sample, weight in zip(profile['samples'], profile['weights']):
+        stack = ';'.join(
+            f"{frames[i]['name']} ({os.path.basename(frames[i]['file'])}:{frames[i]['line']})" for i in sample
+        )
+        lines.append(f'{stack} {round(weight)}')
+    return '\n'.join(lines) + '\n'
+
+
+def save_profile(collector, url_name, path, duration_ms):
+    """Write a profile file and prune old ones; returns the filename"""
+    directory = _profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    # 'core:search' -> 'core.search' (colons are not portable in filenames)
+    safe_name = re.sub(r'[^\w.-]', '-', (url_name or 'unresolved').replace(':', '.'))
+    timestamp = datetime.now(dt_timezone.utc).strftime('%Y%m%dT%H%M%S')
+    filename = f'{timestamp}_{safe_name}_{int(duration_ms)}ms_{uuid.uuid4().hex[:8]}{FILE_SUFFIX}'
+
+    interval_ms = getattr(settings, 'PROFILER_INTERVAL_MS', 5)
+    data = to_speedscope(collector, f'{url_name} {path} ({duration_ms:.0f} ms)', duration_ms, interval_ms)
+    with open(os.path.join(directory, filename), 'w', encoding='utf-8') as fh:
+        json.dump(data, fh)
+    prune_profiles()
+    return filename
+
+
+def prune_profiles():
+    """Enforce the retention limits on the profile directory"""
+    max_files = getattr(settings, 'PROFILER_MAX_FILES', 200)
+    max_age = getattr(settings, 'PROFILER_MAX_AGE_DAYS', 7) * 86400
+    now = time.time()
+    try:
+        entries = sorted(
+            (entry for entry in os.scandir(_profile_dir()) if entry.name.endswith(FILE_SUFFIX)),
+            key=lambda entry: entry.stat().st_mtime,
+            reverse=True,
+        )
+    except FileNotFoundError:
+        return
+    for index, entry in enumerate(entries):
+        if index >= max_files or now - entry.stat().st_mtime > max_age:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles():
+    """Metadata for stored profiles, newest first (parsed from filenames)"""
+    try:
+        names = os.listdir(_profile_dir())
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in names:
+        match = _FILENAME_RE.match(name)
+        if not match:
+            continue
+        profiles.append({
+            'filename': name,
+            'url_name': match['url_name'],
+            'duration_ms': int(match['duration']),
+            'created_at': datetime.strptime(match['timestamp'], '%Y%m%dT%H%M%S').replace(tzinfo=dt_timezone.utc),
+        })
+    profiles.sort(key=lambda profile: profile['filename'], reverse=True)
+    return profiles
+
+
+def profile_path(filename):
+    """Absolute path of a stored profile, or None for anything that isn't one"""
+    if not _FILENAME_RE.match(filename):
+        return None
+    path = os.path.join(_profile_dir(), filename)
+    return path if os.path.exists(path) else None
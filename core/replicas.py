@@ -0,0 +1,125 @@
+"""
+Read replicas for public read paths.
+
+Replicas are extra ``DATABASES`` aliases listed in ``settings.READ_REPLICAS``
+(configured with ``DB_REPLICAS``). Reads only go to a replica inside views
+decorated with ``@replica_reads`` - the anonymous-heavy pages and catalog
+endpoints - and only for that request; everything else, and every write,
+uses the primary.
+
+Replicas lag behind the primary, so after a write the visitor would not see
+it on the next page. Write views are decorated with ``@pins_primary``, which
+sets a short-lived cookie on their responses; while it is present
+replica_reads leaves that visitor's reads on the primary (read-your-writes).
+
+Renders that fill a shared cache (core.pagecache) run inside
+``primary_reads()``: a lagging replica would store old rows under the tag
+versions of the purge that just retired them, and keep serving them.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'primary_pin'
+
+# Apps whose rows must be current for every request (logins, sessions)
+PRIMARY_ONLY_APPS = {'sessions', 'account', 'socialaccount', 'admin', 'contenttypes', 'auth'}
+
+# Alias reads are routed to for the current request, if any
+_read_alias = ContextVar('replica_read_alias', default=None)
+# Set while rendering something other visitors will be served from a cache
+_primary_only = ContextVar('replica_primary_only', default=False)
+
+
+class ReplicaRouter:
+    """Routes reads inside replica_reads() to the request's replica; writes to the primary"""
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            return alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Explicit, so saving an object loaded from a replica still writes to the primary
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        aliases = {DEFAULT_DB_ALIAS, *settings.READ_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+def is_pinned(request):
+    return PIN_COOKIE in request.COOKIES
+
+
+def pin_to_primary(response):
+    response.set_cookie(
+        PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+        httponly=True, samesite='Lax', secure=settings.SESSION_COOKIE_SECURE,
+    )
+    return response
+
+
+@contextmanager
+def primary_reads():
+    """Keep reads on the primary, even inside replica_reads views"""
+    token = _primary_only.set(True)
+    try:
+        yield
+    finally:
+        _primary_only.reset(token)
+
+
+def _choose_replica(request):
+    if not settings.READ_REPLICAS or _primary_only.get() or is_pinned(request):
+        return None
+    return random.choice(settings.READ_REPLICAS)
+
+
+def replica_reads(view):
+    """Serve the view's reads from a replica, unless the visitor is pinned to the primary"""
+    if iscoroutinefunction(view):
+        async def wrapper(request, *args, **kwargs):
+            alias = _choose_replica(request)
+            if alias is None:
+                return await view(request, *args, **kwargs)
+            # Load the user from the primary first: a fresh login may not have replicated yet
+            await request.auser()
+            token = _read_alias.set(alias)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _read_alias.reset(token)
+    else:
+        def wrapper(request, *args, **kwargs):
+            alias = _choose_replica(request)
+            if alias is None:
+                return view(request, *args, **kwargs)
+            request.user.is_authenticated  # see above
+            token = _read_alias.set(alias)
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                _read_alias.reset(token)
+    return wraps(view)(wrapper)
+
+
+def pins_primary(view):
+    """Keep the visitor's reads on the primary for a while after using a write view"""
+    # Pinned on every method: some write views (mark_as_sold) change data on GET
+    if iscoroutinefunction(view):
+        async def wrapper(request, *args, **kwargs):
+            return pin_to_primary(await view(request, *args, **kwargs))
+    else:
+        def wrapper(request, *args, **kwargs):
+            return pin_to_primary(view(request, *args, **kwargs))
+    return wraps(view)(wrapper)
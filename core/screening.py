@@ -0,0 +1,171 @@
+"""
+Batch risk screening of PENDING listings for the moderation queue.
+
+All listings waiting for screening are scored in one pass against the
+ACTIVE and SOLD listings of the same trim (or model and year, when the trim
+has fewer than ``pricing.MIN_SAMPLE``). Both sets are loaded with one query
+each; medians and median absolute deviations (MAD) come from
+``pricing.group_percentiles`` and every comparison is a NumPy array
+operation, so the cost is a couple of sorts however many listings arrive.
+
+Robust z-scores, 0.6745 * (x - median) / MAD, flag log prices far below or
+above the market and odometers far above it (|z| >= 3.5, Iglewicz and
+Hoaglin). Mileage that is implausible for the car's age is flagged from
+the model year alone, and photos that are near-duplicates of another
+listing's come from ``photohash.find_duplicates``. The score (0-100) and
+the reasons are stored on the listing; editing a listing clears them so the
+next batch rescreens it.
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from .models import Listing
+from .photohash import find_duplicates
+from .pricing import MIN_SAMPLE, group_percentiles
+
+OUTLIER_Z = 3.5
+# MAD floors, so tight groups of near-identical prices do not flag small differences
+MIN_LOG_PRICE_MAD = 0.05
+MIN_ODOMETER_MAD = 5000
+MAX_KM_PER_YEAR = 60000
+MIN_KM_PER_YEAR = 1000  # below this after five years the odometer was likely rolled back
+DUPLICATE_PHOTO_SCORE = 40
+
+REASONS = {
+    'price_below_market': _('Price far below similar cars'),
+    'price_above_market': _('Price far above similar cars'),
+    'odometer_above_market': _('Mileage far above similar cars'),
+    'implausible_mileage': _('Mileage implausible for the model year'),
+    'odometer_too_low': _('Mileage suspiciously low for the model year'),
+    'no_market_data': _('Too few similar cars to compare prices'),
+    'duplicate_photo': _('Photo also used in listing'),
+}
+
+
+def _robust_stats(groups, values):
+    """Sorted group ids with their sizes, medians and MADs"""
+    ids, counts, medians = group_percentiles(groups, values, {'median': 50})
+    medians = medians['median']
+    deviations = np.abs(values - medians[np.searchsorted(ids, groups)])
+    _ids, _counts, mads = group_percentiles(groups, deviations, {'mad': 50})
+    return ids, counts, medians, mads['mad']
+
+
+def _lookup(ids, counts, keys):
+    """Position of each key in `ids`, or -1 when missing or under MIN_SAMPLE"""
+    if not len(ids):
+        return np.full(len(keys), -1)
+    positions = np.clip(np.searchsorted(ids, keys), 0, len(ids) - 1)
+    usable = (ids[positions] == keys) & (counts[positions] >= MIN_SAMPLE)
+    return np.where(usable, positions, -1)
+
+
+def _columns(queryset):
+    rows = list(queryset.order_by().values_list('pk', 'trim_id', 'trim__model_id', 'trim__year', 'price', 'odometer'))
+    if not rows:
+        return None
+    pk, trim, model, year, price, odometer = (np.array(column) for column in zip(*rows))
+    return {
+        'pk': pk, 'trim': trim.astype(np.int64), 'year': year.astype(np.int64),
+        'model_year': model.astype(np.int64) * 10000 + year,
+        'log_price': np.log(np.maximum(price.astype(np.float64), 1)),
+        'odometer': odometer.astype(np.float64),
+    }
+
+
+def _robust_z(pending, reference, field, min_mad):
+    """Robust z-score of each pending value against its trim (or model/year) group; NaN without data"""
+    z = np.full(len(pending['pk']), np.nan)
+    if reference is None:
+        return z
+    for key in ('trim', 'model_year'):
+        ids, counts, medians, mads = _robust_stats(reference[key], reference[field])
+        positions = _lookup(ids, counts, pending[key])
+        todo = np.isnan(z) & (positions >= 0)
+        found = positions[todo]
+        z[todo] = 0.6745 * (pending[field][todo] - medians[found]) / np.maximum(mads[found], min_mad)
+    return z
+
+
+def _ramp(values, start, span):
+    """0 at `start`, 1 at `start + span`, clipped; NaN counts as 0"""
+    return np.nan_to_num(np.clip((values - start) / span, 0, 1))
+
+
+def score(pending, reference, year):
+    """(scores, reasons) for column arrays of pending listings against reference listings"""
+    price_z = _robust_z(pending, reference, 'log_price', MIN_LOG_PRICE_MAD)
+    odometer_z = _robust_z(pending, reference, 'odometer', MIN_ODOMETER_MAD)
+    age = np.maximum(year - pending['year'], 1)
+    km_per_year = pending['odometer'] / age
+
+    flags = {
+        'price_below_market': price_z <= -OUTLIER_Z,
+        'price_above_market': price_z >= OUTLIER_Z,
+        'odometer_above_market': odometer_z >= OUTLIER_Z,
+        'implausible_mileage': km_per_year > MAX_KM_PER_YEAR,
+        'odometer_too_low': (age >= 5) & (km_per_year < MIN_KM_PER_YEAR),
+        'no_market_data': np.isnan(price_z),
+    }
+    scores = (
+        60 * _ramp(-price_z, 2, 4)
+        + 15 * _ramp(price_z, 2, 4)
+        + 15 * _ramp(odometer_z, 2, 4)
+        + 30 * _ramp(km_per_year, MAX_KM_PER_YEAR, MAX_KM_PER_YEAR)
+        + 20 * flags['odometer_too_low']
+    )
+    details = {
+        'price_below_market': price_z, 'price_above_market': price_z, 'odometer_above_market': odometer_z,
+        'implausible_mileage': km_per_year, 'odometer_too_low': km_per_year,
+    }
+    reasons = [[] for _pk in pending['pk']]
+    for code, flagged in flags.items():
+        for i in np.flatnonzero(flagged):
+            reason = {'code': code}
+            if code in details:
+                reason['value'] = round(float(details[code][i]), 1)
+            reasons[i].append(reason)
+    return np.minimum(np.round(scores), 100).astype(int), reasons
+
+
+def screen_pending(rescreen=False):
+    """Score PENDING listings not yet screened (or all of them); returns how many were scored"""
+    queryset = Listing.objects.filter(status='PENDING')
+    if not rescreen:
+        queryset = queryset.filter(risk_score__isnull=True)
+    pending = _columns(queryset)
+    if pending is None:
+        return 0
+    reference = _columns(Listing.objects.filter(Q(status='ACTIVE') | Q(status='SOLD')))
+    scores, reasons = score(pending, reference, timezone.now().year)
+    duplicates = find_duplicates(pending['pk'].tolist())
+    for i, pk in enumerate(pending['pk'].tolist()):
+        if pk in duplicates:
+            other, distance = duplicates[pk]
+            reasons[i].append({'code': 'duplicate_photo', 'listing': other, 'value': distance})
+            scores[i] = min(scores[i] + DUPLICATE_PHOTO_SCORE, 100)
+    flagged = [i for i, why in enumerate(reasons) if why or scores[i]]
+    clean = np.delete(pending['pk'], flagged).tolist()
+    with transaction.atomic():
+        # Most listings come out clean: one UPDATE for all of them, CASE updates for the rest
+        for start in range(0, len(clean), 500):
+            Listing.objects.filter(pk__in=clean[start:start + 500]).update(risk_score=0, risk_reasons=[])
+        Listing.objects.bulk_update(
+            [Listing(pk=int(pending['pk'][i]), risk_score=int(scores[i]), risk_reasons=reasons[i]) for i in flagged],
+            ['risk_score', 'risk_reasons'], batch_size=500,
+        )
+    return len(scores)
+
+
+def describe(reasons):
+    """Display labels for stored reasons"""
+    labels = []
+    for reason in reasons:
+        label = str(REASONS.get(reason['code'], reason['code']))
+        if 'listing' in reason:
+            label += f" #{reason['listing']}"
+        labels.append(label)
+    return labels
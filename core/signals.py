@@ -0,0 +1,82 @@
+"""
+Cache invalidation and denormalized counter hooks, connected in CoreConfig.ready().
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .auth import invalidate_cached_user
+from .catalog import bump_catalog_version
+from .favorites import invalidate_favorite_ids, recount_favorites
+from .models import CarTrim, Favorite, Listing, Make, Model, User
+from .pagecache import purge_tags
+from .phones import invalidate_listing, invalidate_seller
+
+
+@receiver([post_save, post_delete], sender=Make)
+@receiver([post_save, post_delete], sender=Model)
+@receiver([post_save, post_delete], sender=CarTrim)
+def invalidate_catalog(sender, **kwargs):
+    bump_catalog_version()
+
+
+def _active_set_tags(*trim_ids):
+    make_ids = CarTrim.objects.filter(pk__in=[pk for pk in trim_ids if pk]).values_list('model__make_id', flat=True)
+    return ['active:all'] + [f'active:make:{make_id}' for make_id in set(make_ids)]
+
+
+@receiver(post_save, sender=Listing)
+def invalidate_listing_pages(sender, instance, created, **kwargs):
+    """
+    Purge cached pages showing the listing, plus pages built from the ACTIVE
+    set when the listing joins or leaves it (or moves to another make).
+    Counter columns are updated with queryset.update() and purge nothing.
+    """
+    tags = [f'listing:{instance.pk}']
+    was_active = not created and getattr(instance, '_loaded_status', None) == 'ACTIVE'
+    is_active = instance.status == 'ACTIVE'
+    old_trim_id = getattr(instance, '_loaded_trim_id', None)
+    if was_active != is_active or (is_active and old_trim_id != instance.trim_id):
+        tags += _active_set_tags(old_trim_id, instance.trim_id)
+    purge_tags(*tags)
+    invalidate_listing(instance.pk)
+    instance._loaded_status = instance.status
+    instance._loaded_trim_id = instance.trim_id
+
+
+@receiver(post_delete, sender=Listing)
+def invalidate_deleted_listing_pages(sender, instance, **kwargs):
+    tags = [f'listing:{instance.pk}']
+    if instance.status == 'ACTIVE':
+        tags += _active_set_tags(instance.trim_id)
+    purge_tags(*tags)
+    invalidate_listing(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def invalidate_seller_pages(sender, instance, update_fields=None, **kwargs):
+    # Listing pages show the seller's name, phone and dealer badge
+    purge_tags(f'seller:{instance.pk}')
+    # Logins save only last_login; skip the listing lookup for saves that cannot change the phone
+    if update_fields is None or 'phone_number' in update_fields:
+        invalidate_seller(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_request_user(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_delete, sender=Favorite)
+def update_favorites_count(sender, instance, origin=None, **kwargs):
+    """
+    Keep Listing.favorites_count right for every delete path: toggle_favorite,
+    the admin, and cascades from a deleted user. It is recounted rather than
+    decremented, since a concurrent delete of the same row still fires this.
+    """
+    if isinstance(origin, Listing) or getattr(origin, 'model', None) is Listing:
+        return  # the listing itself is going away
+    recount_favorites(instance.listing_id)
+    transaction.on_commit(partial(invalidate_favorite_ids, instance.user_id))
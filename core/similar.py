@@ -0,0 +1,135 @@
+"""
+Precomputed "similar listings" for the listing page.
+
+Every ACTIVE listing becomes a feature vector: log price, year, log
+odometer and horsepower as z-scores, plus one-hot body category, make, fuel
+type and governorate, each block weighted by how much it should count. The
+nearest neighbours by Euclidean distance are found with NumPy in batches of
+rows (a block of the distance matrix at a time) and stored in the
+SimilarListing table, so the page reads them with one indexed lookup.
+
+``refresh_similar_listings`` is incremental by default and meant for cron.
+It recomputes the listings changed since the last run, those whose
+neighbours changed or left the ACTIVE set, and those a changed listing now
+comes closer to than their current k-th neighbour. ``force`` recomputes
+everything, which also picks up drift in the feature scaling.
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import Listing, SimilarListing
+from .pagecache import purge_tags
+
+NEIGHBORS = 8           # stored per listing; the page shows the first ACTIVE ones
+BATCH_SIZE = 1024       # rows per block of the distance matrix
+
+NUMERIC_WEIGHTS = {'price': 2.0, 'year': 1.5, 'odometer': 1.0, 'horsepower': 1.0}
+CATEGORICAL_WEIGHTS = {'category': 1.0, 'make': 0.75, 'fuel_type': 0.5, 'location': 0.5}
+
+_FIELDS = {
+    'price': 'price', 'year': 'trim__year', 'odometer': 'odometer', 'horsepower': 'trim__horsepower',
+    'category': 'trim__model__category', 'make': 'trim__model__make_id',
+    'fuel_type': 'trim__fuel_type', 'location': 'location',
+}
+
+
+def load_features():
+    """(ACTIVE listing ids, float32 feature matrix) from one query"""
+    rows = list(Listing.objects.filter(status='ACTIVE').order_by('pk').values_list('pk', *_FIELDS.values()))
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    columns = dict(zip(_FIELDS, zip(*(row[1:] for row in rows)))) if rows else {}
+    blocks = []
+    for name, weight in NUMERIC_WEIGHTS.items():
+        values = np.array(columns.get(name, ()), dtype=np.float64)
+        if name in ('price', 'odometer'):
+            values = np.log1p(np.maximum(values, 0))
+        std = values.std() if len(values) else 0.0
+        blocks.append(((values - values.mean()) / std if std else np.zeros_like(values)) * weight)
+    for name, weight in CATEGORICAL_WEIGHTS.items():
+        values = columns.get(name, ())
+        codes = {value: i for i, value in enumerate(sorted(set(values), key=str))}
+        one_hot = np.zeros((len(values), len(codes)))
+        one_hot[np.arange(len(values)), [codes[value] for value in values]] = weight
+        blocks.append(one_hot)
+    matrix = np.column_stack(blocks) if rows else np.zeros((0, 0))
+    return ids, matrix.astype(np.float32)
+
+
+def nearest(matrix, rows, k=NEIGHBORS, batch_size=BATCH_SIZE):
+    """Yield (row, neighbour rows, distances) for each of `rows`, nearest first, excluding the row itself"""
+    k = min(k, len(matrix) - 1)
+    if k <= 0:
+        return
+    squared = np.einsum('ij,ij->i', matrix, matrix)
+    for start in range(0, len(rows), batch_size):
+        block = np.asarray(rows[start:start + batch_size])
+        distances = squared[block, None] + squared[None, :] - 2 * matrix[block] @ matrix.T
+        distances[np.arange(len(block)), block] = np.inf
+        candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+        order = np.argsort(candidate_distances, axis=1)
+        neighbours = np.take_along_axis(candidates, order, axis=1)
+        neighbour_distances = np.sqrt(np.maximum(np.take_along_axis(candidate_distances, order, axis=1), 0))
+        for i, row in enumerate(block):
+            yield row, neighbours[i], neighbour_distances[i]
+
+
+def _closer_than_kth(matrix, changed_rows, kth, batch_size=BATCH_SIZE):
+    """Boolean mask of rows some changed row is now nearer to than their stored k-th neighbour"""
+    mask = np.zeros(len(matrix), dtype=bool)
+    squared = np.einsum('ij,ij->i', matrix, matrix)
+    for start in range(0, len(changed_rows), batch_size):
+        block = np.asarray(changed_rows[start:start + batch_size])
+        distances = squared[block, None] + squared[None, :] - 2 * matrix[block] @ matrix.T
+        distances[np.arange(len(block)), block] = np.inf
+        mask |= np.sqrt(np.maximum(distances.min(axis=0), 0)) < kth
+    return mask
+
+
+def refresh_similar_listings(force=False):
+    """Bring the SimilarListing table up to date; returns {'recomputed', 'rows', 'total'}"""
+    started = timezone.now()
+    ids, matrix = load_features()
+    position = {pk: row for row, pk in enumerate(ids.tolist())}
+
+    last_run = None if force else SimilarListing.objects.aggregate(last=Max('computed_at'))['last']
+    force = last_run is None
+    if force:
+        rows = np.arange(len(ids))
+    else:
+        kth = dict(SimilarListing.objects.order_by().values_list('listing_id').annotate(Max('distance')))
+        changed = set(Listing.objects.filter(status='ACTIVE', updated_at__gte=last_run).values_list('pk', flat=True))
+        changed |= {pk for pk in position if pk not in kth}
+        # Lists pointing at a changed listing, or one that left the ACTIVE set
+        stale = SimilarListing.objects.filter(
+            Q(similar_id__in=changed) | ~Q(similar__status='ACTIVE')
+        ).values_list('listing_id', flat=True).distinct()
+        recompute = changed | set(stale)
+        changed_rows = [position[pk] for pk in changed if pk in position]
+        if changed_rows:
+            kth_by_row = np.array([kth.get(pk, np.inf) for pk in ids.tolist()])
+            recompute |= set(ids[_closer_than_kth(matrix, changed_rows, kth_by_row)].tolist())
+        rows = np.array(sorted(position[pk] for pk in recompute if pk in position), dtype=np.int64)
+
+    new_rows = [
+        SimilarListing(listing_id=int(ids[row]), similar_id=int(ids[neighbour]), rank=rank,
+                       distance=float(distance), computed_at=started)
+        for row, neighbours, distances in nearest(matrix, rows)
+        for rank, (neighbour, distance) in enumerate(zip(neighbours, distances))
+    ]
+    recomputed = [int(ids[row]) for row in rows]
+    with transaction.atomic():
+        if force:
+            SimilarListing.objects.all().delete()
+        else:
+            SimilarListing.objects.filter(Q(listing_id__in=recomputed) | ~Q(listing__status='ACTIVE')).delete()
+        SimilarListing.objects.bulk_create(new_rows, batch_size=2000)
+
+    # Listing pages carry similar:<pk>; a full rebuild retires them all at once
+    if force:
+        purge_tags('similar')
+    else:
+        purge_tags(*(f'similar:{pk}' for pk in recomputed))
+    return {'recomputed': len(recomputed), 'rows': len(new_rows), 'total': len(ids)}
@@ -0,0 +1,182 @@
+"""
+Pre-generated, sharded XML sitemaps for listing detail pages.
+
+Django's sitemap framework builds the XML per request from a full queryset,
+which does not scale to our listing volume. Instead the sitemap files are
+written to ``settings.SITEMAP_ROOT`` by the ``generate_sitemaps`` management
+command and served from disk by ``core.views.sitemap_file``.
+
+Listings are sharded by primary-key range, so a listing always lands in the
+same shard file. Each shard records a fingerprint (count, pk sum and latest
+``updated_at`` of its ACTIVE listings) in a manifest; a regeneration run only
+rewrites the shards whose fingerprint changed.
+"""
+import json
+import os
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.db.models import Count, F, Max, Sum
+from django.urls import reverse
+from django.utils import translation
+
+from .models import Listing
+
+# Search engines accept at most 50,000 <url> entries per sitemap file.
+# Every listing produces one entry per language.
+URLS_PER_SHARD = 50000
+LISTINGS_PER_SHARD = URLS_PER_SHARD // len(settings.LANGUAGES)
+
+INDEX_FILENAME = 'sitemap.xml'
+SHARD_DIR = 'sitemaps'
+MANIFEST_FILENAME = 'manifest.json'
+
+# Placeholder pk used to build a URL template once per language
+_PK_PLACEHOLDER = 987654321
+
+
+def shard_filename(shard):
+    """Relative path of a shard file inside SITEMAP_ROOT"""
+    return f"{SHARD_DIR}/listings-{shard:05d}.xml"
+
+
+def get_base_url():
+    """Absolute base URL (scheme + domain) from the Sites framework"""
+    domain = Site.objects.get_current().domain
+    return f"{settings.SITEMAP_PROTOCOL}://{domain}"
+
+
+def _listing_url_templates(base_url):
+    """Return {lang: 'https://host/<lang>/listing/{pk}/'} without reversing per row"""
+    templates = {}
+    for lang, _name in settings.LANGUAGES:
+        with translation.override(lang):
+            path = reverse('core:listing_detail', kwargs={'pk': _PK_PLACEHOLDER})
+        templates[lang] = base_url + path.replace(str(_PK_PLACEHOLDER), '{pk}')
+    return templates
+
+
+def _shard_fingerprints():
+    """Fingerprint every non-empty shard with one GROUP BY query"""
+    rows = (
+        Listing.objects.filter(status='ACTIVE')
+        .annotate(shard=F('pk') / LISTINGS_PER_SHARD)
+        .values('shard')
+        .annotate(count=Count('pk'), pk_sum=Sum('pk'), lastmod=Max('updated_at'))
+        .order_by('shard')
+    )
+    return {
+        row['shard']: {
+            'count': row['count'],
+            'pk_sum': row['pk_sum'],
+            'lastmod': row['lastmod'].isoformat() if row['lastmod'] else None,
+        }
+        for row in rows
+    }
+
+
+def _atomic_write(path, chunks):
+    """Write chunks to a temp file and rename it over path"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        for chunk in chunks:
+            fh.write(chunk)
+    os.replace(tmp_path, path)
+
+
+def _render_shard(shard, url_templates):
+    """Yield the XML for one shard, streaming listings from the DB"""
+    start = shard * LISTINGS_PER_SHARD
+    listings = (
+        Listing.objects.filter(
+            status='ACTIVE', pk__gte=start, pk__lt=start + LISTINGS_PER_SHARD
+        )
+        .order_by('pk')
+        .values_list('pk', 'updated_at')
+    )
+
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield (
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" '
+        'xmlns:xhtml="http://www.w3.org/1999/xhtml">\n'
+    )
+    for pk, updated_at in listings.iterator(chunk_size=2000):
+        urls = {lang: escape(template.format(pk=pk)) for lang, template in url_templates.items()}
+        alternates = ''.join(
+            f'<xhtml:link rel="alternate" hreflang="{lang}" href="{url}"/>'
+            for lang, url in urls.items()
+        )
+        alternates += (
+            f'<xhtml:link rel="alternate" hreflang="x-default" '
+            f'href="{urls[settings.LANGUAGE_CODE]}"/>'
+        )
+        lastmod = f"<lastmod>{updated_at.isoformat()}</lastmod>" if updated_at else ''
+        for url in urls.values():
+            yield f"<url><loc>{url}</loc>{lastmod}{alternates}</url>\n"
+    yield '</urlset>\n'
+
+
+def _render_index(fingerprints, base_url):
+    """Yield the sitemap index pointing at every shard"""
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for shard, fingerprint in sorted(fingerprints.items()):
+        loc = escape(f"{base_url}/{shard_filename(shard)}")
+        lastmod = f"<lastmod>{fingerprint['lastmod']}</lastmod>" if fingerprint['lastmod'] else ''
+        yield f"<sitemap><loc>{loc}</loc>{lastmod}</sitemap>\n"
+    yield '</sitemapindex>\n'
+
+
+def _load_manifest(root):
+    try:
+        with open(os.path.join(root, SHARD_DIR, MANIFEST_FILENAME), encoding='utf-8') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def generate_sitemaps(root=None, base_url=None, force=False):
+    """
+    (Re)generate the sitemap index and any changed shards.
+
+    Returns a dict with the shards that were written and removed.
+    """
+    root = str(root or settings.SITEMAP_ROOT)
+    base_url = (base_url or get_base_url()).rstrip('/')
+
+    manifest = _load_manifest(root)
+    if manifest.get('base_url') != base_url:
+        # Every URL changes when the host changes
+        force = True
+    previous = {int(shard): fp for shard, fp in manifest.get('shards', {}).items()}
+    current = _shard_fingerprints()
+
+    url_templates = _listing_url_templates(base_url)
+    written = []
+    for shard, fingerprint in current.items():
+        path = os.path.join(root, shard_filename(shard))
+        if force or previous.get(shard) != fingerprint or not os.path.exists(path):
+            _atomic_write(path, _render_shard(shard, url_templates))
+            written.append(shard)
+
+    removed = sorted(set(previous) - set(current))
+    for shard in removed:
+        try:
+            os.remove(os.path.join(root, shard_filename(shard)))
+        except FileNotFoundError:
+            pass
+
+    index_path = os.path.join(root, INDEX_FILENAME)
+    if written or removed or not os.path.exists(index_path):
+        _atomic_write(index_path, _render_index(current, base_url))
+
+    _atomic_write(
+        os.path.join(root, SHARD_DIR, MANIFEST_FILENAME),
+        [json.dumps({
+            'base_url': base_url,
+            'shards': {str(shard): fp for shard, fp in current.items()},
+        }, indent=2)],
+    )
+    return {'written': written, 'removed': removed, 'total': len(current)}
@@ -1,5 +1,7 @@
 from django import template
 
+from core.pricing import price_index
+
 register = template.Library()
 
 @register.filter(name='has_file')
@@ -22,3 +24,8 @@ def noloc(value):
         return str(int(value))
     except (ValueError, TypeError):
         return str(value)
+
+@register.filter(name='good_deal')
+def good_deal(listing):
+    """Whether the listing is priced in the cheapest quarter of comparable cars (core.pricing)"""
+    return price_index.is_good_deal(listing)
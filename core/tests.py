@@ -1,3 +1,1305 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from functools import wraps
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Q
+from django.http import Http404
+from asgiref.sync import sync_to_async
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.core import mail
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import translation
+
+from . import (
+    admin_views, alerts, async_views, cachefill, counters, favorites, metrics, pagecache, phones, photohash, pricing,
+    profiling, replicas, screening, similar, sitemaps, throttle, views, warmup,
+)
+from .autocomplete import autocomplete
+from .fuzzy import keyword_filter, matcher, phonetic_key, skeleton
+from .catalog import get_trim_specs
+from .models import User, Make, Model, CarTrim, Listing, ListingImageHash, Favorite, SavedSearch, SimilarListing
+from .text import normalize
+
+
+# --- Query budget helpers ---
+@contextmanager
+def max_queries(testcase, budget):
+    """Fail the test if more than `budget` queries run inside the block"""
+    with CaptureQueriesContext(connection) as ctx:
+        yield ctx
+    executed = len(ctx.captured_queries)
+    if executed > budget:
+        statements = '\n'.join(f"  {i}. {q['sql']}" for i, q in enumerate(ctx.captured_queries, 1))
+        testcase.fail(f'{executed} queries executed, budget is {budget}:\n{statements}')
+
+
+def query_budget(budget):
+    """Decorator form of max_queries for a whole test method"""
+    def decorator(test_method):
+        @wraps(test_method)
+        def wrapper(self, *args, **kwargs):
+            with max_queries(self, budget):
+                return test_method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Keep buffered counters from flushing mid-measurement; budgets count primary queries
+@override_settings(COUNTER_FLUSH_INTERVAL=3600, READ_REPLICAS=[])
+class QueryBudgetTestCase(TestCase):
+    """
+    Seeds listings at two sizes and checks that a view's query count stays
+    flat (no N+1) and within its budget.
+    """
+    SMALL = 10
+    LARGE = 200
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', 'seller@example.com', 'pass', is_dealer=True)
+        cls.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'pass')
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        make = Make.objects.create(name_en='Toyota', name_ar='تويوتا')
+        model = Model.objects.create(make=make, name_en='Corolla', name_ar='كورولا', category='Sedan')
+        cls.trim = CarTrim.objects.create(
+            model=model, name='1.6L', year=2022, engine_cc=1600, horsepower=120,
+            fuel_consumption=6.5, transmission='AUTO', fuel_type='PETROL',
+        )
+
+    def add_listings(self, total):
+        """Top up ACTIVE/PENDING listings (and the buyer's favorites) to `total` each"""
+        missing = total - Listing.objects.filter(status='ACTIVE').count()
+        if missing <= 0:
+            return
+        # Alternate makes/models so related rows are not all shared
+        make = Make.objects.create(name_en=f'Make {total}', name_ar=f'ماركة {total}')
+        model = Model.objects.create(make=make, name_en=f'Model {total}', name_ar=f'موديل {total}', category='SUV')
+        trim = CarTrim.objects.create(
+            model=model, name='2.0L', year=2020, engine_cc=2000, horsepower=150,
+            fuel_consumption=8.0, transmission='MANUAL', fuel_type='DIESEL',
+        )
+        new_listings = []
+        for i in range(missing):
+            for status in ('ACTIVE', 'PENDING'):
+                new_listings.append(Listing(
+                    seller=self.seller if i % 2 else self.buyer,
+                    trim=self.trim if i % 3 else trim,
+                    price=100000 + i, odometer=1000 * i, color='White',
+                    description='Test car', location='CAIRO', status=status,
+                    favorites_count=int(status == 'ACTIVE'),  # the buyer's, below
+                ))
+        Listing.objects.bulk_create(new_listings)
+        Favorite.objects.bulk_create(
+            [Favorite(user=self.buyer, listing=listing) for listing in new_listings if listing.status == 'ACTIVE'],
+            ignore_conflicts=True,
+        )
+
+    def assertFlatQueries(self, budget, request, login=None):
+        """Run `request()` at SMALL and LARGE sizes; query counts must match and fit the budget"""
+        if login:
+            self.client.force_login(login)
+        warmup.warm_up(shared=False)  # per-process state, as a gunicorn worker loads after fork
+        counts = []
+        for size in (self.SMALL, self.LARGE):
+            self.add_listings(size)
+            with max_queries(self, budget) as ctx:
+                response = request()
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(
+            counts[0], counts[1],
+            f'Query count grows with row count ({self.SMALL} rows: {counts[0]}, {self.LARGE} rows: {counts[1]})',
+        )
+
+    def first_active(self):
+        return Listing.objects.filter(status='ACTIVE').order_by('pk').first()
+
+
+class ViewQueryBudgetTests(QueryBudgetTestCase):
+
+    def test_home(self):
+        self.assertFlatQueries(2, lambda: self.client.get(reverse('core:home')))
+
+    def test_search_listings(self):
+        self.assertFlatQueries(3, lambda: self.client.get(reverse('core:search')))
+
+    def test_search_listings_filtered(self):
+        self.assertFlatQueries(4, lambda: self.client.get(reverse('core:search'), {
+            'make': self.trim.model.make_id, 'transmission': 'AUTO', 'sort': 'price_low',
+        }))
+
+    def test_search_listings_logged_in(self):
+        # Favorite state costs one query for the whole grid, not one per card
+        self.assertFlatQueries(
+            6, lambda: self.client.get(reverse('core:search')), login=self.buyer,
+        )
+
+    def test_listing_detail(self):
+        self.add_listings(self.SMALL)
+        similar.refresh_similar_listings(force=True)
+        pk = self.first_active().pk
+        self.assertFlatQueries(2, lambda: self.client.get(reverse('core:listing_detail', args=[pk])))
+
+    def test_compare_listings(self):
+        self.add_listings(self.SMALL)
+        ids = ','.join(str(pk) for pk in Listing.objects.filter(status='ACTIVE').values_list('pk', flat=True)[:3])
+        # Listings + one query for trim specs not yet in the cache
+        self.assertFlatQueries(2, lambda: self.client.get(reverse('core:compare'), {'ids': ids}))
+
+    def test_seller_dashboard(self):
+        self.assertFlatQueries(
+            9, lambda: self.client.get(reverse('core:dashboard')), login=self.buyer,
+        )
+
+    def test_admin_dashboard(self):
+        self.assertFlatQueries(
+            7, lambda: self.client.get(reverse('core:admin_dashboard')), login=self.admin,
+        )
+
+    def test_listing_admin_changelist(self):
+        self.assertFlatQueries(
+            8, lambda: self.client.get(reverse('admin:core_listing_changelist')), login=self.admin,
+        )
+
+
+class QueryBudgetHelperTests(TestCase):
+
+    @query_budget(1)
+    def test_decorator_allows_budget(self):
+        Listing.objects.count()
+
+    def test_context_manager_fails_over_budget(self):
+        with self.assertRaises(AssertionError):
+            with max_queries(self, 1):
+                Listing.objects.count()
+                Listing.objects.count()
+
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'}}
+
+
+class FavoriteTests(QueryBudgetTestCase):
+
+    def test_toggle_favorite_maintains_count_and_grid_state(self):
+        self.add_listings(self.SMALL)
+        listing = Listing.objects.filter(status='ACTIVE').exclude(favorited_by__user=self.seller).first()
+        self.client.force_login(self.seller)
+        url = reverse('core:toggle_favorite', args=[listing.pk])
+
+        response = self.client.post(url)
+        self.assertEqual(response.json()['favorites_count'], listing.favorites_count + 1)
+        search = self.client.get(reverse('core:search'))
+        self.assertIn(listing.pk, search.context['favorite_ids'])
+
+        response = self.client.post(url)
+        self.assertFalse(response.json()['is_favorited'])
+        self.assertEqual(Listing.objects.get(pk=listing.pk).favorites_count, listing.favorites_count)
+
+    def listing(self):
+        return Listing.objects.create(
+            seller=self.seller, trim=self.trim, price=100000, odometer=0, color='White',
+            description='Test car', location='CAIRO', status='ACTIVE',
+        )
+
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_cached_ids_are_dropped_after_the_commit(self):
+        from django.core.cache import cache
+        cache.clear()
+        listing = self.listing()
+        favorites.get_favorite_ids(self.buyer)
+        with self.captureOnCommitCallbacks() as callbacks:
+            favorites.toggle_favorite(self.buyer.pk, listing.pk)
+            self.assertNotIn(listing.pk, favorites.get_favorite_ids(self.buyer))
+        for callback in callbacks:
+            callback()
+        self.assertIn(listing.pk, favorites.get_favorite_ids(self.buyer))
+
+    def test_count_follows_cascaded_deletes(self):
+        listing = self.listing()
+        fan = User.objects.create_user('fan', 'fan@example.com', 'pass')
+        for user in (self.buyer, fan):
+            favorites.toggle_favorite(user.pk, listing.pk)
+        fan.delete()
+        listing.refresh_from_db()
+        self.assertEqual(listing.favorites_count, 1)
+        favorites.toggle_favorite(self.buyer.pk, listing.pk)
+        listing.refresh_from_db()
+        self.assertEqual(listing.favorites_count, 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CompareTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.add_listings(self.SMALL)
+
+    def test_listings_keep_requested_order(self):
+        pks = list(Listing.objects.filter(status='ACTIVE').order_by('pk').values_list('pk', flat=True)[:3])
+        requested = [pks[2], pks[0], pks[1]]
+        response = self.client.get(reverse('core:compare'), {
+            'ids': ','.join(map(str, requested)), 'format': 'json',
+        })
+        data = response.json()
+        self.assertEqual(data['mode'], 'listings')
+        self.assertEqual([item['id'] for item in data['items']], requested)
+        self.assertEqual([row['key'] for row in data['rows']][:2], ['horsepower', 'engine_cc'])
+
+    def test_compare_trims_directly(self):
+        other = CarTrim.objects.exclude(pk=self.trim.pk).first()
+        response = self.client.get(reverse('core:compare'), {'trims': f'{other.pk},{self.trim.pk}'})
+        self.assertEqual(
+            [item['spec']['id'] for item in response.context['items']], [other.pk, self.trim.pk],
+        )
+        self.assertContains(response, 'كورولا')
+
+    def test_trim_specs_are_cached_and_invalidated(self):
+        get_trim_specs([self.trim.pk])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_trim_specs([self.trim.pk])[self.trim.pk]['horsepower'], 120)
+        self.trim.horsepower = 130
+        self.trim.save()
+        self.assertEqual(get_trim_specs([self.trim.pk])[self.trim.pk]['horsepower'], 130)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class PageCacheTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.add_listings(self.SMALL)
+        self.listing = self.first_active()
+        self.url = reverse('core:listing_detail', args=[self.listing.pk])
+
+    def tearDown(self):
+        counters.flush_all()
+
+    def test_anonymous_hits_skip_the_view_but_count_views(self):
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        counters.flush_all()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.views, 2)
+
+    def test_entries_are_per_language(self):
+        self.client.get(self.url)
+        english = reverse('core:listing_detail', args=[self.listing.pk]).replace('/ar/', '/en/', 1)
+        self.assertEqual(self.client.get(english)['X-Page-Cache'], 'miss')
+
+    def test_editing_a_listing_purges_its_pages(self):
+        featured = self.client.get(reverse('core:home')).context['featured_listings'][0]
+        url = reverse('core:listing_detail', args=[featured.pk])
+        self.client.get(url)
+        featured.price = 123456
+        featured.save()
+        self.assertContains(self.client.get(url), '123.456')
+        self.assertEqual(self.client.get(reverse('core:home'))['X-Page-Cache'], 'miss')
+
+    def test_new_active_listing_purges_home(self):
+        self.assertEqual(self.client.get(reverse('core:home'))['X-Page-Cache'], 'miss')
+        self.assertEqual(self.client.get(reverse('core:home'))['X-Page-Cache'], 'hit')
+        pending = Listing.objects.filter(status='PENDING').first()
+        pending.status = 'ACTIVE'
+        pending.save(update_fields=['status'])
+        self.assertEqual(self.client.get(reverse('core:home'))['X-Page-Cache'], 'miss')
+
+    def test_search_count_follows_the_active_set(self):
+        url = reverse('core:search')
+        total = self.client.get(url).context['total_count']
+        listing = self.first_active()
+        listing.status = 'SOLD'
+        listing.save()
+        self.assertEqual(self.client.get(url).context['total_count'], total - 1)
+
+    def test_unread_query_parameters_share_the_entry(self):
+        self.client.get(self.url)
+        response = self.client.get(self.url, {'utm_source': 'newsletter', 'fbclid': 'abc'})
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+
+        def key(query):
+            request = RequestFactory().get(f'/en/?{query}')
+            request.LANGUAGE_CODE = 'en'
+            return pagecache._page_key(request, ('make', 'page'))
+        self.assertEqual(key('page=2&make=1&utm_medium=x'), key('make=1&page=2'))
+        self.assertNotEqual(key('make=1&page=2'), key('make=1&page=3'))
+
+    def test_purge_after_tag_key_eviction_still_retires_pages(self):
+        from django.core.cache import cache
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'miss')
+        cache.delete(pagecache._tag_key(f'listing:{self.listing.pk}'))
+        pagecache.purge_tags(f'listing:{self.listing.pk}')
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'miss')
+
+    def test_logged_in_users_bypass_the_cache(self):
+        self.client.get(self.url)
+        self.client.force_login(self.buyer)
+        self.assertNotIn('X-Page-Cache', self.client.get(self.url))
+
+
+class BufferedCounterTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        self.add_listings(self.SMALL)
+        self.ids = list(Listing.objects.filter(status='ACTIVE').order_by('pk').values_list('pk', flat=True)[:3])
+        self.counter = counters.BufferedCounter('core.Listing', 'views')
+
+    def tearDown(self):
+        if self.counter.timer is not None:
+            self.counter.timer.cancel()
+
+    def test_increments_are_written_by_a_timer_not_the_request(self):
+        with self.assertNumQueries(0):
+            self.counter.incr(self.ids[0])
+        self.assertGreater(self.counter.timer_due, time.monotonic() + 3000)
+
+    def test_flush_writes_one_update_per_batch(self):
+        for count, pk in enumerate(self.ids, start=1):
+            self.counter.incr(pk, count)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.counter.flush(), 3)
+        self.assertEqual(sum(q['sql'].startswith('UPDATE') for q in ctx.captured_queries), 1)
+        views = dict(Listing.objects.filter(pk__in=self.ids).values_list('pk', 'views'))
+        self.assertEqual([views[pk] for pk in self.ids], [1, 2, 3])
+
+    def test_failed_flush_keeps_the_counts(self):
+        broken = counters.BufferedCounter('core.Listing', 'no_such_column')
+        broken.incr(self.ids[0], 2)
+        broken.timer.cancel()
+        with self.assertRaises(Exception):
+            broken.flush()
+        self.assertEqual(broken.pending_for(self.ids[0]), 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CacheFillTests(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        metrics.reset()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def fill(self, **kwargs):
+        return cachefill.get_or_fill('test:key', self.compute, 60, name='test', beta=0, **kwargs)
+
+    def events(self):
+        return {row['name']: row for row in metrics.get_cache_report()}['test']
+
+    def test_fills_once(self):
+        self.assertEqual(self.fill(), 1)
+        self.assertEqual(self.fill(), 1)
+        self.assertEqual(self.events()['fill'], 1)
+
+    def test_stale_entry_is_served_while_another_worker_refreshes(self):
+        from django.core.cache import cache
+        self.fill()
+        cache.add('test:key:lock', 'other-worker')
+        self.assertEqual(self.fill(is_stale=lambda value: True), 1)
+        self.assertEqual(self.events()['stale'], 1)
+        cache.delete('test:key:lock')
+        self.assertEqual(self.fill(is_stale=lambda value: value == 1), 2)
+        self.assertEqual(self.events()['refresh'], 1)
+
+    def test_skip_cache_is_not_stored(self):
+        def compute():
+            raise cachefill.SkipCache('private')
+        self.assertEqual(cachefill.get_or_fill('test:key', compute, 60, name='test'), 'private')
+        self.assertEqual(self.fill(), 1)
+
+
+class AsyncAjaxViewTests(QueryBudgetTestCase):
+    """The async endpoints must answer exactly like their sync counterparts"""
+
+    def sync_request(self, path, data=None):
+        request = RequestFactory().get(path, data)
+        request.LANGUAGE_CODE = 'en'
+        return request
+
+    def async_request(self, path, data=None, method='get', user=None):
+        request = getattr(AsyncRequestFactory(), method)(path, data)
+        request.LANGUAGE_CODE = 'en'
+        request.user = user
+
+        async def auser():
+            return user
+        request.auser = auser
+        return request
+
+    async def test_load_models_and_trims_match_sync_views(self):
+        model_id = self.trim.model_id
+        make_id = (await Model.objects.aget(pk=model_id)).make_id
+        for name, params in (('load_models', {'make_id': make_id}), ('load_trims', {'model_id': model_id})):
+            expected = await sync_to_async(getattr(views, name))(self.sync_request('/', params))
+            actual = await getattr(async_views, name)(self.async_request('/', params))
+            self.assertEqual(actual.content, expected.content, name)
+
+    async def test_reveal_phone_counts_click(self):
+        await sync_to_async(self.add_listings)(self.SMALL)
+        listing = await Listing.objects.filter(status='ACTIVE').afirst()
+        response = await async_views.reveal_phone(self.async_request('/'), listing.pk)
+        self.assertIn('phone_number', json.loads(response.content))
+        await sync_to_async(counters.flush_all)()
+        await listing.arefresh_from_db()
+        self.assertEqual(listing.phone_clicks, 1)
+
+    async def test_toggle_favorite(self):
+        await sync_to_async(self.add_listings)(self.SMALL)
+        listing = await Listing.objects.filter(status='ACTIVE').exclude(favorited_by__user=self.seller).afirst()
+        request = self.async_request('/', method='post', user=self.seller)
+        data = json.loads((await async_views.toggle_favorite(request, listing.pk)).content)
+        self.assertTrue(data['is_favorited'])
+        self.assertEqual(data['favorites_count'], listing.favorites_count + 1)
+
+
+@override_settings(READ_REPLICAS=['replica_1'])
+class ReplicaRoutingTests(TestCase):
+
+    @staticmethod
+    @replicas.replica_reads
+    def routed_view(request):
+        from django.contrib.sessions.models import Session
+        from django.db import router
+        return router.db_for_read(Listing), router.db_for_read(Session), router.db_for_write(Listing)
+
+    def request(self, **cookies):
+        from django.contrib.auth.models import AnonymousUser
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies)
+        request.user = AnonymousUser()
+        return request
+
+    def test_public_reads_use_a_replica_unless_pinned(self):
+        self.assertEqual(self.routed_view(self.request()), ('replica_1', 'default', 'default'))
+        pinned = self.request(**{replicas.PIN_COOKIE: '1'})
+        self.assertEqual(self.routed_view(pinned), ('default', 'default', 'default'))
+
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_page_cache_fills_are_not_rendered_from_a_replica(self):
+        from django.core.cache import cache
+        from django.db import router
+        from django.http import HttpResponse
+        cache.clear()
+        aliases = []
+
+        @pagecache.anonymous_page_cache()
+        @replicas.replica_reads
+        def page(request):
+            pagecache.tag_page(request, 'active:all')
+            aliases.append(router.db_for_read(Listing))
+            return HttpResponse(aliases[-1])
+
+        def get():
+            request = self.request()
+            request.LANGUAGE_CODE = 'en'
+            return page(request)
+
+        pagecache.purge_tags('active:all')
+        self.assertEqual(get()['X-Page-Cache'], 'miss')
+        response = get()
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        # The stored entry came from the primary, not the replica the view would otherwise read
+        self.assertEqual((aliases, response.content), (['default'], b'default'))
+        self.assertEqual(self.routed_view(self.request())[0], 'replica_1')
+
+    def test_write_views_pin_to_primary(self):
+        seller = User.objects.create_user(username='writer', password='pass12345')
+        self.client.force_login(seller)
+        response = self.client.get(reverse('core:create_listing'))
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, PAGE_CACHE_ENABLED=False)
+class SessionTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.add_listings(self.SMALL)
+
+    def auth_queries(self, path):
+        self.client.get(path)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        return response, [q['sql'] for q in queries.captured_queries
+                          if 'django_session' in q['sql'] or 'FROM "core_user" WHERE' in q['sql']]
+
+    def test_anonymous_pages_get_no_session(self):
+        response, queries = self.auth_queries(reverse('core:search'))
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertEqual(queries, [])
+
+    def test_logged_in_pages_load_session_and_user_from_cache(self):
+        self.client.force_login(self.seller)
+        response, queries = self.auth_queries(reverse('core:search'))
+        self.assertEqual(response.context['user'], self.seller)
+        self.assertEqual(queries, [])
+
+    def test_password_change_still_ends_other_sessions(self):
+        self.client.force_login(self.seller)
+        self.client.get(reverse('core:search'))
+        self.seller.set_password('changed-elsewhere')
+        self.seller.save()
+        response = self.client.get(reverse('core:search'))
+        self.assertFalse(response.context['user'].is_authenticated)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, AUTOCOMPLETE_CHECK_INTERVAL=0)
+class AutocompleteTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        autocomplete.clear()
+        self.add_listings(self.SMALL)
+
+    def test_normalize_folds_arabic_variants(self):
+        self.assertEqual(normalize('إسـكـودا'), normalize('اسكودا'))
+        self.assertEqual(normalize('سيارة هيونداي'), 'سياره هيونداي')
+        self.assertEqual(normalize('Mercedes-Benz'), 'mercedes benz')
+
+    def test_bilingual_prefixes_with_active_counts(self):
+        corolla = {'type': 'model', 'id': self.trim.model_id, 'make_id': self.trim.model.make_id,
+                   'label': 'Toyota Corolla', 'count': 6}
+        self.assertEqual(autocomplete.suggest('coro', 'en'), [corolla])
+        self.assertEqual(autocomplete.suggest('toyota c', 'en'), [corolla])
+        self.assertEqual(autocomplete.suggest('كورو', 'ar')[0]['label'], 'تويوتا كورولا')
+        self.assertEqual(autocomplete.suggest('toy', 'en')[0]['type'], 'make')
+
+    def test_endpoint_runs_no_queries_and_follows_active_set(self):
+        url = reverse('core:autocomplete')
+        self.client.get(url, {'q': 'coro'})
+        with self.assertNumQueries(0):  # versions unchanged, so nothing is reloaded
+            response = self.client.get(url, {'q': 'coro'})
+        self.assertIn('max-age', response['Cache-Control'])
+        listing = Listing.objects.filter(status='PENDING', trim=self.trim).first()
+        listing.status = 'ACTIVE'
+        listing.save()
+        data = json.loads(self.client.get(url, {'q': 'coro'}).content)
+        self.assertEqual(data['suggestions'][0]['count'], 7)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, AUTOCOMPLETE_CHECK_INTERVAL=0)
+class FuzzySearchTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        matcher.version = None
+        self.add_listings(self.SMALL)
+
+    def search_total(self, query):
+        return self.client.get(reverse('core:search'), {'q': query}).context['total_count']
+
+    def test_phonetic_key_matches_across_scripts(self):
+        self.assertEqual(phonetic_key('mersedes'), phonetic_key('mercedes'))
+        self.assertEqual(skeleton(phonetic_key(normalize('مرسيدس'))), skeleton(phonetic_key('mercedes')))
+        self.assertEqual(skeleton(phonetic_key(normalize('كورولا'))), skeleton(phonetic_key('corolla')))
+
+    def test_misspelled_and_arabic_queries_find_the_model(self):
+        for query in ('corolla', 'corola', 'كورولا', 'كرولا', 'tyota corola', 'corola 2022'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search_total(query), 6)
+        self.assertEqual(self.search_total('corola 2015'), 0)
+
+    def test_common_words_are_not_taken_for_models(self):
+        listing = Listing.objects.filter(status='ACTIVE').exclude(trim=self.trim).first()
+        Listing.objects.filter(pk=listing.pk).update(description='Clean car, sport mode, no accident')
+        for word in ('car', 'sport', 'accident', 'clean'):
+            with self.subTest(word=word):
+                self.assertEqual(matcher.rewrite(word)['text'], [word])
+                expected = Listing.objects.filter(status='ACTIVE', description__icontains=word).count()
+                self.assertEqual(self.search_total(word), expected)
+
+    def test_typo_matches_keep_description_hits(self):
+        listing = Listing.objects.filter(status='ACTIVE').exclude(trim=self.trim).first()
+        Listing.objects.filter(pk=listing.pk).update(description='بديل كرولا')
+        # A typo match is a guess: the word still finds descriptions containing it
+        self.assertEqual(self.search_total('كرولا'), 7)
+
+    def test_unmatched_words_fall_back_to_text_search(self):
+        self.assertIsNone(keyword_filter('zzqx'))
+        self.assertEqual(self.search_total('zzqx'), 0)
+        self.assertEqual(matcher.rewrite('toyota red')['text'], ['red'])
+
+    def test_leftover_arabic_words_match_descriptions_as_typed(self):
+        from .fuzzy import keyword_matches
+        listing = Listing.objects.filter(status='ACTIVE', trim=self.trim).select_related('trim__model__make').first()
+        listing.description = 'سيارة ممتازة'
+        Listing.objects.filter(pk=listing.pk).update(description=listing.description)
+        # Teh marbuta is folded to heh for catalog matching, but descriptions are stored as typed
+        self.assertEqual(matcher.rewrite('كورولا ممتازة!')['text'], ['ممتازة'])
+        self.assertEqual(self.search_total('كورولا ممتازة'), 1)
+        self.assertTrue(keyword_matches('كورولا ممتازة', listing))
+
+
+class SavedSearchAlertTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        self.add_listings(self.SMALL)
+        self.pending = list(Listing.objects.filter(status='PENDING', trim=self.trim, seller=self.seller)[:2])
+        self.model = self.trim.model
+
+    def save(self, user, **filters):
+        return SavedSearch.objects.create(user=user, **filters)
+
+    def test_index_applies_equality_range_and_keyword_checks(self):
+        other = User.objects.create_user('other', 'other@example.com', 'pass')
+        matching = [
+            self.save(self.buyer, make=self.model.make, max_price=200000),
+            self.save(self.buyer, query='كرولا', governorate='CAIRO'),
+            self.save(other, model=self.model, transmission='AUTO', min_year=2020),
+        ]
+        self.save(self.buyer, governorate='GIZA')
+        self.save(other, model=self.model, min_year=2023)
+        self.save(other, make=self.model.make, fuel_type='DIESEL')
+        self.save(self.seller, make=self.model.make)  # never alerted about their own listing
+        listing = Listing.objects.select_related('trim__model__make', 'seller').get(pk=self.pending[0].pk)
+
+        index = alerts.SearchIndex(SavedSearch.objects.all())
+        accepted = {search.pk for search in index.candidates(listing) if alerts._accepts(search, listing)}
+        self.assertEqual(accepted, {search.pk for search in matching})
+
+    def test_batch_approval_sends_one_digest_per_user(self):
+        self.save(self.buyer, make=self.model.make)
+        self.save(self.buyer, model=self.model, max_mileage=100000)
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('core:approve_listings'), {'listing_ids': [l.pk for l in self.pending]})
+        self.assertEqual(Listing.objects.filter(pk__in=[l.pk for l in self.pending], status='ACTIVE').count(), 2)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.buyer.email])
+        for listing in self.pending:
+            self.assertIn(f'/listing/{listing.pk}/', mail.outbox[0].body)
+
+    def test_save_search_from_query_string(self):
+        self.client.force_login(self.buyer)
+        url = reverse('core:save_search') + f'?q=corola&make={self.model.make_id}&max_price=300000'
+        self.client.post(url)
+        self.client.post(url)
+        search = SavedSearch.objects.get(user=self.buyer)
+        self.assertEqual(search.search_params(), {'q': 'corola', 'make': self.model.make_id, 'max_price': 300000})
+        self.client.post(reverse('core:save_search'))  # nothing to save
+        self.assertEqual(SavedSearch.objects.count(), 1)
+
+
+class SimilarListingTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        self.add_listings(self.SMALL)
+        self.old_trim = CarTrim.objects.create(
+            model=self.trim.model, name='1.3L', year=2008, engine_cc=1300, horsepower=90,
+            fuel_consumption=7.5, transmission='MANUAL', fuel_type='PETROL',
+        )
+
+    def listing(self, trim, price, odometer):
+        return Listing.objects.create(
+            seller=self.seller, trim=trim, price=price, odometer=odometer, color='Red',
+            description='Test car', location='GIZA', status='ACTIVE',
+        )
+
+    def neighbors(self, listing):
+        return list(SimilarListing.objects.filter(listing=listing).values_list('similar_id', flat=True))
+
+    def test_neighbours_prefer_close_features(self):
+        new = self.listing(self.trim, 400000, 20000)
+        newer = self.listing(self.trim, 410000, 25000)
+        old = self.listing(self.old_trim, 90000, 250000)
+        older = self.listing(self.old_trim, 85000, 260000)
+        result = similar.refresh_similar_listings(force=True)
+        self.assertEqual(result['total'], Listing.objects.filter(status='ACTIVE').count())
+        self.assertEqual(self.neighbors(new)[0], newer.pk)
+        self.assertEqual(self.neighbors(old)[0], older.pk)
+        self.assertNotIn(old.pk, self.neighbors(new)[:views.RELATED_LISTINGS])
+
+        response = self.client.get(reverse('core:listing_detail', args=[new.pk]))
+        self.assertEqual(response.context['related_listings'][0], newer)
+        self.assertEqual(len(response.context['related_listings']), views.RELATED_LISTINGS)
+
+    def test_listing_without_neighbours_shows_the_same_make(self):
+        new = self.listing(self.trim, 400000, 20000)
+        self.assertEqual(self.neighbors(new), [])
+        response = self.client.get(reverse('core:listing_detail', args=[new.pk]))
+        related = response.context['related_listings']
+        self.assertEqual(len(related), views.RELATED_LISTINGS)
+        self.assertNotIn(new, related)
+        self.assertEqual({listing.trim.model.make_id for listing in related}, {self.trim.model.make_id})
+
+    def test_incremental_refresh_only_recomputes_affected_listings(self):
+        similar.refresh_similar_listings(force=True)
+        self.assertEqual(similar.refresh_similar_listings()['recomputed'], 0)
+        moved = self.listing(self.old_trim, 90000, 250000)
+        gone = Listing.objects.filter(status='ACTIVE').exclude(pk=moved.pk).first()
+        gone.status = 'SOLD'
+        gone.save()
+        result = similar.refresh_similar_listings()
+        self.assertIn(moved.pk, dict(SimilarListing.objects.values_list('listing_id', 'rank')))
+        self.assertLess(result['recomputed'], result['total'])
+        self.assertFalse(SimilarListing.objects.filter(Q(listing=gone) | Q(similar=gone)).exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHE, PRICE_STATS_CHECK_INTERVAL=0)
+class PriceStatsTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        pricing.price_index.clear()
+        self.add_listings(self.SMALL)
+
+    def test_group_percentiles_match_numpy(self):
+        import numpy as np
+        rng = np.random.default_rng(0)
+        groups = rng.integers(0, 5, 200)
+        values = rng.normal(100, 20, 200)
+        ids, counts, results = pricing.group_percentiles(groups, values, {'p25': 25, 'median': 50})
+        for i, group in enumerate(ids):
+            expected = np.percentile(values[groups == group], [25, 50])
+            self.assertAlmostEqual(results['p25'][i], expected[0])
+            self.assertAlmostEqual(results['median'][i], expected[1])
+            self.assertEqual(counts[i], (groups == group).sum())
+
+    def test_rollup_feeds_estimates_without_queries(self):
+        result = pricing.rollup_price_stats()
+        self.assertEqual(result['listings'], self.SMALL)
+        prices = Listing.objects.filter(status='ACTIVE', trim=self.trim).values_list('price', flat=True)
+        url = reverse('core:price_estimate')
+        self.client.get(url, {'trim_id': self.trim.pk})
+        with self.assertNumQueries(0):
+            estimate = self.client.get(url, {'trim_id': self.trim.pk}).json()['estimate']
+        self.assertEqual(estimate['count'], len(prices))
+        self.assertEqual(estimate['basis'], 'trim')
+        self.assertEqual(estimate['median'], round(float(sorted(prices)[2] + sorted(prices)[3]) / 2))
+
+        # Too few listings for the trim: fall back to its model and year
+        sibling = CarTrim.objects.create(
+            model=self.trim.model, name='1.8L', year=2022, engine_cc=1800, horsepower=140,
+            fuel_consumption=7.0, transmission='AUTO', fuel_type='PETROL',
+        )
+        self.assertEqual(self.client.get(url, {'trim_id': sibling.pk}).json()['estimate']['basis'], 'model_year')
+        self.assertIsNone(self.client.get(url, {'trim_id': 'x'}).json()['estimate'])
+
+    def test_cheapest_quarter_gets_the_badge(self):
+        pricing.rollup_price_stats()
+        cheapest = Listing.objects.filter(status='ACTIVE', trim=self.trim).order_by('price').first()
+        priciest = Listing.objects.filter(status='ACTIVE', trim=self.trim).order_by('price').last()
+        self.assertTrue(pricing.price_index.is_good_deal(cheapest))
+        self.assertFalse(pricing.price_index.is_good_deal(priciest))
+        response = self.client.get(reverse('core:listing_detail', args=[cheapest.pk]))
+        self.assertContains(response, 'badge-good-deal"')
+
+
+class ScreeningTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        self.add_listings(self.SMALL)
+
+    def pending(self, **fields):
+        return Listing.objects.create(**{
+            'seller': self.seller, 'trim': self.trim, 'price': 100003, 'odometer': 8000, 'color': 'White',
+            'description': 'Test car', 'location': 'CAIRO', 'status': 'PENDING', **fields,
+        })
+
+    def test_outliers_score_high_and_lead_the_queue(self):
+        normal = self.pending()
+        cheap = self.pending(price=30000)
+        worn = self.pending(odometer=900000)
+        self.assertEqual(screening.screen_pending(), Listing.objects.filter(status='PENDING').count())
+        for listing in (normal, cheap, worn):
+            listing.refresh_from_db()
+        self.assertEqual((normal.risk_score, normal.risk_reasons), (0, []))
+        self.assertGreaterEqual(cheap.risk_score, 50)
+        self.assertEqual([reason['code'] for reason in cheap.risk_reasons], ['price_below_market'])
+        self.assertIn('implausible_mileage', [reason['code'] for reason in worn.risk_reasons])
+        # Already scored listings are skipped until edited
+        self.assertEqual(screening.screen_pending(), 0)
+
+        self.client.force_login(self.admin)
+        queue = list(self.client.get(reverse('core:admin_dashboard')).context['pending_listings'])
+        self.assertEqual(queue[0], cheap)
+        self.assertEqual(queue[0].risk_labels, [str(screening.REASONS['price_below_market'])])
+
+
+class PhotoHashTests(QueryBudgetTestCase):
+
+    def photo(self, seed):
+        from PIL import Image
+        import numpy as np
+        pixels = np.random.default_rng(seed).integers(0, 256, (12, 16, 3), dtype=np.uint8)
+        return Image.fromarray(pixels).resize((640, 480))
+
+    def test_dhash_survives_resizing_but_not_other_photos(self):
+        original = photohash.dhash(self.photo(1))
+        resized = photohash.dhash(self.photo(1).resize((300, 225)))
+        self.assertLessEqual(photohash.hamming(original, resized), photohash.MAX_DISTANCE)
+        self.assertGreater(photohash.hamming(original, photohash.dhash(self.photo(2))), photohash.MAX_DISTANCE)
+
+    def test_hash_index_matches_brute_force(self):
+        import random
+        rng = random.Random(0)
+        values = [rng.getrandbits(64) - (1 << 63) for _i in range(500)]
+        values += [value ^ (1 << rng.randrange(64)) for value in values[:50]]
+        index = photohash.HashIndex((value, i) for i, value in enumerate(values))
+        for probe in values[:20] + [rng.getrandbits(64) - (1 << 63)]:
+            expected = sorted((photohash.hamming(probe, value), i) for i, value in enumerate(values)
+                              if photohash.hamming(probe, value) <= 10)
+            self.assertEqual(sorted(index.search(probe, 10)), expected)
+
+    def test_screening_flags_reused_photo(self):
+        self.add_listings(self.SMALL)
+        active = Listing.objects.filter(status='ACTIVE').first()
+        repost = Listing.objects.filter(status='PENDING').first()
+        value = photohash.dhash(self.photo(3))
+        ListingImageHash.objects.create(listing=active, field='image_main', hash=value)
+        ListingImageHash.objects.create(listing=repost, field='image_2', hash=value ^ 0b101)
+        screening.screen_pending()
+        repost.refresh_from_db()
+        self.assertIn({'code': 'duplicate_photo', 'listing': active.pk, 'value': 2}, repost.risk_reasons)
+        self.assertGreaterEqual(repost.risk_score, screening.DUPLICATE_PHOTO_SCORE)
+        self.assertIn(f'#{active.pk}', screening.describe(repost.risk_reasons)[-1])
+
+    def test_only_live_listings_are_indexed(self):
+        self.add_listings(self.SMALL)
+        sold = Listing.objects.filter(status='ACTIVE').first()
+        Listing.objects.filter(pk=sold.pk).update(status='SOLD')
+        repost = Listing.objects.filter(status='PENDING').first()
+        value = photohash.dhash(self.photo(3))
+        ListingImageHash.objects.create(listing=sold, field='image_main', hash=value)
+        ListingImageHash.objects.create(listing=repost, field='image_main', hash=value)
+        self.assertEqual(photohash.find_duplicates([repost.pk]), {})
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class PhoneRevealTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.add_listings(self.SMALL)
+
+    def tearDown(self):
+        counters.flush_all()
+
+    def test_cached_from_approval_until_phone_or_status_changes(self):
+        self.seller.phone_number = '01000000001'
+        self.seller.save()
+        listing = Listing.objects.filter(status='PENDING', seller=self.seller).first()
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('core:approve_listing', args=[listing.pk]))
+        url = reverse('core:reveal_phone', args=[listing.pk])
+        with self.assertNumQueries(0):
+            self.assertEqual(views.reveal_phone(RequestFactory().get(url), listing.pk).content,
+                             b'{"phone_number": "01000000001"}')
+        counters.flush_all()
+        listing.refresh_from_db()
+        self.assertEqual(listing.phone_clicks, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.seller.phone_number = '01000000002'
+            self.seller.save()
+            # Dropped only on commit, so a concurrent miss cannot re-cache the old number
+            self.assertEqual(phones.get_phone(listing.pk), (True, '01000000001'))
+        self.assertEqual(self.client.get(url).json()['phone_number'], '01000000002')
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.status = 'SOLD'
+            listing.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class EmailLoginTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('driver', 'Driver@Example.com', 'pass')
+
+    def test_one_query_per_attempt_for_known_addresses(self):
+        from django.contrib.auth import authenticate
+        for email, password, expected in (('driver@example.COM ', 'pass', self.user),
+                                          ('driver@example.com', 'wrong', None)):
+            with self.assertNumQueries(1):
+                self.assertEqual(authenticate(None, email=email, password=password), expected)
+        self.assertIsNone(authenticate(None, email='nobody@example.com', password='pass'))
+
+    def test_allauth_login_with_a_secondary_address(self):
+        from allauth.account.models import EmailAddress
+        EmailAddress.objects.create(user=self.user, email='second@example.com', verified=True, primary=False)
+        response = self.client.post('/accounts/login/', {'login': 'second@example.com', 'password': 'pass'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(int(self.client.session['_auth_user_id']), self.user.pk)
+
+    def test_login_view_does_not_reveal_unknown_emails(self):
+        url = reverse('core:login')
+        wrong = self.client.post(url, {'email': 'driver@example.com', 'password': 'wrong'})
+        unknown = self.client.post(url, {'email': 'nobody@example.com', 'password': 'pass'})
+        self.assertEqual(wrong.context['error'], unknown.context['error'])
+        response = self.client.post(url, {'email': 'DRIVER@example.com', 'password': 'pass'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.session['_auth_user_backend'], 'core.backends.EmailBackend')
+
+
+@override_settings(CACHES=LOCMEM_CACHE, THROTTLE_RULES={'core:reveal_phone': {'rate': '2/m', 'key': 'ip'}})
+class ThrottleTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        metrics.reset()
+        self.add_listings(self.SMALL)
+        self.url = reverse('core:reveal_phone', args=[self.first_active().pk])
+
+    def tearDown(self):
+        counters.flush_all()
+
+    def test_token_bucket_per_client(self):
+        self.assertEqual([self.client.get(self.url).status_code for _i in range(3)], [200, 200, 429])
+        refused = self.client.get(self.url)
+        self.assertEqual(int(refused['Retry-After']), 30)
+        self.assertEqual(self.client.get(self.url, REMOTE_ADDR='10.0.0.2').status_code, 200)
+        # Unthrottled views are untouched
+        self.assertEqual(self.client.get(reverse('core:ajax_load_models')).status_code, 200)
+        self.assertEqual(metrics.get_throttle_report(), [{'view_name': 'core:reveal_phone', 'throttled': 2, 'shed': 0}])
+
+    @override_settings(THROTTLE_RULES={'core:reveal_phone': {'rate': '2/m', 'key': 'user'}})
+    async def test_async_check_loads_the_user_on_the_requests_connection(self):
+        await self.async_client.aforce_login(self.buyer)
+        statuses = [(await self.async_client.get(self.url)).status_code for _i in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        # Keyed by the logged-in user, whose session and row only this test's connection can see
+        report = await sync_to_async(metrics.get_throttle_report)()
+        self.assertEqual(report[0]['throttled'], 1)
+        key = f'{throttle.KEY_PREFIX}:core:reveal_phone:user:{self.buyer.pk}'
+        self.assertIsNotNone(await sync_to_async(caches['default'].get)(key))
+
+    @override_settings(THROTTLE_MAX_IN_FLIGHT=1)
+    def test_sheds_over_the_concurrency_limit_except_staff(self):
+        from django.contrib.auth.models import AnonymousUser
+        from django.urls import resolve
+        from .middleware import ThrottleMiddleware
+        middleware = ThrottleMiddleware(lambda request: None)
+        request = RequestFactory().get(reverse('core:home'))
+        request.resolver_match, request.user, request.in_flight = resolve(request.path), AnonymousUser(), 2
+        response = middleware.process_view(request, None, (), {})
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '1'))
+        request.user = self.admin
+        self.assertIsNone(middleware.process_view(request, None, (), {}))
+        request.in_flight = 1
+        request.user = AnonymousUser()
+        self.assertIsNone(middleware.process_view(request, None, (), {}))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class RequestMetricsTests(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def record(self):
+        metrics.record_request('core:home', 12.0, 2, 1.0, 3.0, [])
+        metrics.record_cache_event('page:home', 'fill')
+        metrics.record_throttle_event('core:search', 'throttled')
+
+    def reported(self):
+        return (
+            [row['view_name'] for row in metrics.get_report()],
+            [row['name'] for row in metrics.get_cache_report()],
+            [row['view_name'] for row in metrics.get_throttle_report()],
+        )
+
+    def test_names_are_listed_again_after_a_reset_elsewhere(self):
+        self.record()
+        # Another worker resets; this one has already recorded these names
+        metrics.reset()
+        self.record()
+        self.assertEqual(self.reported(), (['core:home'], ['page:home'], ['core:search']))
+
+    def test_names_are_listed_again_after_their_keys_expire(self):
+        from django.core.cache import cache
+        self.record()
+        cache.clear()
+        self.record()
+        self.assertEqual(self.reported(), (['core:home'], ['page:home'], ['core:search']))
+        self.assertEqual(metrics.get_report()[0]['count'], 1)
+
+
+class SitemapTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        self.add_listings(self.SMALL)
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        # Small shards, so the ten listings span several files
+        patcher = mock.patch.object(sitemaps, 'LISTINGS_PER_SHARD', 4)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def generate(self):
+        return sitemaps.generate_sitemaps(root=self.root, base_url='https://example.com')
+
+    def files(self):
+        """{relative path: (modification time, content)} of the index and shard files"""
+        found = {}
+        for path in [sitemaps.INDEX_FILENAME] + sorted(os.listdir(os.path.join(self.root, sitemaps.SHARD_DIR))):
+            if path == sitemaps.MANIFEST_FILENAME:
+                continue
+            if path != sitemaps.INDEX_FILENAME:
+                path = f'{sitemaps.SHARD_DIR}/{path}'
+            full_path = os.path.join(self.root, path)
+            with open(full_path, encoding='utf-8') as fh:
+                found[path] = (os.stat(full_path).st_mtime_ns, fh.read())
+        return found
+
+    def test_only_the_changed_shard_and_the_index_are_rewritten(self):
+        first = self.generate()
+        shards = sorted({pk // 4 for pk in Listing.objects.filter(status='ACTIVE').values_list('pk', flat=True)})
+        self.assertEqual(sorted(first['written']), shards)
+        before = self.files()
+        self.assertEqual(self.generate()['written'], [])
+
+        listing = self.first_active()
+        listing.price += 1
+        listing.save()
+        result = self.generate()
+        after = self.files()
+        self.assertEqual((result['written'], result['removed']), ([listing.pk // 4], []))
+        changed = sorted(path for path in before if before[path] != after[path])
+        self.assertEqual(changed, sorted([sitemaps.INDEX_FILENAME, sitemaps.shard_filename(listing.pk // 4)]))
+
+    def test_shards_without_active_listings_are_removed(self):
+        self.generate()
+        shard = max(pk // 4 for pk in Listing.objects.filter(status='ACTIVE').values_list('pk', flat=True))
+        Listing.objects.filter(pk__gte=shard * 4, pk__lt=shard * 4 + 4).update(status='SOLD')
+        result = self.generate()
+        self.assertEqual((result['written'], result['removed']), ([], [shard]))
+        self.assertNotIn(sitemaps.shard_filename(shard), self.files())
+        with open(os.path.join(self.root, sitemaps.INDEX_FILENAME), encoding='utf-8') as fh:
+            self.assertNotIn(sitemaps.shard_filename(shard), fh.read())
+
+    def test_regenerated_and_new_shards_are_served_without_a_reload(self):
+        self.generate()
+        with override_settings(SITEMAP_ROOT=self.root):
+            # The test client keeps its middleware chain (with StaticFilesMiddleware) across requests
+            self.assertEqual(self.client.get('/sitemap.xml').status_code, 200)
+            new_pk = Listing.objects.order_by('-pk').first().pk + 8
+            Listing.objects.create(
+                pk=new_pk, seller=self.seller, trim=self.trim, price=90000, odometer=0,
+                color='Black', description='New', location='CAIRO', status='ACTIVE',
+            )
+            self.generate()
+            for path in (sitemaps.INDEX_FILENAME, sitemaps.shard_filename(new_pk // 4)):
+                with self.subTest(path=path):
+                    response = self.client.get(f'/{path}')
+                    self.assertEqual(response.status_code, 200)
+                    with open(os.path.join(self.root, path), 'rb') as fh:
+                        expected = fh.read()
+                    self.assertEqual(b''.join(response.streaming_content), expected)
+                    self.assertEqual(int(response['Content-Length']), len(expected))
+            self.assertIn(f'/listing/{new_pk}/'.encode(), expected)
+            self.assertEqual(self.client.get(f'/{sitemaps.SHARD_DIR}/{sitemaps.MANIFEST_FILENAME}').status_code, 404)
+
+
+class ProfilerTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        patcher = override_settings(PROFILER_DIR=self.root, PROFILER_SAMPLE_RATE=0, PROFILER_SLOW_MS=0)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+    def profile_file(self, response):
+        return response.get('X-Profile-File')
+
+    def test_staff_can_request_a_profile(self):
+        self.client.force_login(self.admin)
+        for kwargs in ({'data': {'_profile': '1'}}, {'headers': {'X-Profile': '1'}}):
+            with self.subTest(**kwargs):
+                filename = self.profile_file(self.client.get(reverse('core:home'), **kwargs))
+                self.assertIsNotNone(profiling.profile_path(filename))
+        self.assertEqual({profile['url_name'] for profile in profiling.list_profiles()}, {'core.home'})
+
+    def test_other_users_cannot_request_a_profile(self):
+        self.client.get(reverse('core:home'), {'_profile': '1'})
+        self.client.force_login(self.buyer)
+        self.client.get(reverse('core:home'), {'_profile': '1'}, headers={'X-Profile': '1'})
+        self.assertEqual(profiling.list_profiles(), [])
+
+    def test_sampled_requests_are_profiled_without_the_header(self):
+        with override_settings(PROFILER_SAMPLE_RATE=1):
+            response = self.client.get(reverse('core:home'))
+        # Only staff who asked for the profile are told its name
+        self.assertIsNone(self.profile_file(response))
+        self.assertEqual(len(profiling.list_profiles()), 1)
+
+    def test_profile_names_cannot_leave_the_directory(self):
+        stored_name = f'20260101T000000_core.home_5ms_abcdef12{profiling.FILE_SUFFIX}'
+        for name in ('../settings.py', f'../{stored_name}', f'..%2F{stored_name}', '..', ''):
+            self.assertIsNone(profiling.profile_path(name))
+        request = RequestFactory().get('/')
+        request.user = self.admin
+        with self.assertRaises(Http404):
+            admin_views.download_profile(request, '../../aboraaya_project/settings.py')
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(reverse('core:download_profile', args=['..'])).status_code, 404)
+
+    def test_old_and_excess_profiles_are_pruned(self):
+        collector = profiling.StackCollector()
+        names = [profiling.save_profile(collector, 'core:home', '/', 5) for _i in range(3)]
+        old = os.path.join(self.root, names[0])
+        os.utime(old, (time.time() - 3 * 86400,) * 2)
+        with override_settings(PROFILER_MAX_AGE_DAYS=2):
+            profiling.prune_profiles()
+        self.assertEqual(sorted(p['filename'] for p in profiling.list_profiles()), sorted(names[1:]))
+        with override_settings(PROFILER_MAX_FILES=1):
+            profiling.prune_profiles()
+        self.assertEqual(len(profiling.list_profiles()), 1)
+
+
+class WarmupTests(TestCase):
+
+    def test_warm_up_runs_every_step(self):
+        timings = dict(warmup.warm_up())
+        self.assertEqual(set(timings), {name for name, _step, _needs_db in warmup.STEPS})
+        self.assertEqual(set(dict(warmup.warm_up(database=False))), set(timings) - {'catalog', 'prices'})
+
+    def test_parse_importtime(self):
+        from .management.commands.startup_profile import by_package, parse_importtime
+        imports = parse_importtime([
+            'import time: self [us] | cumulative | imported package',
+            'import time:       120 |        120 |   django.utils',
+            'import time:       300 |        420 | django',
+            'import time:        50 |         50 | core',
+        ])
+        self.assertEqual(imports[0], ('django.utils', 120, 120))
+        self.assertEqual(by_package(imports), [('django', 420), ('core', 50)])
+
+
+class GenerateDatasetTests(TestCase):
+    SMALL = {'users': 3, 'dealers': 1, 'makes': 2, 'models_per_make': 1, 'trims_per_model': 2,
+             'listings': 6, 'favorites': 3, 'batch_size': 4}
+
+    def generate(self, **options):
+        call_command('generate_dataset', stdout=StringIO(), **{**self.SMALL, **options})
+
+    def test_options_are_validated_before_inserting(self):
+        for options, message in (
+            ({'listings': -1}, '--listings cannot be negative'),
+            ({'batch_size': 0}, '--batch-size must be at least 1'),
+            ({'users': 0, 'dealers': 0}, 'Listings need sellers'),
+            ({'trims_per_model': 0}, 'Listings need trims'),
+        ):
+            with self.subTest(options=options), self.assertRaisesMessage(CommandError, message):
+                self.generate(**options)
+        self.assertFalse(User.objects.exists())
+
+    def test_rerun_reuses_the_catalog_and_refuses_a_used_prefix(self):
+        self.generate()
+        trims = set(CarTrim.objects.values_list('pk', flat=True))
+        self.assertEqual(Listing.objects.count(), 6)
+        with self.assertRaisesMessage(CommandError, "Users with prefix 'synth42_' already exist"):
+            self.generate()
+        self.generate(prefix='again_')
+        self.assertEqual(set(CarTrim.objects.values_list('pk', flat=True)), trims)
+        self.assertEqual(set(Listing.objects.values_list('trim_id', flat=True)) - trims, set())
+        self.assertEqual(Listing.objects.count(), 12)
+
+
+class BenchmarkViewsTests(TestCase):
+
+    def setUp(self):
+        from .management.commands import benchmark_views
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.output = os.path.join(self.root, 'results.json')
+        # No per-scale databases or view runs: the command's own checks and reporting are under test
+        for target, replacement in (
+            ('setup_test_environment', mock.DEFAULT), ('teardown_test_environment', mock.DEFAULT),
+            ('run_all', mock.Mock(return_value={'home': {'p50_ms': 10.0, 'queries': 3}})),
+        ):
+            patcher = mock.patch.object(benchmark_views, target, replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(benchmark_views.Command, 'benchmark_database')
+        self.benchmark_database = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(benchmark_views.Command, 'seed')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def benchmark(self, **options):
+        options = {'scales': '100', 'output': self.output, **options}
+        call_command('benchmark_views', stdout=StringIO(), stderr=StringIO(), **options)
+
+    def write_baseline(self, p50_ms, queries):
+        path = os.path.join(self.root, 'baseline.json')
+        with open(path, 'w', encoding='utf-8') as fh:
+            json.dump({'100': {'home': {'p50_ms': p50_ms, 'queries': queries}}}, fh)
+        return path
+
+    def test_options_are_validated_before_seeding(self):
+        for options, message in (
+            ({'scales': '100,lots'}, '--scales must be comma-separated listing counts'),
+            ({'scales': '0'}, '--scales needs at least one listing count above 0'),
+            ({'iterations': 0}, '--iterations must be at least 1'),
+            ({'threshold': -0.1}, '--threshold cannot be negative'),
+            ({'only': 'home,nope'}, '--only matches no scenario: nope'),
+            ({'baseline': os.path.join(self.root, 'missing.json')}, 'Cannot read --baseline'),
+        ):
+            with self.subTest(options=options), self.assertRaisesMessage(CommandError, message):
+                self.benchmark(**options)
+        self.benchmark_database.assert_not_called()
+
+    def test_regressions_fail_the_run(self):
+        self.benchmark(baseline=self.write_baseline(p50_ms=9.5, queries=3))
+        with open(self.output, encoding='utf-8') as fh:
+            self.assertEqual(json.load(fh), {'100': {'home': {'p50_ms': 10.0, 'queries': 3}}})
+        with self.assertRaisesMessage(CommandError, '2 regression(s)'):
+            self.benchmark(baseline=self.write_baseline(p50_ms=5.0, queries=2))
+
+
+class BenchmarkConnectionsTests(TestCase):
+
+    def test_options_are_validated(self):
+        for options, message in (
+            ({'requests': 0}, '--requests must be at least 1'),
+            ({'modes': 'persistent,pooled'}, "--modes takes a comma-separated subset of"),
+            ({'modes': ','}, "--modes takes a comma-separated subset of"),
+        ):
+            with self.subTest(options=options), self.assertRaisesMessage(CommandError, message):
+                call_command('benchmark_connections', stdout=StringIO(), **options)
+
+    @skipUnless(connection.vendor == 'sqlite', 'pool mode runs on PostgreSQL')
+    def test_reports_each_mode_and_restores_the_connection(self):
+        settings_dict = dict(connection.settings_dict)
+        output = os.path.join(tempfile.mkdtemp(), 'connections.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+        stdout = StringIO()
+        # Requests go through LocaleMiddleware, which leaves /en/ active on this thread
+        with translation.override(translation.get_language()):
+            call_command('benchmark_connections', requests=3, output=output, stdout=stdout)
+        self.assertEqual(connection.settings_dict, settings_dict)
+        with open(output, encoding='utf-8') as fh:
+            results = json.load(fh)
+        # SQLite has no connection pool to compare
+        self.assertEqual(set(results), {'per-request', 'persistent'})
+        self.assertEqual(results['persistent']['requests'], 3)
+        self.assertIn('pool         skipped', stdout.getvalue())
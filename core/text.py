@@ -0,0 +1,32 @@
+"""
+Text normalization for matching user input against bilingual names.
+
+``normalize`` folds the spelling variants people type interchangeably so
+they compare equal: case, Latin accents, Arabic diacritics (tashkeel) and
+tatweel, the hamza/madda forms of alef, alef maqsura vs yeh, teh marbuta vs
+heh, Arabic-Indic digits, and punctuation/spacing.
+"""
+import re
+import unicodedata
+
+TATWEEL = 'ـ'
+
+_FOLD = str.maketrans({
+    'ٱ': 'ا',  # alef wasla -> alef (other alef forms decompose under NFKD)
+    'ى': 'ي',  # alef maqsura -> yeh
+    'ة': 'ه',  # teh marbuta -> heh
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},  # Arabic-Indic digits
+    **{chr(0x06F0 + digit): str(digit) for digit in range(10)},  # Extended (Persian) digits
+})
+
+_NON_WORD = re.compile(r'[^\w\s]|_')
+
+
+def normalize(text):
+    """Folded, space-separated form of `text` for matching (not for display)"""
+    # NFKD splits accents and hamza/madda off their base letters, and
+    # presentation forms into plain letters; the combining marks are dropped
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch) and ch != TATWEEL)
+    text = text.translate(_FOLD)
+    return ' '.join(_NON_WORD.sub(' ', text).split())
@@ -0,0 +1,119 @@
+"""
+Per-client token buckets for hot endpoints, kept in the shared cache.
+
+``settings.THROTTLE_RULES`` maps URL names to a rate such as ``'30/m'``: a
+bucket of 30 tokens per client, refilled evenly at 30 a minute, so short
+bursts pass and sustained loops are held to the rate. Each request takes a
+token; with none left it is refused, and the reply says how many seconds
+until the next token.
+
+Clients are identified per rule by ``'user'``, ``'session'`` or ``'ip'``;
+requests without a logged-in user or a stored session count against their
+IP address (anonymous visitors rarely have a session). On Redis a bucket is
+updated by one Lua script, so the read-refill-take step is atomic across
+workers and uses the server's clock; other backends update it under a
+per-process lock, which is exact for the per-process local-memory cache.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.redis import RedisCache
+
+KEY_PREFIX = 'throttle'
+PERIODS = {'s': 1, 'm': 60, 'h': 3600}
+
+# KEYS[1] bucket; ARGV capacity, tokens per second. Returns {allowed, seconds until a token as a string}.
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(state[1]) or capacity
+local at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - at) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(math.max(0, 1 - tokens) / rate)}
+"""
+
+_lock = threading.Lock()
+_script = None
+
+
+def parse_rate(rate):
+    """'30/m' -> (capacity 30, 0.5 tokens per second)"""
+    count, _sep, period = rate.partition('/')
+    count = int(count)
+    return count, count / PERIODS[period[:1].lower()]
+
+
+def client_ip(request):
+    """REMOTE_ADDR, or the address THROTTLE_TRUSTED_PROXIES hops back in X-Forwarded-For"""
+    proxies = settings.THROTTLE_TRUSTED_PROXIES
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR') if proxies else None
+    if forwarded:
+        hops = [hop.strip() for hop in forwarded.split(',')]
+        return hops[max(len(hops) - proxies, 0)]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def client_key(request, by):
+    """Bucket owner for a rule keyed by 'user' or 'session' (else the IP), or 'ip'"""
+    if by == 'user':
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'user:{user.pk}'
+    elif by == 'session':
+        session = getattr(request, 'session', None)
+        if session is not None and session.session_key:
+            # Loading forgets a cookie naming no stored session, so made-up keys get no fresh bucket
+            session.items()
+            if session.session_key:
+                return f'session:{session.session_key}'
+    return f'ip:{client_ip(request)}'
+
+
+def _take_redis(cache, key, capacity, rate):
+    global _script
+    client = cache._cache.get_client(key, write=True)
+    if _script is None:
+        _script = client.register_script(TAKE_SCRIPT)
+    allowed, wait = _script(keys=[cache.make_key(key)], args=[capacity, rate], client=client)
+    return bool(allowed), float(wait)
+
+
+def _take_local(cache, key, capacity, rate):
+    with _lock:
+        now = time.time()
+        tokens, at = cache.get(key) or (capacity, now)
+        tokens = min(capacity, tokens + max(0.0, now - at) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        cache.set(key, (tokens, now), math.ceil(capacity / rate) + 1)
+    return allowed, max(0.0, 1 - tokens) / rate
+
+
+def take(view_name, request):
+    """
+    Take a token for this client from the view's bucket. Returns None when the
+    view has no rule or a token was available, else the seconds to wait.
+    """
+    rule = settings.THROTTLE_RULES.get(view_name)
+    if rule is None:
+        return None
+    capacity, rate = parse_rate(rule['rate'])
+    key = f"{KEY_PREFIX}:{view_name}:{client_key(request, rule.get('key', 'ip'))}"
+    cache = caches[DEFAULT_CACHE_ALIAS]
+    take_token = _take_redis if isinstance(cache, RedisCache) else _take_local
+    allowed, wait = take_token(cache, key, capacity, rate)
+    return None if allowed else wait
@@ -1,6 +1,11 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 from . import admin_views
+from . import async_views
+
+# Native async JSON endpoints when served over ASGI
+ajax_views = async_views if settings.ASYNC_AJAX_VIEWS else views
 
 app_name = 'core'
 
@@ -14,6 +19,8 @@ urlpatterns = [
     path('sell/', views.create_listing, name='create_listing'),
     path('dashboard/', views.seller_dashboard, name='dashboard'),
     path('compare/', views.compare_listings, name='compare'),
+    path('saved-searches/save/', views.save_search, name='save_search'),
+    path('saved-searches/<int:pk>/delete/', views.delete_saved_search, name='delete_saved_search'),
     
     # Authentication
     path('login/', views.login_view, name='login'),
@@ -24,13 +31,20 @@ urlpatterns = [
     # Admin Dashboard (Superuser only)
     path('admin-dashboard/', admin_views.admin_dashboard, name='admin_dashboard'),
     path('admin-dashboard/approve/<int:pk>/', admin_views.approve_listing, name='approve_listing'),
+    path('admin-dashboard/approve-selected/', admin_views.approve_listings, name='approve_listings'),
+    path('admin-dashboard/screen/', admin_views.screen_listings, name='screen_listings'),
     path('admin-dashboard/reject/<int:pk>/', admin_views.reject_listing, name='reject_listing'),
+    path('admin-dashboard/metrics/', admin_views.request_metrics, name='request_metrics'),
+    path('admin-dashboard/profiles/', admin_views.request_profiles, name='request_profiles'),
+    path('admin-dashboard/profiles/<str:filename>', admin_views.download_profile, name='download_profile'),
     
     # AJAX Endpoints for Cascading Dropdowns
-    path('ajax/load-models/', views.load_models, name='ajax_load_models'),
-    path('ajax/load-trims/', views.load_trims, name='ajax_load_trims'),
-    path('ajax/reveal-phone/<int:pk>/', views.reveal_phone, name='reveal_phone'),
-    path('ajax/toggle-favorite/<int:pk>/', views.toggle_favorite, name='toggle_favorite'),
+    path('ajax/load-models/', ajax_views.load_models, name='ajax_load_models'),
+    path('ajax/load-trims/', ajax_views.load_trims, name='ajax_load_trims'),
+    path('ajax/autocomplete/', views.autocomplete, name='autocomplete'),
+    path('ajax/price-estimate/', views.price_estimate, name='price_estimate'),
+    path('ajax/reveal-phone/<int:pk>/', ajax_views.reveal_phone, name='reveal_phone'),
+    path('ajax/toggle-favorite/<int:pk>/', ajax_views.toggle_favorite, name='toggle_favorite'),
     
     # Dashboard Actions
     path('listing/<int:pk>/mark-sold/', views.mark_as_sold, name='mark_as_sold'),
@@ -1,27 +1,59 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import logout as auth_logout, login, authenticate
-from django.http import JsonResponse
-from django.db.models import Q, F
+from django.http import Http404, JsonResponse
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
 from django.utils.translation import gettext as _
 from django.contrib import messages
 from django.views.decorators.http import require_POST
-from .models import Listing, Make, Model, CarTrim, Favorite
-from .forms import ListingForm, UserRegistrationForm, UserUpdateForm
+from django.views.static import serve
+from .models import Listing, Make, Model, CarTrim, Favorite, SavedSearch, SimilarListing
+from .forms import ListingForm, SavedSearchForm, UserRegistrationForm, UserUpdateForm
+from .autocomplete import autocomplete as search_index
+from .cachefill import get_or_fill
+from .catalog import get_makes, get_trim_specs, localize_spec, spec_table
+from .counters import listing_views, phone_clicks
+from . import favorites
+from .favorites import favorite_ids_for
+from .fuzzy import keyword_filter
+from .pagecache import anonymous_page_cache, tag_page, tag_versions
+from .phones import get_phone
+from .pricing import price_index
+from .replicas import pins_primary, replica_reads
+
+SEARCH_COUNT_TIMEOUT = 60
+RELATED_LISTINGS = 4
+# Bounds the per-approval matching work each user can add (core.alerts)
+MAX_SAVED_SEARCHES = 20
 
+
+@anonymous_page_cache()
+@replica_reads
 def home(request):
     """Homepage with featured listings"""
-    featured_listings = Listing.objects.filter(status='ACTIVE').order_by('-created_at')[:8]
-    makes = Make.objects.all()
+    featured_listings = list(Listing.objects.filter(status='ACTIVE').select_related(
+        'trim__model__make', 'seller'
+    ).order_by('-created_at')[:8])
+    makes = get_makes()
+    tag_page(request, 'catalog', 'active:all', 'prices', *(f'listing:{listing.pk}' for listing in featured_listings))
     
     context = {
         'featured_listings': featured_listings,
         'makes': makes,
         'governorates': Listing.GOVERNORATES,
+        'favorite_ids': favorite_ids_for(request),
     }
     return render(request, 'home.html', context)
 
+@replica_reads
 def search_listings(request):
     """Advanced search and filter listings"""
     listings = Listing.objects.filter(status='ACTIVE').select_related('trim__model__make', 'seller')
@@ -29,13 +61,17 @@ def search_listings(request):
     # Keyword search
     query = request.GET.get('q')
     if query:
-        listings = listings.filter(
-            Q(trim__model__name_en__icontains=query) |
-            Q(trim__model__name_ar__icontains=query) |
-            Q(trim__model__make__name_en__icontains=query) |
-            Q(trim__model__make__name_ar__icontains=query) |
-            Q(description__icontains=query)
-        )
+        # Make/model words (any script, small typos) become indexed id filters
+        condition = keyword_filter(query)
+        if condition is None:
+            condition = (
+                Q(trim__model__name_en__icontains=query) |
+                Q(trim__model__name_ar__icontains=query) |
+                Q(trim__model__make__name_en__icontains=query) |
+                Q(trim__model__make__name_ar__icontains=query) |
+                Q(description__icontains=query)
+            )
+        listings = listings.filter(condition)
     
     # Filter by make
     make_id = request.GET.get('make')
@@ -81,7 +117,7 @@ def search_listings(request):
     # Filter by mileage
     max_mileage = request.GET.get('max_mileage')
     if max_mileage:
-        listings = listings.filter(mileage__lte=max_mileage)
+        listings = listings.filter(odometer__lte=max_mileage)
     
     # Filter by color
     color = request.GET.get('color')
@@ -102,7 +138,7 @@ def search_listings(request):
     elif sort_by == 'price_high':
         listings = listings.order_by('-price')
     elif sort_by == 'mileage_low':
-        listings = listings.order_by('mileage')
+        listings = listings.order_by('odometer')
     elif sort_by == 'year_new':
         listings = listings.order_by('-trim__year')
     elif sort_by == 'views':
@@ -111,15 +147,25 @@ def search_listings(request):
         listings = listings.order_by('-created_at')
     
     # Get all makes and models for dropdowns
-    makes = Make.objects.all()
+    makes = get_makes()
+    # Popular searches share one cached count per distinct filter set (the SQL). The key
+    # carries the ACTIVE set's page cache version, so approvals and sales retire it with
+    # the rows; shared counts are taken on the primary, like page cache fills.
+    count_query = listings.order_by().query
+    active_version = tag_versions('active:all')['active:all']
+    total_count = get_or_fill(
+        f'search:count:{active_version}:' + hashlib.md5(str(count_query).encode()).hexdigest(),
+        listings.using(DEFAULT_DB_ALIAS).count, SEARCH_COUNT_TIMEOUT, name='search:count',
+    )
     models = Model.objects.filter(make_id=make_id) if make_id else Model.objects.none()
     
     context = {
         'listings': listings,
         'makes': makes,
         'models': models,
-        'total_count': listings.count(),
+        'total_count': total_count,
         'governorates': Listing.GOVERNORATES,
+        'favorite_ids': favorite_ids_for(request),
         # Pass back filter values for selected states
         'filters': {
             'q': query or '',
@@ -140,28 +186,45 @@ def search_listings(request):
     }
     return render(request, 'search.html', context)
 
+def _count_listing_view(request, pk):
+    listing_views.incr(pk)
+
+
+@anonymous_page_cache(on_hit=_count_listing_view)
+@replica_reads
 def listing_detail(request, pk):
     """Individual listing detail page"""
     # Use select_related to optimize DB queries
     listing = get_object_or_404(Listing.objects.select_related('trim__model__make', 'seller'), pk=pk, status='ACTIVE')
     
-    # Increment view count atomically
-    Listing.objects.filter(pk=pk).update(views=F('views') + 1)
-    # Refresh to get updated value if needed, though for display we might just use the old one + 1 logic or re-fetch if critical. 
-    # For now, just display the object as retrieved (it will show N, logic updates to N+1 in DB)
-    
-    # Get related listings (same make)
-    related_listings = Listing.objects.filter(
-        trim__model__make=listing.trim.model.make,
-        status='ACTIVE'
-    ).exclude(pk=pk).select_related('trim__model__make')[:4]
+    # Views are buffered in memory and written back in batches (core.counters)
+    listing_views.incr(pk)
+    
+    # Nearest neighbours precomputed by core.similar (refresh_similar_listings)
+    neighbors = SimilarListing.objects.filter(listing_id=pk, similar__status='ACTIVE').select_related(
+        'similar__trim__model__make'
+    ).order_by('rank')[:RELATED_LISTINGS]
+    related_listings = [neighbor.similar for neighbor in neighbors]
+    tags = ['catalog', f'listing:{pk}', f'seller:{listing.seller_id}', 'similar', f'similar:{pk}', 'prices']
+    if not related_listings:
+        # Not computed yet (new listing before the next refresh): same make instead
+        make_id = listing.trim.model.make_id
+        related_listings = list(Listing.objects.filter(
+            trim__model__make_id=make_id,
+            status='ACTIVE'
+        ).exclude(pk=pk).select_related('trim__model__make')[:RELATED_LISTINGS])
+        tags.append(f'active:make:{make_id}')
+    tag_page(request, *tags, *(f'listing:{related.pk}' for related in related_listings))
     
     context = {
         'listing': listing,
         'related_listings': related_listings,
+        'price_estimate': price_index.estimate(listing.trim_id, listing.trim.model_id, listing.trim.year),
+        'favorite_ids': favorite_ids_for(request),
     }
     return render(request, 'listing_detail.html', context)
 
+@pins_primary
 @login_required
 def create_listing(request):
     """Create a new listing"""
@@ -182,6 +245,7 @@ def create_listing(request):
     }
     return render(request, 'listing_form.html', context)
 
+@pins_primary
 @login_required
 def edit_listing(request, pk):
     """Edit an existing listing"""
@@ -202,6 +266,9 @@ def edit_listing(request, pk):
                 messages.info(request, _('Your listing has been updated and is pending review.'))
             else:
                 messages.success(request, _('Your listing has been updated successfully.'))
+            # Rescreened by the next moderation batch
+            updated_listing.risk_score = None
+            updated_listing.risk_reasons = []
             updated_listing.save()
             return redirect('core:dashboard')
     else:
@@ -215,6 +282,7 @@ def edit_listing(request, pk):
     }
     return render(request, 'listing_form.html', context)
 
+@pins_primary
 @login_required
 def delete_listing(request, pk):
     """Delete a listing"""
@@ -257,14 +325,51 @@ def seller_dashboard(request):
         'favorites_count': len(favorite_listings),
     }
     
+    saved_searches = list(SavedSearch.objects.filter(user=request.user).select_related('make', 'model'))
+
     context = {
         'listings': listings,
         'favorites': favorite_listings,
+        'saved_searches': saved_searches,
         'stats': stats,
     }
     return render(request, 'dashboard.html', context)
 
 
+@pins_primary
+@login_required
+@require_POST
+def save_search(request):
+    """Save the search_listings filters in the query string for new-listing alerts"""
+    search_url = f"{reverse('core:search')}?{request.GET.urlencode()}"
+    form = SavedSearchForm.from_params(request.GET, instance=SavedSearch(user=request.user))
+    if not form.is_valid():
+        messages.error(request, ' '.join(form.non_field_errors()) or _('This search cannot be saved.'))
+        return redirect(search_url)
+
+    saved = SavedSearch.objects.filter(user=request.user)
+    params = form.instance.search_params()
+    if any(search.search_params() == params for search in saved):
+        messages.info(request, _('You have already saved this search.'))
+    elif len(saved) >= MAX_SAVED_SEARCHES:
+        messages.error(request, _('You can save up to %(count)d searches.') % {'count': MAX_SAVED_SEARCHES})
+    else:
+        form.save()
+        messages.success(request, _('Search saved. We will email you when matching cars are approved.'))
+    return redirect(search_url)
+
+
+@pins_primary
+@login_required
+@require_POST
+def delete_saved_search(request, pk):
+    """Stop alerts for a saved search"""
+    get_object_or_404(SavedSearch, pk=pk, user=request.user).delete()
+    messages.success(request, _('Saved search deleted.'))
+    return redirect('core:dashboard')
+
+
+@pins_primary
 @login_required
 def mark_as_sold(request, pk):
     """Mark a listing as sold"""
@@ -275,6 +380,7 @@ def mark_as_sold(request, pk):
     return redirect('core:dashboard')
 
 # --- AJAX Endpoints ---
+@replica_reads
 def load_models(request):
     """AJAX endpoint to load models based on selected make"""
     make_id = request.GET.get('make_id')
@@ -291,6 +397,7 @@ def load_models(request):
     
     return JsonResponse(data, safe=False)
 
+@replica_reads
 def load_trims(request):
     """AJAX endpoint to load trims based on selected model"""
     model_id = request.GET.get('model_id')
@@ -311,15 +418,47 @@ def load_trims(request):
     
     return JsonResponse(data, safe=False)
 
+AUTOCOMPLETE_CACHE_SECONDS = 60
+
+
+@replica_reads
+def autocomplete(request):
+    """AJAX typeahead for the search box: makes and models matching ?q="""
+    query = request.GET.get('q', '')[:50]
+    search_url = reverse('core:search')
+    suggestions = search_index.suggest(query, request.LANGUAGE_CODE)
+    for suggestion in suggestions:
+        params = {'make': suggestion['make_id']}
+        if suggestion['type'] == 'model':
+            params['model'] = suggestion['id']
+        suggestion['url'] = f'{search_url}?{urlencode(params)}'
+    # Same for every visitor, so browsers and proxies may keep it briefly
+    response = JsonResponse({'q': query, 'suggestions': suggestions})
+    patch_cache_control(response, public=True, max_age=AUTOCOMPLETE_CACHE_SECONDS)
+    return response
+
+
+PRICE_ESTIMATE_CACHE_SECONDS = 300
+
+
+@replica_reads
+def price_estimate(request):
+    """AJAX market price range for ?trim_id= from the nightly rollup (core.pricing)"""
+    trim_id = request.GET.get('trim_id', '')
+    spec = get_trim_specs([int(trim_id)]).get(int(trim_id)) if trim_id.isdigit() else None
+    estimate = spec and price_index.estimate(spec['id'], spec.get('model_id'), spec['year'])
+    response = JsonResponse({'trim_id': spec and spec['id'], 'estimate': estimate})
+    patch_cache_control(response, public=True, max_age=PRICE_ESTIMATE_CACHE_SECONDS)
+    return response
+
 def reveal_phone(request, pk):
-    """AJAX endpoint to reveal phone number and track clicks"""
-    listing = get_object_or_404(Listing, pk=pk, status='ACTIVE')
-    
-    # Increment phone click counter atomically
-    Listing.objects.filter(pk=pk).update(phone_clicks=F('phone_clicks') + 1)
-    
+    """AJAX endpoint to reveal phone number and track clicks (no queries on a cache hit)"""
+    found, phone_number = get_phone(pk)
+    if not found:
+        raise Http404
+    phone_clicks.incr(pk)
     return JsonResponse({
-        'phone_number': listing.seller.phone_number
+        'phone_number': phone_number
     })
 
 def login_view(request):
@@ -331,23 +470,14 @@ def login_view(request):
         email = request.POST.get('email')
         password = request.POST.get('password')
         
-        # Try to find user by email
-        from .models import User
-        try:
-            user_obj = User.objects.get(email=email)
-            # Authenticate with username
-            user = authenticate(request, username=user_obj.username, password=password)
-            
-            if user is not None:
-                login(request, user)
-                next_url = request.GET.get('next', 'core:home')
-                return redirect(next_url)
-            else:
-                context = {'error': _('Invalid email or password')}
-                return render(request, 'login.html', context)
-        except User.DoesNotExist:
-            context = {'error': _('No account found with this email')}
-            return render(request, 'login.html', context)
+        # core.backends.EmailBackend; the same answer whether or not the email has an account
+        user = authenticate(request, email=email, password=password)
+        if user is not None:
+            login(request, user)
+            next_url = request.GET.get('next', 'core:home')
+            return redirect(next_url)
+        context = {'error': _('Invalid email or password')}
+        return render(request, 'login.html', context)
     
     return render(request, 'login.html')
 
@@ -374,6 +504,7 @@ def logout_view(request):
     auth_logout(request)
     return redirect('core:home')
 
+@pins_primary
 @login_required
 def edit_profile(request):
     """Update user profile"""
@@ -391,58 +522,92 @@ def edit_profile(request):
     }
     return render(request, 'edit_profile.html', context)
 
+MAX_COMPARE = 3
+
+
+def _parse_ids(value):
+    """Comma-separated ids -> unique ints in request order, capped at MAX_COMPARE"""
+    ids = [int(part) for part in value.split(',') if part.strip().isdigit()]
+    return list(dict.fromkeys(ids))[:MAX_COMPARE]
+
+
+@replica_reads
 def compare_listings(request):
-    """View to compare up to 3 cars side-by-side"""
-    ids_param = request.GET.get('ids', '')
-    
+    """
+    Compare up to 3 cars side-by-side, in the order given.
+
+    `?ids=` compares listings, `?trims=` compares catalog trims directly.
+    Specs come from the per-trim cache (core.catalog); `?format=json` returns
+    the same comparison for client-side rendering.
+    """
+    lang = request.LANGUAGE_CODE
+    trim_ids = _parse_ids(request.GET.get('trims', ''))
+    listing_ids = [] if trim_ids else _parse_ids(request.GET.get('ids', ''))
+
     listings = []
-    if ids_param:
-        try:
-            # Parse IDs and filter empty strings
-            listing_ids = [int(id) for id in ids_param.split(',') if id.strip().isdigit()]
-            # Limit to 3 cars
-            listing_ids = listing_ids[:3]
-            
-            if listing_ids:
-                # Fetch listings preserving order is tricky in pure SQL without extra logic,
-                # but for comparison, standard retrieval is usually fine.
-                # We select related fields to minimize queries.
-                listings = Listing.objects.filter(
-                    id__in=listing_ids, 
-                    status='ACTIVE'
-                ).select_related('trim__model__make')
-                
-        except (ValueError, TypeError):
-            pass
-            
+    if listing_ids:
+        found = Listing.objects.filter(status='ACTIVE').in_bulk(listing_ids)
+        listings = [found[pk] for pk in listing_ids if pk in found]
+        trim_ids = [listing.trim_id for listing in listings]
+
+    specs = get_trim_specs(trim_ids)
+    favorite_ids = favorite_ids_for(request) if listings else frozenset()
+    items = []
+    if listings:
+        for listing in listings:
+            if listing.trim_id in specs:
+                items.append({'listing': listing, 'spec': localize_spec(specs[listing.trim_id], lang)})
+    else:
+        items = [{'listing': None, 'spec': localize_spec(specs[pk], lang)} for pk in trim_ids if pk in specs]
+    rows = spec_table([item['spec'] for item in items])
+
+    if request.GET.get('format') == 'json':
+        data = []
+        for item in items:
+            spec, listing = item['spec'], item['listing']
+            entry = {
+                'type': 'listing' if listing else 'trim',
+                'id': listing.pk if listing else spec['id'],
+                'trim_id': spec['id'],
+                'title': f"{spec['make']} {spec['model']}",
+                'trim': spec['name'],
+                'year': spec['year'],
+                'fuel_type': spec['fuel_type'],
+            }
+            if listing:
+                entry.update({
+                    'price': listing.price,
+                    'odometer': listing.odometer,
+                    'location': str(listing.get_location_display()),
+                    'image': listing.image_main.url if listing.image_main else None,
+                    'url': reverse('core:listing_detail', args=[listing.pk]),
+                    'is_favorite': listing.pk in favorite_ids,
+                })
+            data.append(entry)
+        return JsonResponse({'mode': 'listings' if listings else 'trims', 'items': data, 'rows': rows})
+
     context = {
-        'listings': listings
+        'items': items,
+        'rows': rows,
+        'favorite_ids': favorite_ids,
     }
     return render(request, 'compare.html', context)
 
 
+@pins_primary
 @login_required
 @require_POST
 def toggle_favorite(request, pk):
     """AJAX endpoint to add/remove a listing from favorites"""
     listing = get_object_or_404(Listing, pk=pk, status='ACTIVE')
-    
-    favorite, created = Favorite.objects.get_or_create(
-        user=request.user,
-        listing=listing
-    )
-    
-    if not created:
-        # Already favorited, so remove it
-        favorite.delete()
-        return JsonResponse({
-            'status': 'removed',
-            'message': _('Removed from favorites'),
-            'is_favorited': False
-        })
-    else:
-        return JsonResponse({
-            'status': 'added',
-            'message': _('Added to favorites'),
-            'is_favorited': True
-        })
+    is_favorited, favorites_count = favorites.toggle_favorite(request.user.pk, listing.pk)
+    return JsonResponse(favorites.favorite_response_data(is_favorited, favorites_count))
+
+
+def sitemap_file(request, path):
+    """
+    Serve a generated sitemap file from SITEMAP_ROOT. Read from disk on each
+    request: a static file server that indexes the directory at startup would
+    keep stale lengths for rewritten shards and 404 on new ones.
+    """
+    return serve(request, path, document_root=settings.SITEMAP_ROOT)
@@ -0,0 +1,100 @@
+"""
+Process warm-up, run by the gunicorn hooks in gunicorn.conf.py.
+
+Django builds most of its per-process state lazily, so without this the
+first requests a fresh worker serves pay for resolving the URLconf, loading
+the ar/en catalogs, compiling templates and importing the allauth providers.
+
+Steps that only touch code and files run once in the gunicorn master after
+the app is preloaded, so forked workers share the result copy-on-write. Steps
+that need the database or cache (``database=True``) run in each worker after
+the fork, since connections must not be shared between processes.
+"""
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.urls import get_resolver, reverse
+from django.utils import translation
+
+
+def warm_urls():
+    # i18n_patterns keep one reverse dict per language
+    for code, _name in settings.LANGUAGES:
+        with translation.override(code):
+            get_resolver().reverse_dict
+            reverse('core:home')  # also builds the namespaced resolvers
+
+
+def warm_translations():
+    for code, _name in settings.LANGUAGES:
+        translation.trans_real.translation(code)
+
+
+def warm_templates():
+    """Compile the project templates into the cached loader"""
+    for engine in engines.all():
+        for directory in engine.dirs:
+            for path in sorted(Path(directory).rglob('*.html')):
+                try:
+                    engine.get_template(path.relative_to(directory).as_posix())
+                except (TemplateDoesNotExist, TemplateSyntaxError):
+                    pass
+
+
+def warm_auth_providers():
+    from allauth.socialaccount import providers
+    providers.registry.get_class_list()
+
+
+def warm_catalog():
+    from . import catalog
+    catalog.get_makes()
+
+
+def warm_prices():
+    from .pricing import price_index
+    price_index.refresh()
+
+
+STEPS = (
+    ('urls', warm_urls, False),
+    ('translations', warm_translations, False),
+    ('templates', warm_templates, False),
+    ('auth providers', warm_auth_providers, False),
+    ('catalog', warm_catalog, True),
+    ('prices', warm_prices, True),
+)
+
+
+def warm_up(*, shared=True, database=True):
+    """
+    Run the selected warm-up steps; returns [(step name, seconds)].
+
+    `shared` selects the code/file steps, `database` the ones needing a
+    connection. Steps are idempotent, so running one twice is cheap.
+    """
+    timings = []
+    for name, step, needs_database in STEPS:
+        if (database if needs_database else shared):
+            started = time.perf_counter()
+            step()
+            timings.append((name, time.perf_counter() - started))
+    return timings
+
+
+def format_timings(timings):
+    return ', '.join(f'{name} {seconds * 1000:.0f}ms' for name, seconds in timings)
+
+
+def connection_budget(workers, threads):
+    """Describe how many database connections the server may hold, per alias"""
+    options = settings.DATABASES['default'].get('OPTIONS', {})
+    if 'pool' in options:
+        per_worker, mode = options['pool']['max_size'], 'pooled'
+    elif settings.DATABASES['default'].get('CONN_MAX_AGE'):
+        per_worker, mode = threads, 'persistent'
+    else:
+        per_worker, mode = threads, 'per request'
+    return f'{mode}, up to {per_worker} per worker, {per_worker * workers} in total per database'
@@ -0,0 +1,52 @@
+"""
+Gunicorn configuration (read automatically when gunicorn starts in this directory).
+
+    gunicorn                       # serves aboraaya_project.wsgi:application
+    GUNICORN_WORKERS=8 gunicorn
+    GUNICORN_THREADS=4 DB_POOL=True gunicorn   # gthread workers sharing a psycopg pool
+
+The app is preloaded in the master and warmed there (URLconf, ar/en
+catalogs, compiled templates, allauth providers - see core.warmup), then the
+heap is frozen so forked workers share those pages copy-on-write instead of
+rebuilding them. Each worker warms its database-backed caches after the fork.
+``python manage.py startup_profile`` shows where the boot time goes.
+"""
+import gc
+import multiprocessing
+
+import decouple  # not `from decouple import config`: gunicorn reads `config` as a setting
+
+wsgi_app = 'aboraaya_project.wsgi:application'
+bind = decouple.config('GUNICORN_BIND', default='127.0.0.1:8000')
+workers = decouple.config('GUNICORN_WORKERS', default=multiprocessing.cpu_count() * 2 + 1, cast=int)
+# More than one thread switches to the gthread worker; DB_POOL_MAX_SIZE follows it.
+# THROTTLE_MAX_IN_FLIGHT is per worker and only has an effect below this.
+threads = decouple.config('GUNICORN_THREADS', default=1, cast=int)
+timeout = decouple.config('GUNICORN_TIMEOUT', default=30, cast=int)
+preload_app = True
+# Recycle workers now and then; the preload keeps replacements cheap
+max_requests = decouple.config('GUNICORN_MAX_REQUESTS', default=2000, cast=int)
+max_requests_jitter = max_requests // 10
+
+
+def when_ready(server):
+    # Runs in the master after the preload, before the first fork
+    from core import warmup
+    server.log.info('Warmed master: %s', warmup.format_timings(warmup.warm_up(database=False)))
+    server.log.info('Database connections: %s', warmup.connection_budget(server.num_workers, server.cfg.threads))
+    # Keep the GC from touching (and so un-sharing) everything allocated so far
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from django.db import connections
+    from core import warmup
+    try:
+        timings = warmup.warm_up(shared=False)
+    except Exception:
+        # A cold cache is no reason to refuse to serve
+        server.log.exception('Worker %s warm-up failed', worker.pid)
+    else:
+        server.log.info('Warmed worker %s: %s', worker.pid, warmup.format_timings(timings))
+    finally:
+        connections.close_all()
@@ -0,0 +1,88 @@
+/**
+ * Search box typeahead
+ * Suggests makes/models for inputs with data-autocomplete-url (core:autocomplete)
+ */
+
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('input[data-autocomplete-url]').forEach(attachAutocomplete);
+});
+
+function attachAutocomplete(input) {
+    const url = input.dataset.autocompleteUrl;
+    const menu = document.createElement('ul');
+    menu.className = 'dropdown-menu w-100 shadow';
+    menu.setAttribute('role', 'listbox');
+    input.parentElement.classList.add('position-relative');
+    input.insertAdjacentElement('afterend', menu);
+    input.setAttribute('autocomplete', 'off');
+
+    let timer = null;
+    let active = -1;
+    let lastQuery = '';
+
+    function close() {
+        menu.classList.remove('show');
+        active = -1;
+    }
+
+    function highlight(index) {
+        const items = menu.querySelectorAll('.dropdown-item');
+        items.forEach((item, i) => item.classList.toggle('active', i === index));
+        active = index;
+    }
+
+    function render(suggestions) {
+        menu.innerHTML = '';
+        suggestions.forEach(suggestion => {
+            const item = document.createElement('li');
+            const link = document.createElement('a');
+            link.className = 'dropdown-item d-flex justify-content-between';
+            link.href = suggestion.url;
+            link.textContent = suggestion.label;
+            const badge = document.createElement('span');
+            badge.className = 'badge bg-secondary ms-2';
+            badge.textContent = suggestion.count;
+            link.appendChild(badge);
+            item.appendChild(link);
+            menu.appendChild(item);
+        });
+        menu.classList.toggle('show', suggestions.length > 0);
+        active = -1;
+    }
+
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        const query = input.value.trim();
+        if (!query) {
+            close();
+            return;
+        }
+        // Responses are cacheable, so repeated prefixes come from the browser cache
+        timer = setTimeout(() => {
+            lastQuery = query;
+            fetch(`${url}?q=${encodeURIComponent(query)}`)
+                .then(response => response.json())
+                .then(data => {
+                    if (data.q === lastQuery) render(data.suggestions);
+                })
+                .catch(error => console.error('Error loading suggestions:', error));
+        }, 120);
+    });
+
+    input.addEventListener('keydown', function (event) {
+        const items = menu.querySelectorAll('.dropdown-item');
+        if (!menu.classList.contains('show') || !items.length) return;
+        if (event.key === 'ArrowDown' || event.key === 'ArrowUp') {
+            event.preventDefault();
+            const step = event.key === 'ArrowDown' ? 1 : -1;
+            highlight((active + step + items.length) % items.length);
+        } else if (event.key === 'Enter' && active >= 0) {
+            event.preventDefault();
+            window.location.href = items[active].href;
+        } else if (event.key === 'Escape') {
+            close();
+        }
+    });
+
+    input.addEventListener('blur', () => setTimeout(close, 150));
+}
@@ -60,3 +60,53 @@ document.addEventListener('DOMContentLoaded', function () {
     // Initialize
     updateCompareUI();
 });
+
+// Client-side rendering of the compare page from `?format=json`
+function renderComparison(grid, mode, ids) {
+    const t = grid.dataset;
+    const esc = value => String(value ?? '').replace(/[&<>"']/g, c => ({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+    })[c]);
+    const num = value => Number(value).toLocaleString('en-US');
+    const fuelClass = { PETROL: 'badge-petrol', HYBRID: 'badge-hybrid', ELECTRIC: 'badge-electric' };
+
+    fetch(`${t.url}?${mode}=${ids.join(',')}&format=json`, { headers: { 'Accept': 'application/json' } })
+        .then(response => response.json())
+        .then(data => {
+            const specRow = (icon, label, value) =>
+                `<li><span class="spec-label"><i class="bi ${icon}"></i> ${esc(label)}</span><span class="spec-value">${value}</span></li>`;
+            const cards = data.items.map((item, column) => {
+                const spec = Object.fromEntries(data.rows.map(row => [row.key, row.values[column]]));
+                const listing = item.type === 'listing';
+                return `<div class="compare-card">
+<div class="card-header-img">
+<button class="btn-remove remove-compare" data-id="${item.id}" title="${esc(t.tRemove)}"><i class="bi bi-x-lg"></i></button>
+${item.is_favorite ? '<span class="fav-badge"><i class="bi bi-heart-fill"></i></span>' : ''}
+${item.image ? `<img src="${esc(item.image)}" alt="${esc(item.title)}">` : '<div class="placeholder-icon"><i class="bi bi-car-front"></i></div>'}
+</div>
+<div class="card-body-compare">
+<h3 class="car-title">${esc(item.title)}</h3>
+<p class="car-trim">${esc(item.trim)}</p>
+${listing ? `<div class="car-price">${num(item.price)} ${esc(t.tEgp)}</div>` : ''}
+<ul class="specs-list">
+${specRow('bi-calendar3', t.tYear, esc(item.year))}
+${listing ? specRow('bi-speedometer2', t.tOdometer, `${num(item.odometer)} ${esc(t.tKm)}`) : ''}
+${data.rows.map(row => specRow(
+    { horsepower: 'bi-lightning-charge', engine_cc: 'bi-ev-front', fuel_consumption: 'bi-droplet',
+      transmission: 'bi-gear-wide-connected', fuel_type: 'bi-fuel-pump' }[row.key],
+    row.label,
+    row.key === 'fuel_type'
+        ? `<span class="spec-badge ${fuelClass[item.fuel_type] || 'badge-fuel'}">${esc(spec[row.key])}</span>`
+        : esc(`${spec[row.key]} ${row.unit}`.trim())
+)).join('')}
+${listing ? specRow('bi-geo-alt', t.tLocation, esc(item.location)) : ''}
+</ul>
+</div>
+${listing ? `<div class="card-footer-compare"><a href="${esc(item.url)}" class="btn-view-details"><i class="bi bi-eye"></i> ${esc(t.tDetails)}</a></div>` : ''}
+</div>`;
+            });
+            const emptySlot = `<div class="compare-card empty"><div class="empty-slot-content"><i class="bi bi-plus-circle"></i><p>${esc(t.tEmpty)}</p><a href="${esc(t.searchUrl)}">${esc(t.tAdd)}</a></div></div>`;
+            for (let i = data.items.length; i < 3; i++) cards.push(emptySlot);
+            grid.innerHTML = cards.join('\n');
+        });
+}
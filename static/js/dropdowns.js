@@ -107,5 +107,54 @@ document.addEventListener('DOMContentLoaded', function () {
                 `;
             }
         }
+        loadPriceEstimate(this.value);
     });
+
+    // 4. Market price range for the selected trim, compared with the entered price
+    const estimateDiv = document.getElementById('price-estimate');
+    const priceInput = document.getElementById('id_price');
+    let estimate = null;
+
+    function renderEstimate() {
+        if (!estimateDiv) return;
+        if (!estimate) {
+            estimateDiv.textContent = '';
+            return;
+        }
+        const format = value => Number(value).toLocaleString(currentLang === 'ar' ? 'ar-EG' : 'en-US');
+        const range = `${format(estimate.p25)} - ${format(estimate.p75)}`;
+        let text = currentLang === 'ar'
+            ? `سعر السوق: ${range} ج.م (${estimate.count} سيارة مماثلة)`
+            : `Market price: ${range} EGP (${estimate.count} similar cars)`;
+        const price = Number(priceInput && priceInput.value);
+        estimateDiv.className = 'small mt-1 text-muted';
+        if (price && price > estimate.p90) {
+            text += currentLang === 'ar' ? ' - سعرك أعلى من معظم السيارات المماثلة' : ' - your price is above most similar cars';
+            estimateDiv.className = 'small mt-1 text-warning';
+        } else if (price && price <= estimate.p25) {
+            text += currentLang === 'ar' ? ' - صفقة جيدة للمشترين' : ' - a good deal for buyers';
+            estimateDiv.className = 'small mt-1 text-success';
+        }
+        estimateDiv.textContent = text;
+    }
+
+    function loadPriceEstimate(trimId) {
+        estimate = null;
+        if (!estimateDiv || !trimId) {
+            renderEstimate();
+            return;
+        }
+        fetch(`${estimateDiv.dataset.url}?trim_id=${trimId}`)
+            .then(response => response.json())
+            .then(data => {
+                if (String(data.trim_id) === trimSelect.value) {
+                    estimate = data.estimate;
+                    renderEstimate();
+                }
+            })
+            .catch(error => console.error('Error loading price estimate:', error));
+    }
+
+    if (priceInput) priceInput.addEventListener('input', renderEstimate);
+    if (trimSelect.value) loadPriceEstimate(trimSelect.value);
 });